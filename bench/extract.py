@@ -0,0 +1,115 @@
+"""
+PPTX extraction benchmark: the streamed zip/XML extractor in utils/extractor.py
+against the former python-pptx implementation.
+
+Each deck and implementation runs in a fresh interpreter, so the peak RSS
+reported is what one extraction costs a worker (interpreter baseline included,
+reported separately). Time is the best of --runs extractions in that process.
+The python-pptx side needs `pip install python-pptx`, which the app itself no
+longer uses.
+
+Usage:
+    python -m bench.extract                      # every deck in static/uploads
+    python -m bench.extract --runs 5 deck1.pptx deck2.pptx --json extract.json
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+PROBE = r"""
+import json, resource, sys, time
+impl, path, runs = sys.argv[1], sys.argv[2], int(sys.argv[3])
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+if impl == "stream":
+    from utils.extractor import count_pptx_slides, iter_pptx_slides
+
+    def extract():
+        return list(iter_pptx_slides(path))
+
+    def count():
+        return count_pptx_slides(path)
+else:
+    from pptx import Presentation
+
+    def extract():  # utils/extractor.py before the streamed extractor
+        pages = []
+        for slide in Presentation(path).slides:
+            text = ""
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):
+                    text += shape.text + "\n"
+            pages.append(text)
+        return pages
+
+    def count():
+        return len(Presentation(path).slides)
+
+best = best_count = float("inf")
+for _ in range(runs):
+    t0 = time.perf_counter()
+    pages = extract()
+    t1 = time.perf_counter()
+    slides = count()
+    t2 = time.perf_counter()
+    best, best_count = min(best, t1 - t0), min(best_count, t2 - t1)
+
+print("EXTRACT " + json.dumps({
+    "extract_s": best,
+    "count_s": best_count,
+    "slides": len(pages),
+    "chars": sum(len(p) for p in pages),
+    "baseline_mb": baseline,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+IMPLEMENTATIONS = ("python-pptx", "stream")
+
+
+def run_probe(impl, path, runs):
+    out = subprocess.run([sys.executable, "-c", PROBE, impl, path, str(runs)],
+                         capture_output=True, text=True, check=True)
+    line = next(l for l in out.stdout.splitlines() if l.startswith("EXTRACT "))
+    return json.loads(line[len("EXTRACT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PPTX text extraction speed and memory.")
+    parser.add_argument("decks", nargs="*", help="PPTX files (default: static/uploads/*.pptx)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", dest="json_out", help="also write the results to this file")
+    args = parser.parse_args()
+
+    decks = args.decks or sorted(glob.glob(os.path.join("static", "uploads", "*.pptx")))
+    if not decks:
+        parser.error("no PPTX deck to benchmark")
+
+    report = {}
+    print(f"📊 PPTX extraction, best of {args.runs} runs per fresh interpreter\n")
+    print(f"{'deck':<40} {'impl':<12} {'slides':>6} {'chars':>7} {'extract ms':>11} {'count ms':>9} "
+          f"{'peak MB':>8} {'base MB':>8}")
+    print("-" * 108)
+    for deck in decks:
+        report[deck] = {}
+        for impl in IMPLEMENTATIONS:
+            try:
+                r = run_probe(impl, deck, args.runs)
+            except subprocess.CalledProcessError as e:
+                print(f"{os.path.basename(deck)[:40]:<40} {impl:<12} ❌ {e.stderr.strip().splitlines()[-1]}")
+                continue
+            report[deck][impl] = r
+            print(f"{os.path.basename(deck)[:40]:<40} {impl:<12} {r['slides']:>6} {r['chars']:>7} "
+                  f"{r['extract_s'] * 1000:>11.1f} {r['count_s'] * 1000:>9.2f} "
+                  f"{r['peak_rss_mb']:>8.1f} {r['baseline_mb']:>8.1f}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Local stand-in for the external services EduFlex depends on.
+
+Speaks just enough of three APIs to drive the app end to end without real
+models or quotas:
+
+* Ollama      POST /api/generate (streaming NDJSON and non-streaming, JSON `format`, `keep_alive`,
+              load/unload with an empty prompt), GET /api/tags, GET /api/ps
+* Groq        POST /openai/v1/chat/completions (OpenAI-style, with SSE streaming and `response_format`)
+* Calendar    POST /calendar/v3/freeBusy, /calendar/v3/calendars/<id>/events (list/insert/patch/delete)
+
+Point the app at it with:
+
+    OLLAMA_URL=http://127.0.0.1:8765/api/generate
+    GROQ_BASE_URL=http://127.0.0.1:8765
+    CALENDAR_API_ENDPOINT=http://127.0.0.1:8765/calendar/v3/
+
+Usage:
+    python -m bench.fake_server --port 8765 --llm-latency 0.3 --tokens-per-second 40 --error-rate 0.02
+    python -m bench.fake_server --llm-latency 0.3 --groq-latency 0.1 --slow-rate 0.1 --slow-factor 20
+    python -m bench.fake_server --load-latency 5     # cold start when the model is not loaded
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# === CONFIGURATION ===
+CONFIG = {
+    "llm_latency": 0.2,          # seconds before the first token
+    "groq_latency": None,        # same for Groq (None = llm_latency)
+    "slow_rate": 0.0,            # probability that an LLM call is a tail-latency straggler...
+    "slow_factor": 10.0,         # ...whose first-token delay is this many times longer
+    "tokens_per_second": 50.0,   # generation speed once started
+    "calendar_latency": 0.05,    # seconds per Calendar API call
+    "error_rate": 0.0,           # probability of answering with a 5xx
+    "jitter": 0.2,               # +/- fraction applied to every delay
+    "load_latency": 0.0,         # seconds to load an Ollama model that is not in memory
+}
+DEFAULT_KEEP_ALIVE = 300         # Ollama unloads a model after 5 idle minutes unless told otherwise
+
+EVENTS = {}
+EVENTS_LOCK = threading.Lock()
+LOADED = {}                      # Ollama model -> time.time() when it gets unloaded (None = never)
+LOADED_LOCK = threading.Lock()
+
+FILLER = (
+    "Ce chapitre présente les notions essentielles du cours . On commence par les définitions , "
+    "puis on illustre chaque propriété par un exemple détaillé avant de conclure par les points clés à retenir ."
+).split()
+
+
+def _delay(seconds):
+    if seconds > 0:
+        time.sleep(seconds * random.uniform(1 - CONFIG["jitter"], 1 + CONFIG["jitter"]))
+
+
+def _llm_delay(backend):
+    seconds = CONFIG["llm_latency"]
+    if backend == "groq" and CONFIG["groq_latency"] is not None:
+        seconds = CONFIG["groq_latency"]
+    if random.random() < CONFIG["slow_rate"]:
+        seconds *= CONFIG["slow_factor"]
+    _delay(seconds)
+
+
+def _load_model(model, keep_alive):
+    """Pay the cold start if `model` is not in memory, then apply keep_alive (seconds, 0 unloads, < 0 pins)."""
+    with LOADED_LOCK:
+        expiry = LOADED.get(model, 0)
+        cold = expiry is not None and expiry <= time.time()
+    if cold and keep_alive != 0:
+        _delay(CONFIG["load_latency"])
+    with LOADED_LOCK:
+        if keep_alive == 0:
+            LOADED.pop(model, None)
+        else:
+            LOADED[model] = None if keep_alive < 0 else time.time() + keep_alive
+    return cold
+
+
+def _keep_alive_seconds(value):
+    """Ollama accepts a number of seconds or a duration such as "10m"."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return value
+    units = {"s": 1, "m": 60, "h": 3600}
+    return float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+
+
+def _should_fail():
+    return random.random() < CONFIG["error_rate"]
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# === CANNED COMPLETIONS ===
+def _fake_qcm():
+    lines = []
+    for i in range(1, 6):
+        correct = random.randint(0, 3)
+        lines.append(f"{i}. Question {i} sur le cours ?")
+        for j, letter in enumerate("ABCD"):
+            mark = " ✅" if j == correct else ""
+            lines.append(f"{letter}) option {letter.lower()}{i}{mark}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _fake_prose(words=120):
+    return " ".join(FILLER[i % len(FILLER)] for i in range(words))
+
+
+def _fake_summary():
+    return (
+        "## Résumé du cours\n\n" + _fake_prose(160) +
+        "\n\n## ⚠️ Erreurs à retravailler\n\n- Revoir les définitions du chapitre.\n"
+    )
+
+
+def _fake_json_quiz():
+    return json.dumps([
+        {"question": f"Question {i} ?", "answer": f"Réponse {i}"} for i in range(1, 6)
+    ], ensure_ascii=False)
+
+
+def _fake_structured_qcm():
+    return json.dumps({"questions": [
+        {
+            "question": f"Question {i} sur le cours ?",
+            "options": [f"option {letter}{i}" for letter in "abcd"],
+            "answer": random.randint(0, 3),
+        }
+        for i in range(1, 6)
+    ]}, ensure_ascii=False)
+
+
+def _fake_timetable():
+    days = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+    table = {day: [] for day in days}
+    table["Lundi"].append({"matiere": "Cloud", "start": "09:00", "end": "12:15"})
+    table["Mardi"].append({"matiere": "Sécurité de l'information", "start": "13:30", "end": "16:45"})
+    table["Jeudi"].append({"matiere": "NLP", "start": "09:00", "end": "12:15"})
+    return json.dumps(table, ensure_ascii=False)
+
+
+def _raw_decode_after(text, marker):
+    idx = text.find(marker)
+    if idx == -1:
+        return None
+    start = min([i for i in (text.find("[", idx), text.find("{", idx)) if i != -1], default=-1)
+    if start == -1:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text[start:])
+        return value
+    except ValueError:
+        return None
+
+
+def _fake_study_plan(prompt):
+    curriculum = _raw_decode_after(prompt, "Curriculum:") or []
+    slots = _raw_decode_after(prompt, "Available Time Slots:") or []
+    titles = [t["title"] for c in curriculum for t in c.get("topics", [])] or ["Course"]
+
+    plan = []
+    for slot in slots[:6]:
+        start = datetime.fromisoformat(slot["start"]).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        end = datetime.fromisoformat(slot["end"])
+        if start + timedelta(hours=2) > end:
+            continue
+        plan.append({
+            "course": titles[len(plan) % len(titles)],
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=2)).isoformat(),
+        })
+    return json.dumps(plan, ensure_ascii=False)
+
+
+def ollama_completion(prompt, format=None):
+    if isinstance(format, dict):   # JSON schema: answer with a matching object
+        properties = format.get("properties", {})
+        if "sessions" in properties:
+            return json.dumps({"sessions": json.loads(_fake_study_plan(prompt))}, ensure_ascii=False)
+        if "questions" in properties:
+            return _fake_structured_qcm()
+        return "{}"
+    if "QCM" in prompt:
+        return _fake_qcm()
+    if "résumé" in prompt.lower():
+        return _fake_summary()
+    return _fake_prose(80)
+
+
+def groq_completion(messages, response_format=None):
+    content = messages[-1].get("content", "") if messages else ""
+    if isinstance(content, list):
+        return _fake_timetable()
+    if response_format:   # JSON mode: the schema is in the prompt
+        if "study plan" in content.lower():
+            return json.dumps({"sessions": json.loads(_fake_study_plan(content))}, ensure_ascii=False)
+        if '"options"' in content:
+            return _fake_structured_qcm()
+        if "quiz" in content.lower():
+            return json.dumps({"questions": json.loads(_fake_json_quiz())}, ensure_ascii=False)
+        return "{}"
+    if "study plan" in content.lower():
+        return _fake_study_plan(content)
+    if "quiz" in content.lower():
+        return _fake_json_quiz()
+    return _fake_prose(80)
+
+
+def _tokens(text):
+    return re.findall(r"\S+\s*", text) or [text]
+
+
+def _prompt_tokens(text):
+    return max(1, len(text) // 4)
+
+
+# === CALENDAR STORE ===
+def _event_bounds(event):
+    return (
+        datetime.fromisoformat(event["start"]["dateTime"]),
+        datetime.fromisoformat(event["end"]["dateTime"]),
+    )
+
+
+def calendar_busy(time_min, time_max):
+    lo, hi = datetime.fromisoformat(time_min), datetime.fromisoformat(time_max)
+    with EVENTS_LOCK:
+        spans = [_event_bounds(e) for e in EVENTS.values()]
+    busy = sorted((s, e) for s, e in spans if s < hi and e > lo)
+    return [{"start": s.isoformat(), "end": e.isoformat()} for s, e in busy]
+
+
+# === HTTP HANDLER ===
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "EduFlexFake/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- routing ---
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/api/tags":
+            return self._json(200, {"models": [{"name": "llama3.2:latest"}]})
+        if path == "/api/ps":
+            now = time.time()
+            with LOADED_LOCK:
+                models = [{"name": m, "expires_at": "never" if e is None else
+                           datetime.fromtimestamp(e, timezone.utc).isoformat()}
+                          for m, e in LOADED.items() if e is None or e > now]
+            return self._json(200, {"models": models})
+        match = re.fullmatch(r"/calendar/v3/calendars/([^/]+)/events", path)
+        if match:
+            return self.calendar_list()
+        self._json(404, {"error": f"unknown path {path}"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/api/generate":
+            return self.ollama_generate()
+        if path == "/openai/v1/chat/completions":
+            return self.groq_chat()
+        if path == "/calendar/v3/freeBusy":
+            return self.calendar_freebusy()
+        if re.fullmatch(r"/calendar/v3/calendars/([^/]+)/events", path):
+            return self.calendar_insert()
+        self._json(404, {"error": f"unknown path {path}"})
+
+    def do_PATCH(self):
+        match = re.fullmatch(r"/calendar/v3/calendars/([^/]+)/events/([^/]+)", urlparse(self.path).path)
+        if not match:
+            return self._json(404, {"error": "not found"})
+        self.calendar_patch(match.group(2))
+
+    def do_PUT(self):
+        self.do_PATCH()
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/calendar/v3/calendars/([^/]+)/events/([^/]+)", urlparse(self.path).path)
+        if not match:
+            return self._json(404, {"error": "not found"})
+        _delay(CONFIG["calendar_latency"])
+        with EVENTS_LOCK:
+            EVENTS.pop(match.group(2), None)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    # --- Ollama ---
+    def ollama_generate(self):
+        body = self._body()
+        prompt = body.get("prompt", "")
+        model = body.get("model", "llama3.2:latest")
+        keep_alive = _keep_alive_seconds(body.get("keep_alive"))
+        if not prompt:   # load (or with keep_alive 0, unload) request
+            _load_model(model, keep_alive)
+            return self._json(200, {"model": model, "created_at": _now_iso(), "response": "", "done": True,
+                                    "done_reason": "unload" if keep_alive == 0 else "load"})
+        _load_model(model, keep_alive)
+        _llm_delay("ollama")
+        if _should_fail():
+            return self._json(500, {"error": "fake server: injected failure"})
+
+        text = ollama_completion(prompt, body.get("format"))
+        tokens = _tokens(text)
+        per_token = 1.0 / CONFIG["tokens_per_second"] if CONFIG["tokens_per_second"] > 0 else 0
+        final = {
+            "model": model, "created_at": _now_iso(), "done": True, "done_reason": "stop",
+            "prompt_eval_count": _prompt_tokens(prompt), "eval_count": len(tokens) if text else 0,
+        }
+
+        if body.get("stream", True):
+            self._start_chunked("application/x-ndjson")
+            for tok in tokens if text else []:
+                _delay(per_token)
+                line = {"model": model, "created_at": _now_iso(), "response": tok, "done": False}
+                self._chunk((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._chunk((json.dumps(dict(final, response="")) + "\n").encode("utf-8"))
+            return self._end_chunked()
+
+        _delay(per_token * len(tokens) if text else 0)
+        self._json(200, dict(final, response=text))
+
+    # --- Groq ---
+    def groq_chat(self):
+        body = self._body()
+        messages = body.get("messages", [])
+        model = body.get("model", "")
+        _llm_delay("groq")
+        if _should_fail():
+            return self._json(503, {"error": {"message": "fake server: injected failure", "type": "server_error"}})
+
+        text = groq_completion(messages, body.get("response_format"))
+        tokens = _tokens(text)
+        per_token = 1.0 / CONFIG["tokens_per_second"] if CONFIG["tokens_per_second"] > 0 else 0
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        prompt_text = json.dumps(messages, ensure_ascii=False)
+        usage = {
+            "prompt_tokens": _prompt_tokens(prompt_text),
+            "completion_tokens": len(tokens),
+            "total_tokens": _prompt_tokens(prompt_text) + len(tokens),
+        }
+
+        if body.get("stream"):
+            self._start_chunked("text/event-stream")
+            for tok in tokens:
+                _delay(per_token)
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}],
+                }
+                self._chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            done = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "x_groq": {"usage": usage},
+            }
+            self._chunk(f"data: {json.dumps(done)}\n\n".encode("utf-8"))
+            self._chunk(b"data: [DONE]\n\n")
+            return self._end_chunked()
+
+        _delay(per_token * len(tokens))
+        self._json(200, {
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    # --- Calendar ---
+    def calendar_freebusy(self):
+        body = self._body()
+        _delay(CONFIG["calendar_latency"])
+        if _should_fail():
+            return self._json(503, {"error": {"code": 503, "message": "backendError"}})
+        busy = calendar_busy(body["timeMin"], body["timeMax"])
+        calendars = {item["id"]: {"busy": busy} for item in body.get("items", [])}
+        self._json(200, {
+            "kind": "calendar#freeBusy", "timeMin": body["timeMin"], "timeMax": body["timeMax"],
+            "calendars": calendars,
+        })
+
+    def calendar_insert(self):
+        event = self._body()
+        _delay(CONFIG["calendar_latency"])
+        if _should_fail():
+            return self._json(503, {"error": {"code": 503, "message": "backendError"}})
+        event_id = uuid.uuid4().hex
+        event.update({
+            "id": event_id, "kind": "calendar#event", "status": "confirmed",
+            "htmlLink": f"http://fake-calendar.local/event?eid={event_id}",
+        })
+        with EVENTS_LOCK:
+            EVENTS[event_id] = event
+        self._json(200, event)
+
+    def calendar_patch(self, event_id):
+        changes = self._body()
+        _delay(CONFIG["calendar_latency"])
+        with EVENTS_LOCK:
+            if event_id not in EVENTS:
+                return self._json(404, {"error": {"code": 404, "message": "Not Found"}})
+            EVENTS[event_id].update(changes)
+            event = dict(EVENTS[event_id])
+        self._json(200, event)
+
+    def calendar_list(self):
+        query = parse_qs(urlparse(self.path).query)
+        _delay(CONFIG["calendar_latency"])
+        lo = query.get("timeMin", ["0001-01-01T00:00:00+00:00"])[0]
+        hi = query.get("timeMax", ["9999-12-31T00:00:00+00:00"])[0]
+        lo, hi = datetime.fromisoformat(lo), datetime.fromisoformat(hi)
+        with EVENTS_LOCK:
+            items = [e for e in EVENTS.values() if _event_bounds(e)[0] < hi and _event_bounds(e)[1] > lo]
+        items.sort(key=lambda e: _event_bounds(e)[0])
+        self._json(200, {"kind": "calendar#events", "items": items})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama / Groq / Google Calendar server for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", type=float, default=CONFIG["llm_latency"],
+                        help="seconds before the first generated token")
+    parser.add_argument("--groq-latency", type=float, default=None,
+                        help="seconds before the first Groq token (default: --llm-latency)")
+    parser.add_argument("--slow-rate", type=float, default=CONFIG["slow_rate"],
+                        help="probability (0-1) that an LLM call is a slow straggler")
+    parser.add_argument("--slow-factor", type=float, default=CONFIG["slow_factor"],
+                        help="how many times slower stragglers start")
+    parser.add_argument("--tokens-per-second", type=float, default=CONFIG["tokens_per_second"],
+                        help="generation speed (0 = instant)")
+    parser.add_argument("--calendar-latency", type=float, default=CONFIG["calendar_latency"],
+                        help="seconds per Calendar API call")
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"],
+                        help="probability (0-1) of answering with a 5xx")
+    parser.add_argument("--jitter", type=float, default=CONFIG["jitter"],
+                        help="relative jitter applied to every delay")
+    parser.add_argument("--load-latency", type=float, default=CONFIG["load_latency"],
+                        help="seconds to load the Ollama model when it is not in memory")
+    args = parser.parse_args()
+
+    CONFIG.update({
+        "llm_latency": args.llm_latency,
+        "groq_latency": args.groq_latency,
+        "slow_rate": args.slow_rate,
+        "slow_factor": args.slow_factor,
+        "tokens_per_second": args.tokens_per_second,
+        "calendar_latency": args.calendar_latency,
+        "error_rate": args.error_rate,
+        "jitter": args.jitter,
+        "load_latency": args.load_latency,
+    })
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeHandler)
+    server.daemon_threads = True
+    print(f"🧪 Fake LLM/Calendar server on http://{args.host}:{args.port} ({CONFIG})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Load driver that replays realistic student flows against a running EduFlex app.
+
+Each virtual student runs the revision flow in a loop:
+
+    upload PDF -> generate quiz -> answer quiz -> results -> summary -> chat (x N) -> clear session
+
+and every HTTP call is timed per route. At the end a table of throughput and
+latency percentiles per route is printed (optionally also written as JSON).
+
+Typical setup (three terminals):
+
+    python -m bench.fake_server --llm-latency 0.5 --tokens-per-second 40
+    OLLAMA_URL=http://127.0.0.1:8765/api/generate GROQ_BASE_URL=http://127.0.0.1:8765 \\
+        CALENDAR_API_ENDPOINT=http://127.0.0.1:8765/calendar/v3/ python app.py
+    python -m bench.load_test --base-url http://127.0.0.1:5000 --users 20 --duration 60
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from html import unescape
+
+import httpx
+
+DEFAULT_PDF = os.path.join("static", "uploads", "Chapitre2_Plus_court_chemin.pdf")
+RADIO_RE = re.compile(r'<input[^>]*type="radio"[^>]*name="(q\d+)"[^>]*value="([^"]*)"')
+
+CHAT_QUESTIONS = [
+    "Peux-tu réexpliquer la notion principale du chapitre ?",
+    "Quelle est la différence entre les deux algorithmes présentés ?",
+    "Donne-moi un exemple d'application.",
+]
+
+
+# === STATS ===
+class RouteStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.flows = 0
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def flow_done(self):
+        with self.lock:
+            self.flows += 1
+
+    def report(self, elapsed):
+        rows = []
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            rows.append({
+                "route": route,
+                "count": len(values),
+                "errors": self.errors[route],
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p90_ms": _percentile(values, 90) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+            })
+        total = sum(r["count"] for r in rows)
+        return {
+            "elapsed_s": elapsed,
+            "flows": self.flows,
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0.0,
+            "routes": rows,
+        }
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# === STUDENT FLOW ===
+class Student:
+    def __init__(self, base_url, pdf_bytes, pdf_name, stats, chat_turns, think_time):
+        self.base_url = base_url.rstrip("/")
+        self.pdf_bytes = pdf_bytes
+        self.pdf_name = pdf_name
+        self.stats = stats
+        self.chat_turns = chat_turns
+        self.think_time = think_time
+        self.http = httpx.Client(timeout=300)   # keeps the session cookie; redirects are not followed
+
+    def call(self, route, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.stats.record(route, time.perf_counter() - start, ok)
+        if self.think_time:
+            time.sleep(random.uniform(0, self.think_time))
+        return response
+
+    def run_flow(self):
+        self.call("GET /revision", "GET", "/revision")
+        self.call("POST /revision (upload)", "POST", "/revision",
+                  files={"pdf_file": (self.pdf_name, self.pdf_bytes, "application/pdf")})
+        self.call("POST /generate_quiz", "POST", "/generate_quiz")
+
+        page = self.call("GET /quiz", "GET", "/quiz")
+        answers = {}
+        if page is not None and page.status_code == 200:
+            for name, value in RADIO_RE.findall(page.text):
+                answers.setdefault(name, []).append(unescape(value))
+        if answers:
+            form = {name: random.choice(values) for name, values in answers.items()}
+            self.call("POST /quiz", "POST", "/quiz", data=form)
+            self.call("GET /results", "GET", "/results")
+            self.call("POST /generate_summary", "POST", "/generate_summary")
+            self.call("GET /summary", "GET", "/summary")
+
+        for _ in range(self.chat_turns):
+            self.call("POST /chat", "POST", "/chat", data={"user_input": random.choice(CHAT_QUESTIONS)})
+        self.call("GET /chat", "GET", "/chat")
+        self.call("POST /clear_session", "POST", "/clear_session")
+        self.stats.flow_done()
+
+
+def run_student(student, deadline, max_flows):
+    flows = 0
+    while time.time() < deadline and (not max_flows or flows < max_flows):
+        student.run_flow()
+        flows += 1
+
+
+def print_report(report):
+    print(f"\n📊 {report['flows']} flows, {report['requests']} requests in {report['elapsed_s']:.1f}s "
+          f"({report['rps']:.1f} req/s)\n")
+    header = f"{'route':<28}{'count':>7}{'err':>6}{'rps':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in report["routes"]:
+        print(f"{r['route']:<28}{r['count']:>7}{r['errors']:>6}{r['rps']:>8.2f}"
+              f"{r['p50_ms']:>10.0f}{r['p90_ms']:>10.0f}{r['p99_ms']:>10.0f}{r['max_ms']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay student revision flows against EduFlex.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual students")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--flows", type=int, default=0, help="stop each student after N flows (0 = until duration)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which students are started")
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between calls")
+    parser.add_argument("--pdf", default=DEFAULT_PDF, help="course PDF uploaded by every student")
+    parser.add_argument("--json", dest="json_out", help="also write the report to this file")
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    stats = RouteStats()
+    deadline = time.time() + args.duration
+    threads = []
+    start = time.perf_counter()
+    for i in range(args.users):
+        student = Student(args.base_url, pdf_bytes, os.path.basename(args.pdf), stats,
+                          args.chat_turns, args.think_time)
+        t = threading.Thread(target=run_student, args=(student, deadline, args.flows), daemon=True)
+        t.start()
+        threads.append(t)
+        if args.ramp_up and args.users > 1:
+            time.sleep(args.ramp_up / args.users)
+
+    for t in threads:
+        t.join()
+
+    report = stats.report(time.perf_counter() - start)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
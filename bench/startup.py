@@ -0,0 +1,110 @@
+"""
+Startup-time benchmark: how long a fresh worker takes to import the app and
+build it, and how much memory it holds once ready.
+
+Every run is a fresh interpreter so nothing is shared between samples. Per run
+we record import time of `app`, time for `create_app()`, time to serve
+the first request through the test client, and the worker's RSS after that.
+
+Usage:
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 5 --json startup.json --top 15
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+fresh = app.create_app()
+t2 = time.perf_counter()
+fresh.test_client().get("/")
+t3 = time.perf_counter()
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+print("STARTUP " + json.dumps({
+    "import_s": t1 - t0,
+    "create_app_s": t2 - t1,
+    "first_request_s": t3 - t2,
+    "rss_mb": rss_mb(),
+}))
+"""
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_probe():
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+    line = next(l for l in out.stdout.splitlines() if l.startswith("STARTUP "))
+    return json.loads(line[len("STARTUP "):])
+
+
+def top_imports(n):
+    """Slowest top-level imports (cumulative microseconds) from `python -X importtime`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for match in IMPORTTIME_RE.finditer(out.stderr):
+        _, cumulative, indent, name = match.groups()
+        rows.append((int(cumulative), len(indent), name))
+    # Only report modules imported directly by app/routes/utils or at the top two levels
+    rows = [r for r in rows if r[1] <= 3]
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": us / 1000} for us, _, name in rows[:n]]
+
+
+def summarize(samples, key):
+    values = [s[key] for s in samples]
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure EduFlex worker startup time and RSS.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest imports")
+    parser.add_argument("--json", dest="json_out", help="also write the results to this file")
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    report = {key: summarize(samples, key) for key in ("import_s", "create_app_s", "first_request_s", "rss_mb")}
+    report["top_imports"] = top_imports(args.top) if args.top else []
+
+    print(f"🚀 Startup over {args.runs} fresh interpreters")
+    for key, label, scale, unit in (
+        ("import_s", "import app", 1000, "ms"),
+        ("create_app_s", "create_app()", 1000, "ms"),
+        ("first_request_s", "first GET /", 1000, "ms"),
+        ("rss_mb", "worker RSS", 1, "MB"),
+    ):
+        s = report[key]
+        print(f"  {label:<14} median {s['median'] * scale:8.1f} {unit}   "
+              f"(min {s['min'] * scale:.1f}, max {s['max'] * scale:.1f})")
+    if report["top_imports"]:
+        print("\n  slowest imports:")
+        for row in report["top_imports"]:
+            print(f"    {row['cumulative_ms']:8.1f} ms  {row['module']}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Gunicorn settings for serving EduFlex in production:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+A student waiting on a long generation (/chat, /generate_summary, /planner,
+/timetable/) only parks an idle request thread: the LLM and Calendar calls
+themselves run on the worker's event loop (utils/aio.py), which multiplexes
+every in-flight call over one pool of keep-alive connections.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 256))  # concurrent requests per worker
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))  # summaries of long courses can take minutes
+graceful_timeout = 30
+keepalive = 5
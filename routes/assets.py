@@ -0,0 +1,22 @@
+import mimetypes
+from flask import Blueprint, abort, request, send_from_directory
+from utils import assets
+
+assets_bp = Blueprint("assets", __name__)
+
+@assets_bp.route("/assets/<path:filename>", methods=["GET"])
+def asset(filename):
+    """A fingerprinted static file, precompressed or as WebP when the browser takes it; cached for good."""
+    chosen = assets.negotiate(filename, request.accept_encodings, request.accept_mimetypes)
+    if chosen is None:
+        abort(404)
+    served, encoding, vary = chosen
+    # The type of what is sent: the .webp variant is an image/webp, a .br/.gz keeps the original type
+    mimetype = mimetypes.guess_type(served if encoding is None else filename)[0] or "application/octet-stream"
+    response = send_from_directory(assets.ASSETS_DIR, served, mimetype=mimetype, conditional=True)
+    response.headers["Cache-Control"] = f"public, max-age={assets.MAX_AGE}, immutable"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if vary:
+        response.vary.add(vary)
+    return response
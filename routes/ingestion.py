@@ -1,23 +1,18 @@
 import os
-import json
 from flask import Blueprint, request, render_template, current_app
 from werkzeug.utils import secure_filename
-from utils.extractor import extract_text_from_pdf, extract_text_from_pptx
+from utils import search_index, storage
+from utils.extractor import count_pptx_slides, extract_pages_from_pdf
 from utils.llm_groq import estimate_study_times_with_groq
 
 ingestion_bp = Blueprint("ingestion", __name__, template_folder="../templates")
-CURRICULUM_FILE = "curriculum.json"
 
 @ingestion_bp.route("/", methods=["GET", "POST"])
 def index():
-    results = []
-
-    if os.path.exists(CURRICULUM_FILE):
-        with open(CURRICULUM_FILE, "r") as f:
-            try:
-                results = json.load(f)
-            except:
-                results = []
+    try:
+        results = storage.read_json("curriculum", default=[])
+    except ValueError:
+        results = []  # corrupted file: start a new curriculum
 
     if request.method == "POST":
         files = request.files.getlist("file")
@@ -27,16 +22,21 @@ def index():
             file.save(path)
 
             if filename.endswith(".pdf"):
-                _, page_count = extract_text_from_pdf(path)
+                pages = extract_pages_from_pdf(path)
+                page_count = len(pages)
             elif filename.endswith(".pptx"):
-                _, page_count = extract_text_from_pptx(path)
+                pages = None
+                page_count = count_pptx_slides(path)
             else:
                 continue
+            try:
+                search_index.add_file(path, pages)
+            except Exception as e:
+                print(f"⚠️ Could not index {filename}: {e}")
 
             course = estimate_study_times_with_groq(filename, page_count)
             results.append(course)
 
-        with open(CURRICULUM_FILE, "w") as f:
-            json.dump(results, f, indent=2)
+        storage.write_json("curriculum", results)
 
     return render_template("upload_curriculum.html", curriculum=results)
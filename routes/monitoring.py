@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, request, jsonify
+from utils import metrics, tracing
+
+monitoring_bp = Blueprint("monitoring", __name__)
+
+@monitoring_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@monitoring_bp.route("/admin/tracing", methods=["GET", "POST"])
+def tracing_toggle():
+    """Switch tracing/profiling of every request on or off for this worker."""
+    if not tracing.authorized():
+        return jsonify({"error": "ADMIN_TOKEN not configured or invalid"}), 403
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        if "trace" in data:
+            tracing.SETTINGS["trace_all"] = bool(data["trace"])
+        if "profile" in data:
+            tracing.SETTINGS["profile_all"] = bool(data["profile"])
+
+    return jsonify({
+        "trace": tracing.SETTINGS["trace_all"],
+        "profile": tracing.SETTINGS["profile_all"],
+        "trace_file": tracing.TRACE_FILE,
+    })
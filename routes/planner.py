@@ -1,47 +1,79 @@
-import os
-import json
+import asyncio
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template
-from utils.llm_groq import generate_study_plan
-from utils.calendar import get_free_slots, add_event
+from flask import Blueprint, render_template, request, jsonify
+from utils.llm_groq import generate_study_plan_async
+from utils.calendar import get_free_slots_async, add_events_async
+from utils import rescheduler, storage
+from utils.tracing import span
 
 planner_bp = Blueprint("planner", __name__, template_folder="../templates")
 
 @planner_bp.route("/planner", methods=["GET"])
-def planner():
-    if not os.path.exists("curriculum.json"):
+async def planner():
+    # Storage is blocking file I/O: keep it off the event loop shared by the worker's requests
+    curriculum = await asyncio.to_thread(storage.read_json, "curriculum")
+    if curriculum is None:
         return "❌ No curriculum found. Please upload one first.", 400
 
-    with open("curriculum.json", "r") as f:
-        curriculum = json.load(f)
-
     now = datetime.now().astimezone()
     monday = now - timedelta(days=now.weekday())  # this week's Monday
     sunday_next = monday + timedelta(days=13)     # end of next week
 
-    free_slots = get_free_slots(monday, sunday_next)
-    study_plan = generate_study_plan(curriculum, free_slots)
+    free_slots = await get_free_slots_async(monday, sunday_next)
+    study_plan = await generate_study_plan_async(curriculum, free_slots)
 
     if not study_plan:
         return "❌ No valid study plan returned by the LLM", 500
 
+    planned, events = [], []
     for session in study_plan:
         try:
             title = session["course"]
             start = datetime.fromisoformat(session["start"])
             end = datetime.fromisoformat(session["end"])
-            add_event(f"📖 Study: {title}", start, end)
+            planned.append(session)
+            events.append((f"{rescheduler.STUDY_PREFIX}{title}", start, end))
         except Exception as e:
             print(f"⚠️ Failed to add event: {e}")
-    open("curriculum.json", "w").write("[]")
-    with open("sessions.json", "w") as f:
-        json.dump([
-            {
-                "id": idx,
-                "course": session["course"],
-                "start": session["start"],
-                "done": False
-            } for idx, session in enumerate(study_plan)
-        ], f, indent=2)
+    with span("planner.add_events", count=len(events)):
+        created = await add_events_async(events)
+    await asyncio.to_thread(storage.write_json, "curriculum", [])
+    await asyncio.to_thread(storage.write_json, "sessions", [
+        {
+            "id": idx,
+            "course": session["course"],
+            "start": session["start"],
+            "end": session["end"],
+            "done": False,
+            "event_id": event.get("id") if event else None
+        } for idx, (session, event) in enumerate(zip(planned, created))
+    ])
 
     return render_template("planning_result.html", study_plan=study_plan)
+
+@planner_bp.route("/planner/sessions", methods=["GET"])
+def sessions():
+    return jsonify(storage.read_json("sessions", default=[]))
+
+@planner_bp.route("/planner/sessions/<int:session_id>", methods=["POST"])
+async def session_status(session_id):
+    """Mark a session {"status": "done" | "missed" | "planned"}; a missed one is moved to the next free slot."""
+    status = (request.get_json(silent=True) or {}).get("status")
+    if status not in rescheduler.STATUSES:
+        return jsonify({"error": f"status must be one of {', '.join(rescheduler.STATUSES)}"}), 400
+    item = await asyncio.to_thread(rescheduler.set_status, session_id, status)
+    if item is None:
+        return jsonify({"error": "unknown session"}), 404
+    if status != "missed":
+        return jsonify({"session": item})
+    return jsonify({"session": item, "reschedule": await rescheduler.reschedule_async()})
+
+@planner_bp.route("/planner/reschedule", methods=["POST"])
+async def reschedule():
+    """Move the remaining sessions that clash with new busy events (and the missed ones): {"until": ISO date}."""
+    until = (request.get_json(silent=True) or {}).get("until")
+    try:
+        until = datetime.fromisoformat(until) if until else None   # naive: calendar time
+    except ValueError:
+        return jsonify({"error": "until must be an ISO 8601 date"}), 400
+    return jsonify(await rescheduler.reschedule_async(until=until))
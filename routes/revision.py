@@ -0,0 +1,369 @@
+import asyncio
+import os
+import json
+import uuid
+import tempfile
+from datetime import datetime
+from io import BytesIO
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
+from utils import admission, conversation, grading, llm_router, question_bank, storage, structured
+from utils.extractor import extract_pages_from_pdf
+from utils.summarizer import asummarize_course
+from utils.text_prep import compact_text, sample_for_budget, flatten
+from utils.tracing import span
+
+revision_bp = Blueprint("revision", __name__, template_folder="../templates")
+
+# Directory for temporary files
+TEMP_DIR = tempfile.gettempdir()
+
+# Course text budget per prompt, in tokens
+QUIZ_TOKEN_BUDGET = 1500
+QUIZ_QUESTIONS = 5
+CHAT_TOKEN_BUDGET = 2200   # + conversation.HISTORY_TOKEN_BUDGET for the history
+DEFAULT_SCHEDULE_FILE = "calendrier.json"
+
+# What /clear_session resets (the "sid" that keys the user's stored documents stays)
+REVISION_SESSION_KEYS = (
+    "pdf_file_id", "doc_id", "quiz", "quiz_id", "quiz_done", "quiz_question_refs",
+    "user_answers", "score", "incorrect_questions", "missed_questions", "missed_sections", "resume",
+)
+
+# === Fonctions utilitaires ===
+
+def get_subject_from_schedule():
+    """Subject of the current slot in the user's timetable (the deployment's calendrier.json until they upload one)."""
+    schedule = storage.read_json("calendrier")
+    if schedule is None:
+        if not os.path.exists(DEFAULT_SCHEDULE_FILE):
+            return None, None, None, None
+        with span("state.read", "state", file=DEFAULT_SCHEDULE_FILE):
+            with open(DEFAULT_SCHEDULE_FILE, "r") as f:
+                schedule = json.load(f)
+
+    now = datetime.now()
+    current_date = now.strftime('%Y-%m-%d')
+    current_day = now.strftime('%A').lower()
+    current_hour = now.strftime('%H:%M')
+
+    jour_map = {
+        'monday': 'lundi',
+        'tuesday': 'mardi',
+        'wednesday': 'mercredi',
+        'thursday': 'jeudi',
+        'friday': 'vendredi',
+        'saturday': 'samedi',
+        'sunday': 'dimanche'
+    }
+    jour_fr = jour_map.get(current_day, "")
+
+    if jour_fr in schedule:
+        for session in schedule[jour_fr]:
+            if session["debut"] <= current_hour <= session["fin"]:
+                return current_date, jour_fr, current_hour, session["matiere"]
+
+    return current_date, jour_fr, current_hour, None
+
+
+def extract_text_from_pdf(pdf_file):
+    """Extract and compact the course text once, so every prompt reuses the cleaned version."""
+    try:
+        pages = extract_pages_from_pdf(pdf_file)
+        with span("text.compact", pages=len(pages)):
+            return compact_text(pages)
+    except Exception as e:
+        return ""
+    
+def save_text_to_temp_file(text):
+    file_id = str(uuid.uuid4())
+    temp_file_path = os.path.join(TEMP_DIR, f"pdf_text_{file_id}.txt")
+    with span("state.write", "state", file="pdf_text"):
+        with open(temp_file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return file_id, temp_file_path
+
+def read_text_from_temp_file(file_id):
+    temp_file_path = os.path.join(TEMP_DIR, f"pdf_text_{file_id}.txt")
+    if os.path.exists(temp_file_path):
+        with span("state.read", "state", file="pdf_text"):
+            with open(temp_file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+    return ""
+
+def delete_temp_file(file_id):
+    temp_file_path = os.path.join(TEMP_DIR, f"pdf_text_{file_id}.txt")
+    if os.path.exists(temp_file_path):
+        os.remove(temp_file_path)
+
+def generate_quiz_from_text(course_text):
+    """Ask the LLM for QCM entries ({"question", "options", "answer"}); None on failure."""
+    prompt = f"""
+Tu es un professeur. Génére exactement {QUIZ_QUESTIONS} questions à choix multiples (QCM) à partir du texte suivant :
+
+{course_text}
+
+Pour chaque question, donne le texte de la question, exactement 4 options distinctes
+et l'indice (0 à 3) de la seule bonne option.
+"""
+
+    try:
+        generated = llm_router.generate(prompt, "quiz", structured.QUIZ_SCHEMA)
+        questions = [q for q in map(question_bank.validate, generated["questions"]) if q]
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        print(f"❌ Quiz generation error: {e}")
+        return None
+    return questions[:QUIZ_QUESTIONS] or None
+    
+# === Routes ===
+
+@revision_bp.route('/revision', methods=['GET', 'POST'])
+def index():
+    date, day, hour, subject = get_subject_from_schedule()
+    session['quiz'] = session.get('quiz', [])
+    session['user_answers'] = session.get('user_answers', {})
+    session['quiz_done'] = session.get('quiz_done', False)
+    session['incorrect_questions'] = session.get('incorrect_questions', [])
+
+    pdf_text_preview = ""
+    if 'pdf_file_id' in session:
+        pdf_text = read_text_from_temp_file(session['pdf_file_id'])
+        pdf_text_preview = flatten(pdf_text[:800]) if pdf_text else ""
+
+    if request.method == 'POST':
+        if 'pdf_file' in request.files:
+            pdf_file = request.files['pdf_file']
+            if pdf_file.filename.endswith('.pdf'):
+                pdf_bytes = pdf_file.read()
+                text = extract_text_from_pdf(BytesIO(pdf_bytes))
+                if text:
+                    file_id, _ = save_text_to_temp_file(text)
+                    session['pdf_file_id'] = file_id
+                    session['doc_id'] = question_bank.document_id(text)
+                    # Mistakes were made on the previous course
+                    session.pop('missed_questions', None)
+                    session.pop('missed_sections', None)
+                    question_bank.build_in_background(session['doc_id'], text)
+                    flash('Fichier PDF chargé avec succès !', 'success')
+                else:
+                    flash('Aucun texte extrait du PDF.', 'warning')
+            else:
+                flash('Veuillez charger un fichier PDF.', 'error')
+            return redirect(url_for('revision.index'))
+
+    return render_template('revision.html', subject=subject, day=day, hour=hour, pdf_text=pdf_text_preview)
+
+
+@revision_bp.route('/generate_quiz', methods=['POST'])
+def generate_quiz():
+    if 'pdf_file_id' not in session:
+        flash('Veuillez d’abord charger un fichier PDF.', 'error')
+        return redirect(url_for('revision.index'))
+
+    pdf_text = read_text_from_temp_file(session['pdf_file_id'])
+    if not pdf_text:
+        flash('Erreur : Contenu du PDF non disponible.', 'error')
+        return redirect(url_for('revision.index'))
+
+    # Sample from the document's question bank when it is ready; otherwise ask the LLM
+    doc_id = session.get('doc_id') or question_bank.document_id(pdf_text)
+    picked = question_bank.sample_quiz(doc_id, QUIZ_QUESTIONS,
+                                       missed_questions=session.get('missed_questions', []),
+                                       missed_sections=session.get('missed_sections', {}))
+    if picked:
+        quiz = [{"question": q["question"], "options": q["options"], "answer": q["answer"]} for q in picked]
+        session['quiz_question_refs'] = [[question_bank.question_key(doc_id, q), question_bank.section_key(doc_id, q["section"])]
+                                         for q in picked]
+    else:
+        question_bank.build_in_background(doc_id, pdf_text)
+        quiz = generate_quiz_from_text(sample_for_budget(pdf_text, QUIZ_TOKEN_BUDGET))
+        session['quiz_question_refs'] = []
+
+    if quiz:
+        session['quiz'] = quiz
+        session['quiz_id'] = grading.save_quiz(quiz)
+        session['user_answers'] = {}
+        session['quiz_done'] = False
+        flash('Quiz généré avec succès !', 'success')
+    else:
+        flash('Erreur lors de la génération du quiz.', 'error')
+    return redirect(url_for('revision.quiz'))
+
+def record_mistake(index):
+    """Remember which bank question/section the student got wrong, to weight future quizzes."""
+    refs = session.get('quiz_question_refs', [])
+    if index >= len(refs):
+        return
+    question_id, section = refs[index]
+    missed = session.setdefault('missed_questions', [])
+    if question_id not in missed:
+        missed.append(question_id)
+        del missed[:-50]  # keep the session cookie small
+    sections = session.setdefault('missed_sections', {})
+    sections[section] = sections.get(section, 0) + 1
+    session.modified = True
+
+@revision_bp.route('/quiz', methods=['GET', 'POST'])
+def quiz():
+    if not session.get('quiz'):
+        flash('Aucun quiz disponible. Veuillez générer un quiz.', 'error')
+        return redirect(url_for('revision.index'))
+
+    questions = question_bank.for_display(session['quiz'])
+
+    if not questions:
+        flash('Erreur : Aucun quiz valide généré. Veuillez réessayer.', 'error')
+        return redirect(url_for('revision.index'))
+
+    if request.method == 'POST':
+        score = 0
+        incorrect_questions = []
+        for i, q in enumerate(questions):
+            user_answer = request.form.get(f'q{i}')
+            correct_answer = next((opt[0] for opt in q["options"] if opt[1]), None)
+            if user_answer and correct_answer:  # Ensure both are valid
+                session['user_answers'][f'q{i}'] = (user_answer, correct_answer)
+                if user_answer == correct_answer:
+                    score += 1
+                else:
+                    incorrect_questions.append({
+                        "question": q["question"],
+                        "user_answer": user_answer,
+                        "correct_answer": correct_answer,
+                        "options": q["options"]
+                    })
+                    record_mistake(i)
+            else:
+                print(f"Warning: Invalid answer for q{i}: user_answer={user_answer}, correct_answer={correct_answer}")
+
+        session['score'] = score
+        session['incorrect_questions'] = incorrect_questions
+        session['quiz_done'] = True
+        flash(f'Ton score est : {score} / {len(questions)}', 'success')
+        return redirect(url_for('revision.results'))
+
+    return render_template('quiz.html', questions=questions)
+
+@revision_bp.route('/results')
+def results():
+    if not session.get('quiz_done'):
+        flash('Veuillez d’abord soumettre le quiz.', 'error')
+        return redirect(url_for('revision.quiz'))
+
+    questions = question_bank.for_display(session.get('quiz', []))
+
+    return render_template('results.html', questions=questions, user_answers=session['user_answers'], score=session['score'],
+                           quiz_id=session.get('quiz_id'))
+
+@revision_bp.route('/api/quiz/<quiz_id>', methods=['GET'])
+def quiz_definition(quiz_id):
+    """Questions and options of a saved quiz, without the answers, to hand out to a class."""
+    quiz = grading.load_quiz(quiz_id)
+    if quiz is None:
+        return jsonify({"error": "unknown quiz"}), 404
+    return jsonify({
+        "quiz_id": quiz_id,
+        "questions": [{"question": q["question"], "options": q["options"]} for q in quiz["questions"]],
+    })
+
+@revision_bp.route('/api/quiz/<quiz_id>/grade', methods=['POST'])
+def grade_quiz(quiz_id):
+    """Grade a batch of submissions: {"submissions": [{"student": "...", "answers": ["A", "C", ...]}, ...]}."""
+    data = request.get_json(silent=True) or {}
+    submissions = data.get("submissions")
+    if not isinstance(submissions, list):
+        return jsonify({"error": "expected {\"submissions\": [...]}"}), 400
+    try:
+        graded = grading.grade(quiz_id, submissions)
+    except grading.GradingError as e:
+        return jsonify({"error": str(e)}), 400
+    if graded is None:
+        return jsonify({"error": "unknown quiz"}), 404
+    return jsonify(graded)
+
+@revision_bp.route('/generate_summary', methods=['POST'])
+async def generate_summary():
+    if not session.get('quiz_done'):
+        flash('Veuillez d’abord soumettre le quiz.', 'error')
+        return redirect(url_for('revision.quiz'))
+
+    if 'pdf_file_id' not in session:
+        flash('Erreur : Contenu du PDF non disponible.', 'error')
+        return redirect(url_for('revision.index'))
+
+    pdf_text = await asyncio.to_thread(read_text_from_temp_file, session['pdf_file_id'])
+    if not pdf_text:
+        flash('Erreur : Contenu du PDF non disponible.', 'error')
+        return redirect(url_for('revision.index'))
+
+    try:
+        resume = await asummarize_course(pdf_text, session['incorrect_questions'])
+        session['resume'] = resume
+        flash('Résumé généré avec succès !', 'success')
+    except admission.Overloaded:
+        raise
+    except Exception:
+        flash('Erreur lors de la génération du résumé.', 'error')
+    return redirect(url_for('revision.summary'))
+
+@revision_bp.route('/summary')
+def summary():
+    if 'resume' not in session:
+        flash('Aucun résumé disponible. Veuillez générer un résumé.', 'error')
+        return redirect(url_for('revision.results'))
+    return render_template('summary.html', resume=session['resume'])
+
+@revision_bp.route('/chat', methods=['GET', 'POST'])
+async def chat():
+    if 'pdf_file_id' not in session:
+        flash('Veuillez d’abord charger un fichier PDF.', 'error')
+        return redirect(url_for('revision.index'))
+
+    # File I/O (course text, chat memory) runs in threads, off the worker's event loop
+    pdf_text = await asyncio.to_thread(read_text_from_temp_file, session['pdf_file_id'])
+    if not pdf_text:
+        flash('Erreur : Contenu du PDF non disponible.', 'error')
+        return redirect(url_for('revision.index'))
+
+    if request.method == 'POST':
+        user_input = request.form.get('user_input')
+        if user_input:
+            course_text = sample_for_budget(pdf_text, CHAT_TOKEN_BUDGET)
+            chat_history_text = await asyncio.to_thread(conversation.history_text)
+
+            prompt_chat = f"""
+Voici le contenu d’un cours :
+
+{course_text}
+
+Historique de conversation :
+{chat_history_text}
+
+Nouvelle comentario de l’étudiant :
+{user_input}
+
+Réponds de manière claire et pédagogique, en t’appuyant uniquement sur le contenu du cours.
+"""
+
+            try:
+                reply = await llm_router.agenerate(prompt_chat, "chat")
+                await asyncio.to_thread(conversation.record, user_input, reply)
+            except admission.Overloaded:
+                raise
+            except Exception:
+                flash('Erreur lors de la réponse du chatbot.', 'error')
+        return redirect(url_for('revision.chat'))
+
+    return render_template('chat.html', chat_history=await asyncio.to_thread(conversation.turns))
+
+@revision_bp.route('/clear_session', methods=['POST'])
+def clear_session():
+    if 'pdf_file_id' in session:
+        delete_temp_file(session['pdf_file_id'])
+    conversation.clear()
+    # Keep the session id: the user's curriculum, sessions and timetable are stored under it
+    for key in REVISION_SESSION_KEYS:
+        session.pop(key, None)
+    flash('Session réinitialisée avec succès.', 'success')
+    return redirect(url_for('revision.index'))
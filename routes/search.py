@@ -0,0 +1,24 @@
+import time
+from flask import Blueprint, request, jsonify
+from utils import search_index
+
+search_bp = Blueprint("search", __name__)
+
+@search_bp.route("/search", methods=["GET"])
+def search():
+    """Ranked page-level hits over every uploaded course: /search?q=chaîne de "markov"&limit=10."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "missing q parameter"}), 400
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+
+    start = time.perf_counter()
+    complete = search_index.ready()   # False while the worker is still loading the index
+    hits = search_index.search(query, limit)
+    return jsonify({
+        "query": query,
+        "hits": hits,
+        "complete": complete,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        **search_index.stats(),
+    })
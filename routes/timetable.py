@@ -1,17 +1,15 @@
 import os
-import json
 import base64
-import re
 from flask import Blueprint, request, render_template
 from werkzeug.utils import secure_filename
-from pdf2image import convert_from_path
-from PIL import Image
 from io import BytesIO
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from dateutil import tz
-from utils.calendar import add_event
-from groq import Groq
+from utils.calendar import add_events_async
+from utils.llm_groq import achat
+from utils import admission, aio, storage, structured
+from utils.tracing import span
 
 # Ensure upload folder exists
 UPLOAD_FOLDER = "static/uploads"
@@ -19,8 +17,7 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Load .env
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
+GROQ_VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 
 def image_to_base64(image):
     """
@@ -45,13 +42,15 @@ def pdf_to_image(pdf_path):
     """
     Convert a PDF file to a PIL image.
     """
+    from pdf2image import convert_from_path
     try:
-        images = convert_from_path(pdf_path)
+        with span("extract.pdf_to_image", "extraction", file=pdf_path):
+            images = convert_from_path(pdf_path)
         return images[0]  # Return the first page
     except Exception as e:
         raise Exception(f"Error converting PDF to image: {str(e)}")
 
-def call_groq_vision(image_base64):
+async def call_groq_vision(image_base64):
     """
     Call Groq's vision API to extract timetable data from the image.
     """
@@ -65,9 +64,8 @@ def call_groq_vision(image_base64):
     )
 
     try:
-        response = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
+        return await achat(
+            [
                 {
                     "role": "user",
                     "content": [
@@ -76,12 +74,17 @@ def call_groq_vision(image_base64):
                     ]
                 }
             ],
-            temperature=1,
+            "timetable",
+            backend="groq_vision",
+            model=GROQ_VISION_MODEL,
+            temperature=0,
             max_completion_tokens=1024,
             top_p=1,
             stream=False,
+            response_format=structured.groq_response_format(structured.TIMETABLE_SCHEMA, GROQ_VISION_MODEL),
         )
-        return response.choices[0].message.content
+    except admission.Overloaded:
+        raise
     except Exception as e:
         print(f"❌ Groq Error: {e}")
         return ""
@@ -89,17 +92,25 @@ def call_groq_vision(image_base64):
 def extract_json(text):
     """
     Extract and parse JSON from the raw text response.
+    Apostrophes are kept as is ("Sécurité de l'information"); sessions that do
+    not fit the schema are skipped one by one by insert_into_calendar.
     """
     try:
-        start = text.find("{")
-        end = text.rfind("}") + 1
-        json_block = text[start:end]
-        json_block = re.sub(r"(?<!\\)'", '"', json_block)
-        return json.loads(json_block)
-    except Exception as e:
+        return structured.loads(text, "{")
+    except structured.StructuredOutputError as e:
         print(f"⚠️ JSON parsing failed: {e}")
         return {}
 
+def to_schedule(timetable):
+    """Extracted timetable in the calendrier.json shape used by the revision page."""
+    return {
+        day.lower(): [
+            {"debut": s["start"], "fin": s["end"], "matiere": s.get("matiere", "Cours")}
+            for s in sessions if isinstance(s, dict) and "start" in s and "end" in s
+        ]
+        for day, sessions in timetable.items() if isinstance(sessions, list)
+    }
+
 def get_next_monday():
     """
     Get the date of the next Monday.
@@ -107,7 +118,7 @@ def get_next_monday():
     today = datetime.now()
     return today + timedelta(days=(7 - today.weekday()) % 7)
 
-def insert_into_calendar(schedule):
+async def insert_into_calendar(schedule):
     """
     Insert the extracted timetable sessions into a calendar.
     """
@@ -124,6 +135,7 @@ def insert_into_calendar(schedule):
     local_tz = tz.gettz("Europe/Paris")
     monday = get_next_monday()
 
+    events = []
     for day, sessions in schedule.items():
         offset = DAYS.get(day, 0)
         course_date = monday + timedelta(days=offset)
@@ -140,11 +152,24 @@ def insert_into_calendar(schedule):
                 start_dt = naive_start.replace(tzinfo=local_tz)
                 end_dt = naive_end.replace(tzinfo=local_tz)
 
-                add_event(f"📚 {subject}", start_dt, end_dt)
+                events.append((f"📚 {subject}", start_dt, end_dt))
 
             except Exception as e:
                 print(f"❌ Error parsing session for {day}: {e}")
 
+    await add_events_async(events)
+
+async def extract_timetable(image_base64):
+    """
+    Extract the timetable from the image and insert its sessions into the calendar.
+    """
+    # Call vision model to extract timetable
+    timetable = extract_json(await call_groq_vision(image_base64))
+    if timetable:
+        with span("timetable.insert_into_calendar"):
+            await insert_into_calendar(timetable)
+    return timetable
+
 timetable_bp = Blueprint("timetable", __name__, template_folder="../templates")
 
 @timetable_bp.route("/", methods=["GET", "POST"])
@@ -172,21 +197,23 @@ def index():
             if filename.lower().endswith(".pdf"):
                 image = pdf_to_image(path)
             else:
+                from PIL import Image
                 image = Image.open(path).convert("RGB")  # Ensure RGB mode for images
 
             # Convert image to base64
-            base64_img = image_to_base64(image)
+            with span("timetable.encode_image"):
+                base64_img = image_to_base64(image)
 
-            # Call vision model to extract timetable
-            raw_response = call_groq_vision(base64_img)
-            timetable = extract_json(raw_response)
-
-            if timetable:
-                insert_into_calendar(timetable)
-            else:
+            # Vision call and calendar inserts run on the event loop; PDF rendering and
+            # JPEG encoding above are blocking, so the view itself stays synchronous
+            timetable = aio.run(extract_timetable(base64_img))
+            if not timetable:
                 print("⚠️ No valid timetable extracted.")
                 return render_template("timetable.html", timetable=timetable, error="Failed to extract timetable.")
+            storage.write_json("calendrier", to_schedule(timetable))
 
+        except admission.Overloaded:
+            raise
         except Exception as e:
             print(f"❌ Processing error: {e}")
             return render_template("timetable.html", timetable=timetable, error=f"Error processing file: {str(e)}")
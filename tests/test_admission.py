@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils import admission
+from utils.admission import AdmissionController, Overloaded
+
+
+def _granted(waiter):
+    return waiter is None or waiter.granted
+
+
+def test_batch_and_background_leave_the_last_slot_to_interactive():
+    ctl = AdmissionController("ollama", 2)
+    assert ctl._enter("summary", "s1")[1] is None
+    _, background = ctl._enter("question_bank", "s2")
+    assert background is not None           # both would fill the two slots
+    assert ctl._enter("chat", "s3")[1] is None
+    assert ctl.running == 2
+
+
+def test_freed_slot_goes_to_the_highest_class():
+    ctl = AdmissionController("ollama", 1)
+    priority, _ = ctl._enter("chat", "s1")
+    _, batch = ctl._enter("summary", "s2")
+    _, interactive = ctl._enter("quiz", "s3")
+    ctl._leave(priority, "s1", 1.0)
+    assert interactive.granted and not batch.granted
+
+
+def test_sessions_take_turns_within_a_class():
+    ctl = AdmissionController("ollama", 1)
+    priority, _ = ctl._enter("chat", "busy")
+    waiters = [ctl._enter("chat", "busy")[1] for _ in range(3)]
+    other = ctl._enter("chat", "other")[1]
+    ctl._leave(priority, "busy", 1.0)
+    assert other.granted                     # served before the busy session's earlier calls
+    assert not any(w.granted for w in waiters)
+
+
+def test_session_limit_and_full_queue_raise_overloaded(monkeypatch):
+    ctl = AdmissionController("ollama", 1)
+    ctl._enter("chat", "s0")
+    for _ in range(admission.MAX_QUEUED_PER_SESSION):
+        ctl._enter("chat", "s1")
+    with pytest.raises(Overloaded) as error:
+        ctl._enter("chat", "s1")
+    assert error.value.reason == "session_limit" and error.value.retry_after >= 1
+
+    monkeypatch.setitem(admission.QUEUE_LIMITS, admission.BATCH, 1)
+    ctl._enter("summary", "s2")
+    with pytest.raises(Overloaded) as error:
+        ctl._enter("summary", "s3")
+    assert error.value.reason == "queue_full"
+
+
+def test_queue_timeout_raises_overloaded(monkeypatch):
+    monkeypatch.setitem(admission.MAX_WAIT, admission.INTERACTIVE, 0.05)
+    ctl = AdmissionController("ollama", 1)
+    ctl.service_time = 0.001
+    ctl._enter("chat", "s0")
+    with pytest.raises(Overloaded) as error:
+        with ctl.slot("chat", "s1"):
+            pass
+    assert error.value.reason == "timeout"
+    assert ctl.stats()["queued"][admission.INTERACTIVE] == 0
+
+
+def test_map_chunks_beyond_the_batch_slot_do_not_time_out(monkeypatch):
+    # One summary's map step: more chunks than the single batch slot of a 2-slot Ollama,
+    # fed through SUMMARY_PARALLELISM. Each chunk waits longer than MAX_WAIT[BATCH].
+    monkeypatch.setitem(admission.MAX_WAIT, admission.BATCH, 0.05)
+    ctl = AdmissionController("ollama", 2)
+    ctl.service_time = 0.04
+    chunks, done = 8, []
+
+    async def summarize(i, semaphore):
+        async with semaphore:
+            async with ctl.aslot("summary_map", "student"):
+                await asyncio.sleep(0.04)
+                done.append(i)
+
+    async def main():
+        semaphore = asyncio.Semaphore(3)
+        await asyncio.gather(*(summarize(i, semaphore) for i in range(chunks)))
+
+    asyncio.run(main())
+    assert sorted(done) == list(range(chunks))
+    assert ctl.running == 0
+
+
+def test_blocking_slot_waits_for_a_free_slot():
+    ctl = AdmissionController("ollama", 1)
+    order = []
+
+    def call(name):
+        with ctl.slot("chat", name):
+            order.append(name)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=call, args=(f"s{i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(order) == ["s0", "s1", "s2"] and ctl.running == 0
@@ -0,0 +1,28 @@
+import os
+
+from flask import Flask
+
+from utils import assets
+
+
+def test_asset_dirs_do_not_depend_on_the_working_directory():
+    assert os.path.isabs(assets.STATIC_DIR) and os.path.isabs(assets.ASSETS_DIR)
+
+
+def test_built_assets_are_served_from_any_directory(tmp_path, monkeypatch):
+    source, target = tmp_path / "static", tmp_path / "built"
+    (source / "css").mkdir(parents=True)
+    (source / "css" / "style.css").write_text("body { color: red; }\n" * 50)
+    for name, value in (("ASSETS_DIR", str(target)), ("_manifest", {}), ("_served", {})):
+        monkeypatch.setattr(assets, name, value)
+    assets._use(assets.build(str(source), str(target)))
+    monkeypatch.chdir(tmp_path / "static")   # neither the build's nor the app's directory
+
+    from routes.assets import assets_bp
+    app = Flask(__name__)
+    app.register_blueprint(assets_bp)
+    with app.test_request_context():
+        url = assets.asset_url("css/style.css")
+    response = app.test_client().get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
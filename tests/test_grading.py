@@ -0,0 +1,84 @@
+import pytest
+
+from utils import grading
+
+QUESTIONS = [
+    {"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": answer}
+    for i, answer in enumerate([0, 1, 2, 3])
+]
+
+
+@pytest.fixture
+def qid(tmp_path, monkeypatch):
+    monkeypatch.setattr(grading, "QUIZ_DIR", str(tmp_path))
+    grading._compiled_key.cache_clear()
+    return grading.save_quiz(QUESTIONS)
+
+
+@pytest.mark.parametrize("answer, code", [
+    ("B", 1), ("b", 1), (1, 1), ("B) 42", 1), ("d)", 3),
+    (None, -1), ("", -1), ("E", -1), (4, -1), (-1, -1),
+    ("Because", -1), ("Ab", -1), ("B 42", -1),
+])
+def test_code(answer, code):
+    assert grading._code(answer) == code
+
+
+@pytest.mark.parametrize("answer", [True, False, 1.0, ["A"], {"A": 1}])
+def test_code_rejects_non_scalars_and_booleans(answer):
+    with pytest.raises(grading.GradingError):
+        grading._code(answer)
+
+
+def test_form_answers_and_short_rows(qid):
+    graded = grading.grade(qid, [
+        {"student": "form", "answers": {"q0": "A) a", "q1": "B) b", "q3": "A) a"}},
+        {"student": "short", "answers": ["A"]},
+    ])
+    assert [r["score"] for r in graded["results"]] == [2, 1]
+    assert graded["items"][2]["blank"] == 2
+    assert graded["items"][0]["options"] == {"A": 2, "B": 0, "C": 0, "D": 0}
+
+
+def test_kr20_matches_the_formula(qid):
+    rows = [
+        ["A", "B", "C", "D"],
+        ["A", "B", "C", None],
+        ["A", "B", None, None],
+        ["A", None, None, None],
+        [None, None, None, None],
+    ]
+    graded = grading.grade(qid, [{"answers": r} for r in rows])
+    # k = 4, item p = .8 .6 .4 .2, scores 4 3 2 1 0 (population variance 2)
+    pq = sum(p * (1 - p) for p in (0.8, 0.6, 0.4, 0.2))
+    assert graded["summary"]["reliability_kr20"] == round(4 / 3 * (1 - pq / 2), 3)
+    assert [item["difficulty"] for item in graded["items"]] == [0.8, 0.6, 0.4, 0.2]
+
+
+def test_kr20_undefined_without_score_variance(qid):
+    graded = grading.grade(qid, [{"answers": ["A", "B", "C", "D"]}] * 3)
+    assert graded["summary"]["reliability_kr20"] is None
+    assert graded["items"][0]["discrimination"] is None
+
+
+def test_discrimination(qid):
+    # Q0 is answered by the strongest students only, Q3 by the weakest only
+    rows = [
+        ["A", "B", "C", None],
+        ["A", "B", "C", None],
+        [None, "B", "C", None],
+        [None, "B", None, "D"],
+        [None, None, None, "D"],
+    ]
+    items = grading.grade(qid, [{"answers": r} for r in rows])["items"]
+    assert items[0]["discrimination"] > 0 > items[3]["discrimination"]
+    assert items[0]["upper_lower"] == 1.0
+    assert items[3]["upper_lower"] == -1.0
+
+
+def test_unknown_quiz_and_bad_batches(qid):
+    assert grading.grade("missing", [{"answers": []}]) is None
+    with pytest.raises(grading.GradingError):
+        grading.grade(qid, [])
+    with pytest.raises(grading.GradingError):
+        grading.grade(qid, [{"answers": "ABCD"}])
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from utils import admission, llm_router, structured
+from utils.llm_router import GROQ, OLLAMA
+from utils.text_prep import CHARS_PER_TOKEN
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(llm_router, "_latency", {})
+    monkeypatch.setattr(llm_router, "_failed_until", {})
+    monkeypatch.setattr(llm_router, "groq_enabled", lambda: True)
+    monkeypatch.setitem(admission.CONTROLLERS, "ollama", admission.AdmissionController("ollama", 2))
+    monkeypatch.setitem(admission.CONTROLLERS, "groq", admission.AdmissionController("groq", 8))
+
+
+def fake_backends(monkeypatch, ollama, groq):
+    """Backends that sleep `delay` seconds (inside an admission slot) then answer or raise."""
+    calls, cancelled = [], []
+
+    def backend(name, behaviour):
+        async def call(prompt, task, **kwargs):
+            calls.append(name)
+            delay, result = behaviour
+            async with admission.controller(name).aslot(task, "test"):
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    cancelled.append(name)
+                    raise
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return call
+
+    ollama_call, groq_call = backend(OLLAMA, ollama), backend(GROQ, groq)
+    monkeypatch.setattr(llm_router.llm_ollama, "agenerate", lambda prompt, task, format=None: ollama_call(prompt, task))
+    monkeypatch.setattr(llm_router.llm_groq, "achat", lambda messages, task, **params: groq_call(messages, task))
+    return calls, cancelled
+
+
+def test_rank_prefers_the_task_backend_and_sends_long_prompts_to_groq():
+    assert llm_router.rank("chat", "court") == [OLLAMA, GROQ]
+    assert llm_router.rank("study_plan", "court") == [GROQ, OLLAMA]
+    long_prompt = "mot " * (llm_router.OLLAMA_MAX_PROMPT_TOKENS * CHARS_PER_TOKEN)
+    assert llm_router.rank("chat", long_prompt) == [GROQ]
+
+
+def test_rank_switches_when_the_other_backend_is_much_faster():
+    llm_router._observe(OLLAMA, "chat", 10.0)
+    llm_router._observe(GROQ, "chat", 1.0)
+    assert llm_router.rank("chat", "court") == [GROQ, OLLAMA]
+
+
+def test_rank_demotes_a_failing_preferred_backend():
+    llm_router._observe_error(OLLAMA)
+    assert llm_router.rank("chat", "court") == [GROQ, OLLAMA]
+
+
+def test_rank_without_groq(monkeypatch):
+    monkeypatch.setattr(llm_router, "groq_enabled", lambda: False)
+    assert llm_router.rank("study_plan", "court") == [OLLAMA]
+
+
+def test_hedge_wins_and_the_loser_is_cancelled(monkeypatch):
+    monkeypatch.setitem(llm_router.HEDGE_DELAYS, "chat", 0.02)
+    calls, cancelled = fake_backends(monkeypatch, ollama=(1.0, "lent"), groq=(0.01, "rapide"))
+    assert asyncio.run(llm_router.agenerate("q", "chat")) == "rapide"
+    assert calls == [OLLAMA, GROQ]
+    assert cancelled == [OLLAMA]
+    assert admission.controller(OLLAMA).stats()["running"] == 0
+
+
+def test_error_falls_back_to_the_other_backend(monkeypatch):
+    monkeypatch.setitem(llm_router.HEDGE_DELAYS, "chat", None)
+    calls, _ = fake_backends(monkeypatch, ollama=(0.0, RuntimeError("down")), groq=(0.0, "secours"))
+    assert asyncio.run(llm_router.agenerate("q", "chat")) == "secours"
+    assert calls == [OLLAMA, GROQ]
+    assert llm_router.rank("chat", "q")[0] == GROQ   # the failing backend is ranked last for a while
+
+
+def test_both_failing_raises_the_first_error(monkeypatch):
+    fake_backends(monkeypatch, ollama=(0.0, RuntimeError("ollama down")), groq=(0.0, RuntimeError("groq down")))
+    with pytest.raises(RuntimeError, match="ollama down"):
+        asyncio.run(llm_router.agenerate("q", "chat"))
+
+
+def test_structured_output_is_parsed(monkeypatch):
+    fake_backends(monkeypatch, ollama=(0.0, '```json\n{"sessions": []}\n```'), groq=(0.0, "{}"))
+    assert asyncio.run(llm_router.agenerate("plan", "chat", structured.STUDY_PLAN_SCHEMA)) == {"sessions": []}
+
+
+def test_observed_latency_excludes_the_queue_wait(monkeypatch):
+    monkeypatch.setitem(llm_router.HEDGE_DELAYS, "chat", None)
+    monkeypatch.setitem(admission.CONTROLLERS, "ollama", admission.AdmissionController("ollama", 1))
+    fake_backends(monkeypatch, ollama=(0.05, "ok"), groq=(0.0, "ok"))
+
+    async def main():
+        await asyncio.gather(*(llm_router.agenerate("q", "chat") for _ in range(4)))
+
+    asyncio.run(main())
+    # Four calls on one slot: the last waited ~0.15 s, but each took ~0.05 s of service
+    assert llm_router._latency[(OLLAMA, "chat")] < 0.09
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from utils import question_bank
+
+
+def _bank(doc_id, sections=3, per_section=4):
+    questions = [
+        {"id": f"{s}-{i}", "section": s, "question": f"{doc_id} q{s}.{i}", "options": ["a", "b", "c", "d"], "answer": 0}
+        for s in range(sections) for i in range(per_section)
+    ]
+    return {"doc_id": doc_id, "status": "ready", "sections": sections, "questions": questions}
+
+
+@pytest.fixture(autouse=True)
+def bank_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(question_bank, "QUESTION_BANK_DIR", str(tmp_path))
+    question_bank.save_bank(_bank("course-a"))
+    question_bank.save_bank(_bank("course-b"))
+
+
+def _ids(doc_id, **misses):
+    picked = question_bank.sample_quiz(doc_id, 5, rng=random.Random(7), **misses)
+    return [q["id"] for q in picked]
+
+
+def test_misses_on_one_document_do_not_bias_another():
+    bank_a = question_bank.load_bank("course-a")
+    missed = [question_bank.question_key("course-a", q) for q in bank_a["questions"] if q["section"] == 2]
+    sections = {question_bank.section_key("course-a", 2): 5}
+
+    assert _ids("course-b", missed_questions=missed, missed_sections=sections) == _ids("course-b")
+    assert _ids("course-a", missed_questions=missed, missed_sections=sections) != _ids("course-a")
+
+
+def test_misses_weight_their_own_document():
+    sections = {question_bank.section_key("course-a", 1): 10}
+    counts = [0, 0, 0]
+    rng = random.Random(1)
+    for _ in range(200):
+        for q in question_bank.sample_quiz("course-a", 3, missed_sections=sections, rng=rng):
+            counts[q["section"]] += 1
+    assert counts[1] > counts[0] + counts[2]
+
+
+def test_pool_too_small():
+    assert question_bank.sample_quiz("course-a", 50) is None
+    assert question_bank.sample_quiz("unknown", 1) is None
+
+
+def test_empty_build_is_retried(monkeypatch):
+    def down(*args, **kwargs):
+        raise RuntimeError("429")
+
+    monkeypatch.setattr(question_bank.llm_router, "generate", down)
+    bank = question_bank.build_bank("course-c", "Un cours assez court. " * 20)
+    assert bank["status"] == "failed"
+    assert question_bank.needs_build(question_bank.load_bank("course-c"))
+    assert not question_bank.needs_build(question_bank.load_bank("course-a"))
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+from utils import rescheduler
+
+UTC = timezone.utc
+
+
+def at(text):
+    return datetime.fromisoformat(text)
+
+
+def session(id, start, end, **flags):
+    return {"id": id, "course": f"Course {id}", "start": start, "end": end, **flags}
+
+
+def event(start, end, summary="Meeting", **extra):
+    return {"summary": summary, "start": {"dateTime": start}, "end": {"dateTime": end}, **extra}
+
+
+def test_free_intervals_follow_each_days_offset():
+    # Paris leaves summer time on the night of 2026-10-25
+    free = rescheduler.free_intervals(at("2026-10-24T12:00:00+02:00"), at("2026-10-26T12:00:00+01:00"), [])
+    assert [(start.astimezone(UTC).hour, end.astimezone(UTC).hour) for start, end in free] == [
+        (10, 21),   # Saturday 12:00-23:00 CEST
+        (7, 22),    # Sunday 08:00-23:00 CET
+        (7, 11),    # Monday 08:00-12:00 CET
+    ]
+    assert free[1][0].isoformat() == "2026-10-25T08:00:00+01:00"
+
+
+def test_free_intervals_skip_busy_time():
+    busy = [(at("2026-03-02T09:00:00+01:00"), at("2026-03-02T10:00:00+01:00")),
+            (at("2026-03-02T21:00:00+01:00"), at("2026-03-03T09:00:00+01:00"))]
+    free = rescheduler.free_intervals(at("2026-03-02T08:00:00+01:00"), at("2026-03-03T12:00:00+01:00"), busy)
+    assert [(s.strftime("%d %H:%M"), e.strftime("%d %H:%M")) for s, e in free] == [
+        ("02 08:00", "02 09:00"), ("02 10:00", "02 21:00"), ("03 09:00", "03 12:00"),
+    ]
+
+
+def test_missed_session_moves_to_the_earliest_fit():
+    sessions = [
+        session("missed", "2026-03-01T10:00:00+01:00", "2026-03-01T11:00:00+01:00", missed=True),
+        session("kept", "2026-03-02T09:00:00+01:00", "2026-03-02T11:00:00+01:00"),
+    ]
+    moves, unplaced = rescheduler.plan_changes(
+        sessions, [], at("2026-03-02T08:05:00+01:00"), at("2026-03-04T00:00:00+01:00"))
+    # 08:15 would end at 09:15, inside the break before "kept"
+    assert {k: (s.strftime("%H:%M"), e.strftime("%H:%M")) for k, (s, e) in moves.items()} == {
+        "missed": ("11:15", "12:15"),
+    }
+    assert unplaced == []
+
+
+def test_only_clashing_future_sessions_move():
+    sessions = [
+        session("clash", "2026-03-02T14:00:00+01:00", "2026-03-02T15:00:00+01:00"),
+        session("done", "2026-03-02T16:00:00+01:00", "2026-03-02T17:00:00+01:00", done=True),
+        session("break", "2026-03-02T15:00:00+01:00", "2026-03-02T15:15:00+01:00", course="Pause"),
+        session("free", "2026-03-02T19:00:00+01:00", "2026-03-02T20:00:00+01:00"),
+    ]
+    events = [
+        event("2026-03-02T13:00:00Z", "2026-03-02T17:00:00Z"),    # 14:00-18:00 in Paris
+        event("2026-03-02T08:00:00+01:00", "2026-03-02T12:00:00+01:00", summary=rescheduler.STUDY_PREFIX + "X"),
+        event("2026-03-02T08:00:00+01:00", "2026-03-02T12:00:00+01:00", transparency="transparent"),
+    ]
+    moves, _ = rescheduler.plan_changes(sessions, events, at("2026-03-02T08:00:00+01:00"),
+                                        at("2026-03-03T00:00:00+01:00"))
+    assert list(moves) == ["clash"]
+    assert moves["clash"][0] == at("2026-03-02T08:00:00+01:00")
+
+
+def test_sessions_without_room_are_reported():
+    sessions = [session("long", "2026-03-02T08:00:00+01:00", "2026-03-02T20:00:00+01:00", missed=True)]
+    moves, unplaced = rescheduler.plan_changes(
+        sessions, [event("2026-03-02T12:00:00+01:00", "2026-03-02T13:00:00+01:00")],
+        at("2026-03-02T08:00:00+01:00"), at("2026-03-03T00:00:00+01:00"))
+    assert moves == {} and unplaced == ["long"]
+
+
+def test_placement_after_the_dst_change_keeps_local_hours():
+    sessions = [session("missed", "2026-10-24T10:00:00+02:00", "2026-10-24T12:00:00+02:00", missed=True)]
+    busy_saturday = event("2026-10-24T20:00:00+02:00", "2026-10-24T23:00:00+02:00")
+    moves, _ = rescheduler.plan_changes(sessions, [busy_saturday], at("2026-10-24T21:30:00+02:00"),
+                                        at("2026-10-26T00:00:00+01:00"))
+    start, end = moves["missed"]
+    assert start.isoformat() == "2026-10-25T08:00:00+01:00"
+    assert end - start == timedelta(hours=2)
@@ -0,0 +1,46 @@
+import os
+import threading
+
+import pytest
+
+from utils import extractor, search_index
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """An empty index over tmp_path/static/uploads whose PDF extraction waits for `release`."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(search_index.UPLOAD_FOLDER)
+    for name, text in (("markov.pdf", "chaîne de Markov homogène"), ("graphes.pdf", "graphe orienté")):
+        with open(os.path.join(search_index.UPLOAD_FOLDER, name), "w") as f:
+            f.write(text)
+    release = threading.Event()
+
+    def extract(path):
+        release.wait(5)
+        with open(path) as f:
+            return [f.read()]
+
+    monkeypatch.setattr(extractor, "extract_pages_from_pdf", extract)
+    for name, value in (("_docs", {}), ("_postings", {}), ("_total_tokens", 0), ("_total_pages", 0),
+                        ("_last_sync", 0.0), ("_ready", threading.Event()), ("_pid", None)):
+        monkeypatch.setattr(search_index, name, value)
+    return release
+
+
+def test_first_search_does_not_wait_for_the_index(index):
+    assert search_index.search("markov") == []
+    assert not search_index.ready()
+
+    index.set()
+    assert search_index.wait_ready(5)
+    assert [hit["document"] for hit in search_index.search("chaine markov")] == ["markov.pdf"]
+    assert search_index.stats()["documents"] == 2
+
+
+def test_first_sync_starts_once_per_process(index):
+    search_index.start()
+    search_index.start()
+    assert [t.name for t in threading.enumerate()].count("search-index") == 1
+    index.set()
+    assert search_index.wait_ready(5)
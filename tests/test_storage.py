@@ -0,0 +1,24 @@
+import threading
+
+from utils import storage
+
+
+def test_concurrent_updates_are_not_lost(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "USER_DATA_DIR", str(tmp_path))
+
+    def bump(user):
+        for _ in range(50):
+            storage.update_json("counter", lambda n: (n or 0) + 1, user=user)
+
+    threads = [threading.Thread(target=bump, args=(f"user-{i % 3}",)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [storage.read_json("counter", user=f"user-{i}") for i in range(3)] == [100, 100, 100]
+
+
+def test_locks_do_not_grow_with_users():
+    locks = {id(storage._lock(storage.path_for("chat", f"user-{i}"))) for i in range(1000)}
+    assert len(locks) <= storage.LOCK_STRIPES
+    assert storage._lock(storage.path_for("chat", "a")) is storage._lock(storage.path_for("chat", "a"))
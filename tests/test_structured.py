@@ -0,0 +1,52 @@
+import pytest
+
+from utils import structured
+
+QUIZ = '{"questions": [{"question": "2 + 2 ?", "options": ["3", "4", "5", "6"], "answer": 1}]}'
+
+
+def test_fenced_answer_with_chatter():
+    text = "Voici le quiz :\n```json\n" + QUIZ + "\n```\nBonne révision !"
+    assert structured.parse(text, structured.QUIZ_SCHEMA)["questions"][0]["answer"] == 1
+
+
+def test_trailing_commas_are_repaired():
+    assert structured.loads('{"a": [1, 2, ], "b": {"c": 3,},}') == {"a": [1, 2], "b": {"c": 3}}
+
+
+def test_brackets_inside_strings_do_not_end_the_value():
+    assert structured.loads('{"a": "x } ] \\" {"} trailing }') == {"a": 'x } ] " {'}
+
+
+def test_truncated_value_is_rejected_unless_partial():
+    text = '{"questions": [{"question": "Q1", "options": ["a", "b", "c", "d"], "answer": 0}, {"question": "Q'
+    with pytest.raises(structured.StructuredOutputError, match="truncated"):
+        structured.loads(text)
+    assert structured.loads(text, partial=True) == {"questions": [
+        {"question": "Q1", "options": ["a", "b", "c", "d"], "answer": 0}, {"question": "Q"},
+    ]}
+
+
+def test_partial_drops_a_dangling_key():
+    assert structured.loads('{"a": 1, "b": ', partial=True) == {"a": 1}
+    assert structured.loads('{"a": 1, "b', partial=True) == {"a": 1}
+
+
+def test_roots_skip_an_earlier_value():
+    assert structured.loads('note {"ignored": true} then [1, 2]', roots="[") == [1, 2]
+
+
+def test_no_json_at_all():
+    with pytest.raises(structured.StructuredOutputError, match="no JSON"):
+        structured.loads("Je ne peux pas répondre.")
+
+
+@pytest.mark.parametrize("text, error", [
+    ('{"questions": [{"question": "Q", "options": ["a", "b", "c"], "answer": 0}]}', "3 items"),
+    ('{"questions": [{"question": "Q", "options": ["a", "b", "c", "d"], "answer": 4}]}', "out of range"),
+    ('{"questions": [{"question": "Q", "options": ["a", "b", "c", "d"], "answer": true}]}', "expected integer"),
+    ('{"questions": [{"question": "Q", "options": ["a", "b", "c", "d"]}]}', "missing 'answer'"),
+])
+def test_schema_violations(text, error):
+    with pytest.raises(structured.StructuredOutputError, match=error):
+        structured.parse(text, structured.QUIZ_SCHEMA)
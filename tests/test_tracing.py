@@ -0,0 +1,36 @@
+import pytest
+from flask import Flask
+
+from routes.monitoring import monitoring_bp
+from utils import tracing
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "trace.json"))
+    app = Flask(__name__)
+    tracing.init_app(app)
+    app.register_blueprint(monitoring_bp)
+    app.add_url_rule("/", "home", lambda: "ok")
+    return app.test_client()
+
+
+HEADERS = {"X-EduFlex-Trace": "1", "X-EduFlex-Profile": "1"}
+
+
+def test_headers_ignored_without_admin_token(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "ADMIN_TOKEN", None)
+    response = client.get("/", headers=HEADERS)
+    assert "X-EduFlex-Trace-Id" not in response.headers
+    assert not list(tmp_path.iterdir())
+    assert client.post("/admin/tracing", json={"trace": True}).status_code == 403
+
+
+def test_headers_need_the_matching_token(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "ADMIN_TOKEN", "s3cret")
+    assert "X-EduFlex-Trace-Id" not in client.get("/", headers=dict(HEADERS, **{"X-Admin-Token": "nope"})).headers
+
+    response = client.get("/", headers=dict(HEADERS, **{"X-Admin-Token": "s3cret"}))
+    trace_id = response.headers["X-EduFlex-Trace-Id"]
+    assert (tmp_path / f"profile-{trace_id}.pstats").exists()
@@ -0,0 +1,341 @@
+"""
+Admission control in front of every LLM call.
+
+Each backend gets a controller with a global concurrency limit. Calls that find
+every slot taken wait in a queue per priority class:
+
+* interactive: a student is waiting on the page (chat, quiz, timetable)
+* batch:       longer jobs started by a student (summaries, study plans)
+* background:  work nobody waits for (question bank builds)
+
+A freed slot goes to the highest class with a waiter. Within a class, sessions
+take turns: the one with the fewest calls running, then the one served least
+recently, goes first, so one student firing many prompts cannot monopolize the
+model. Batch and background
+calls, together, never take the last slot, which stays free for interactive ones.
+
+When a class's queue is full, a session already has too many calls queued, or a
+call waited longer than its class allows (longer the further back it queued),
+Overloaded is raised right away; the app turns it into a 429 with a Retry-After
+estimated from the recent call durations and the queue length.
+
+Works from both sides: slot() for sync code (blocks the thread) and aslot() for
+coroutines on the worker's event loop (only suspends the coroutine).
+"""
+import asyncio
+import contextvars
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+from utils import metrics, storage
+from utils.tracing import span
+
+# === CONFIGURATION ===
+INTERACTIVE, BATCH, BACKGROUND = "interactive", "batch", "background"
+PRIORITIES = (INTERACTIVE, BATCH, BACKGROUND)
+
+TASK_PRIORITY = {
+    "chat": INTERACTIVE,
+    "quiz": INTERACTIVE,
+    "timetable": INTERACTIVE,
+    "summary": BATCH,
+    "summary_map": BATCH,
+    "chat_summary": BATCH,
+    "study_plan": BATCH,
+    "question_bank": BACKGROUND,
+}
+
+# Max queued calls per class (None = unbounded) and max seconds in the queue (None = forever)
+QUEUE_LIMITS = {INTERACTIVE: 32, BATCH: 16, BACKGROUND: None}
+MAX_WAIT = {INTERACTIVE: 30.0, BATCH: 60.0, BACKGROUND: None}
+QUEUE_WAIT_SLACK = 2.0   # ...or this many times the wait expected from the call's queue position, if longer
+MAX_QUEUED_PER_SESSION = int(os.getenv("LLM_MAX_QUEUED_PER_SESSION", 4))
+INITIAL_SERVICE_TIME = 10.0   # seconds per call assumed until real calls are measured
+SERVICE_TIME_ALPHA = 0.2      # weight of the newest call in the moving average
+
+
+# Queue wait of the current task's latest admission, so callers can time the service alone
+_last_wait = contextvars.ContextVar("admission_last_wait", default=0.0)
+
+
+def last_queue_wait():
+    """Seconds the current thread/task's latest slot()/aslot() spent queued."""
+    return _last_wait.get()
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a call that would not be served in time."""
+
+    def __init__(self, backend, reason, retry_after):
+        super().__init__(f"{backend} overloaded ({reason}), retry in {retry_after} s")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "session", "seq", "timeout", "granted", "_event", "_loop", "_future")
+
+    def __init__(self, priority, session, seq, timeout, loop=None):
+        self.priority = priority
+        self.session = session
+        self.seq = seq
+        self.timeout = timeout
+        self.granted = False
+        self._loop = loop
+        if loop is None:
+            self._event = threading.Event()
+        else:
+            self._future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# === CONTROLLER ===
+class AdmissionController:
+    def __init__(self, backend, max_concurrency):
+        self.backend = backend
+        self.max_concurrency = max(1, max_concurrency)
+        # Leave one slot to interactive calls when there is more than one
+        self.class_limits = {
+            INTERACTIVE: self.max_concurrency,
+            BATCH: max(1, self.max_concurrency - 1),
+            BACKGROUND: max(1, self.max_concurrency - 1),
+        }
+        self.deferrable_limit = max(1, self.max_concurrency - 1)   # batch + background together
+        self.lock = threading.Lock()
+        self.running = 0
+        self.running_by_class = Counter()
+        self.running_by_session = Counter()
+        self.queued_by_session = Counter()
+        self.last_served = {}   # session -> tick of its last admission, for round-robin
+        self.queues = {p: [] for p in PRIORITIES}
+        self.service_time = INITIAL_SERVICE_TIME
+        self._seq = itertools.count()
+        self._tick = itertools.count()
+
+    # --- bookkeeping (call with self.lock held) ---
+    def _can_run(self, priority):
+        if self.running >= self.max_concurrency or self.running_by_class[priority] >= self.class_limits[priority]:
+            return False
+        # A summary and a question-bank build must not fill both slots between them either
+        return (priority == INTERACTIVE
+                or self.running_by_class[BATCH] + self.running_by_class[BACKGROUND] < self.deferrable_limit)
+
+    def _start(self, priority, session):
+        self.running += 1
+        self.running_by_class[priority] += 1
+        self.running_by_session[session] += 1
+        self.last_served[session] = next(self._tick)
+
+    def _forget_if_idle(self, session):
+        if self.running_by_session[session] <= 0 and self.queued_by_session[session] <= 0:
+            self.running_by_session.pop(session, None)
+            self.queued_by_session.pop(session, None)
+            self.last_served.pop(session, None)
+
+    def _turn(self, waiter):
+        return (self.running_by_session[waiter.session], self.last_served.get(waiter.session, -1), waiter.seq)
+
+    def _retry_after(self, ahead):
+        return max(1, math.ceil(self.service_time * (ahead + 1) / self.max_concurrency))
+
+    def _max_wait(self, priority, ahead):
+        """
+        Seconds a call queued behind `ahead` others may wait: MAX_WAIT, or longer when the
+        class's slots need longer to reach it (e.g. the chunks of a long summary sharing
+        the one batch slot of a 2-slot Ollama).
+        """
+        if MAX_WAIT[priority] is None:
+            return None
+        slots = self.max_concurrency if priority == INTERACTIVE else self.deferrable_limit
+        return max(MAX_WAIT[priority], QUEUE_WAIT_SLACK * self.service_time * (ahead + 1) / slots)
+
+    def _queued_ahead(self, priority):
+        """Waiters that go before a new `priority` call: those of the same or a higher class."""
+        return sum(len(self.queues[p]) for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue and self._can_run(priority):
+                waiter = min(queue, key=self._turn)
+                queue.remove(waiter)
+                self.queued_by_session[waiter.session] -= 1
+                self._start(priority, waiter.session)
+                waiter.grant()
+
+    def _enter(self, task, session, loop=None):
+        """Take a slot now (waiter is None) or queue a waiter to block on; raises Overloaded if full."""
+        priority = TASK_PRIORITY.get(task, BATCH)
+        with self.lock:
+            ahead = self._queued_ahead(priority)
+            if ahead == 0 and self._can_run(priority):
+                self._start(priority, session)
+                return priority, None
+
+            limit = QUEUE_LIMITS[priority]
+            if limit is not None and len(self.queues[priority]) >= limit:
+                reason = "queue_full"
+            elif priority != BACKGROUND and self.queued_by_session[session] >= MAX_QUEUED_PER_SESSION:
+                reason = "session_limit"
+            else:
+                waiter = _Waiter(priority, session, next(self._seq), self._max_wait(priority, ahead), loop)
+                self.queues[priority].append(waiter)
+                self.queued_by_session[session] += 1
+                return priority, waiter
+            retry_after = self._retry_after(ahead)
+        self._reject(priority, reason, retry_after)
+
+    def _abandon(self, waiter):
+        """Stop waiting. Returns True if the slot was granted meanwhile (the caller now holds it)."""
+        with self.lock:
+            if waiter.granted:
+                return True
+            self.queues[waiter.priority].remove(waiter)
+            self.queued_by_session[waiter.session] -= 1
+            self._forget_if_idle(waiter.session)
+            return False
+
+    def _timed_out(self, waiter):
+        if not self._abandon(waiter):
+            with self.lock:
+                retry_after = self._retry_after(self._queued_ahead(waiter.priority))
+            self._reject(waiter.priority, "timeout", retry_after)
+
+    def _reject(self, priority, reason, retry_after):
+        metrics.LLM_ADMISSION_REJECTIONS.inc(self.backend, priority, reason)
+        raise Overloaded(self.backend, reason, retry_after)
+
+    def _leave(self, priority, session, duration):
+        with self.lock:
+            self.running -= 1
+            self.running_by_class[priority] -= 1
+            self.running_by_session[session] -= 1
+            self._forget_if_idle(session)
+            if duration is not None:
+                self.service_time += SERVICE_TIME_ALPHA * (duration - self.service_time)
+            self._dispatch()
+
+    # --- public API ---
+    @contextmanager
+    def slot(self, task, session=None):
+        """Hold one of the backend's slots for the duration of the block (blocking)."""
+        session = session or session_key()
+        start = time.perf_counter()
+        priority, waiter = self._enter(task, session)
+        if waiter is not None:
+            with span("llm.queue", "llm", backend=self.backend, priority=priority):
+                if not waiter._event.wait(waiter.timeout):
+                    self._timed_out(waiter)
+        _last_wait.set(time.perf_counter() - start)
+        metrics.LLM_QUEUE_WAIT.observe(_last_wait.get(), self.backend, priority)
+
+        began, duration = time.perf_counter(), None
+        try:
+            yield
+            duration = time.perf_counter() - began
+        finally:
+            # Failed calls are often fast errors; keep them out of the service time estimate
+            self._leave(priority, session, duration)
+
+    @asynccontextmanager
+    async def aslot(self, task, session=None):
+        """slot() for coroutines: waiting only suspends the coroutine."""
+        session = session or session_key()
+        start = time.perf_counter()
+        priority, waiter = self._enter(task, session, asyncio.get_running_loop())
+        if waiter is not None:
+            with span("llm.queue", "llm", backend=self.backend, priority=priority):
+                try:
+                    await asyncio.wait_for(waiter._future, waiter.timeout)
+                except asyncio.TimeoutError:
+                    self._timed_out(waiter)
+                except asyncio.CancelledError:
+                    if self._abandon(waiter):
+                        self._leave(priority, session, None)
+                    raise
+        _last_wait.set(time.perf_counter() - start)
+        metrics.LLM_QUEUE_WAIT.observe(_last_wait.get(), self.backend, priority)
+
+        began, duration = time.perf_counter(), None
+        try:
+            yield
+            duration = time.perf_counter() - began
+        finally:
+            self._leave(priority, session, duration)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "running": self.running,
+                "queued": {p: len(q) for p, q in self.queues.items()},
+                "service_time_s": round(self.service_time, 2),
+            }
+
+
+# === REGISTRY ===
+CONTROLLERS = {
+    "ollama": AdmissionController("ollama", int(os.getenv("OLLAMA_MAX_CONCURRENCY", 2))),
+    "groq": AdmissionController("groq", int(os.getenv("GROQ_MAX_CONCURRENCY", 8))),
+}
+
+
+def _collect(field):
+    def collect():
+        values = {}
+        for name, ctl in CONTROLLERS.items():
+            stats = ctl.stats()
+            if field == "queued":
+                values.update({(name, p): n for p, n in stats["queued"].items()})
+            else:
+                values[(name,)] = stats[field]
+        return values
+    return collect
+
+
+metrics.REGISTRY.extend([
+    metrics.Gauge("eduflex_llm_in_flight", "LLM calls holding an admission slot.", ("backend",),
+                  _collect("running")),
+    metrics.Gauge("eduflex_llm_queued", "LLM calls waiting for an admission slot.", ("backend", "priority"),
+                  _collect("queued")),
+])
+
+
+def controller(backend):
+    """Controller for a metrics backend name ("groq_text" and "groq_vision" share "groq")."""
+    return CONTROLLERS["groq" if backend.startswith("groq") else backend]
+
+
+def session_key():
+    """Fairness key: the student's session id, or "background" outside a request."""
+    from flask import has_request_context
+    if not has_request_context():
+        return "background"
+    return storage.user_id()
+
+
+# === FLASK INTEGRATION ===
+def init_app(app):
+    """Answer Overloaded with a fast 429 instead of letting the request time out."""
+
+    @app.errorhandler(Overloaded)
+    def _overloaded(e):
+        print(f"⏳ {e}")
+        return (f"⏳ Le modèle est très sollicité, réessayez dans {e.retry_after} s.", 429,
+                {"Retry-After": str(e.retry_after)})
@@ -0,0 +1,87 @@
+"""
+Event loop for the async views.
+
+Out of the box Flask runs an `async def` view by creating, running and closing a
+new event loop for every request, so nothing async can outlive the request.
+Instead, each worker process keeps a single event loop in a background thread:
+async views (and run() from sync code) are submitted to it and the request
+thread only waits for the result. All LLM and Calendar I/O of the worker is then
+multiplexed on that loop, and the httpx client returned by http_client() keeps
+its connections to Ollama, Groq and Google Calendar open across requests.
+
+Run it with thread-based workers (gunicorn.conf.py uses gthread): gevent's
+monkey-patching does not mix with an asyncio loop in another thread.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+
+from utils import tracing
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 300))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 200))
+
+_loop = None
+_loop_lock = threading.Lock()
+_pid = None
+_client = None
+
+
+# === LOOP ===
+def get_loop():
+    """The worker's event loop, started on first use (and again after a fork)."""
+    global _loop, _pid, _client
+    if _loop is not None and _pid == os.getpid():
+        return _loop
+    with _loop_lock:
+        if _loop is None or _pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="eduflex-asyncio", daemon=True).start()
+            _loop, _pid, _client = loop, os.getpid(), None
+    return _loop
+
+
+def run(coro):
+    """Run a coroutine on the worker's loop and return its result (from sync code)."""
+    ctx = contextvars.copy_context()
+    loop = get_loop()
+
+    async def profiled():
+        with tracing.profiled():
+            return await coro
+
+    async def in_context():
+        # Keeps the request context, session and trace visible to the coroutine
+        return await loop.create_task(profiled(), context=ctx)
+
+    # The request thread only waits: a profiled request is profiled on the loop instead
+    with tracing.handed_off():
+        return asyncio.run_coroutine_threadsafe(in_context(), loop).result()
+
+
+# === FLASK INTEGRATION ===
+def async_to_sync(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run(func(*args, **kwargs))
+    return wrapper
+
+
+def init_app(app):
+    """Run the app's async views on the worker's event loop."""
+    app.async_to_sync = async_to_sync
+
+
+# === SHARED HTTP CLIENT ===
+def http_client():
+    """httpx.AsyncClient shared by every request of this worker (call from the loop)."""
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=50),
+        )
+    return _client
@@ -0,0 +1,322 @@
+"""
+Static asset pipeline.
+
+At deploy time (`python -m utils.assets`) every file under static/, uploads
+excepted, is copied to ASSETS_DIR under a fingerprinted name,
+css/style.css -> css/style.3f9a1c0b7e.css, with:
+
+* .gz and .br variants of the text assets (CSS, JS, SVG...), when smaller;
+* for JPEG/PNG images, a WebP version and resized copies (IMAGE_WIDTHS, in
+  both formats) for srcset.
+
+url() references inside CSS are rewritten to the fingerprinted names first. Only
+changed files are processed again: manifest.json remembers each source's size,
+mtime and outputs. Workers only load the manifest when they start; unless
+ASSETS_BUILD_ON_START=0, each also runs the build in a background thread (under
+a file lock, so only the first does any work) and switches to the new manifest
+when it is done. Until a manifest exists, pages link to the plain /static URLs.
+
+/assets/<fingerprinted name> (routes/assets.py) serves these with immutable
+cache headers, picking the brotli/gzip variant from Accept-Encoding and WebP
+from Accept. Templates get the URLs from asset_url() and asset_srcset(); files
+that are not in the manifest fall back to the plain /static URL.
+
+Pillow and Brotli are imported on first use; without them images are only
+fingerprinted and no .br files are written.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from utils.tracing import span
+
+# === CONFIGURATION ===
+# Absolute, so the build (run from any directory) and send_from_directory (which
+# resolves relative paths against the app's root_path) use the same folder
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT_DIR, "static")
+ASSETS_DIR = os.path.join(ROOT_DIR, os.getenv("ASSETS_DIR", os.path.join("cache", "assets")))
+ASSETS_URL = "/assets/"
+BUILD_ON_START = os.getenv("ASSETS_BUILD_ON_START", "1") != "0"
+SKIPPED_DIRS = {"uploads"}
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".ico", ".map"}
+RESIZABLE = {".jpg", ".jpeg", ".png"}
+IMAGE_WIDTHS = (480, 960)    # srcset widths, when smaller than the image
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+MAX_AGE = 365 * 24 * 3600   # fingerprinted names never change content
+MANIFEST_VERSION = 1
+
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+_manifest = {}   # source path -> entry, as loaded by init_app()
+_served = {}     # fingerprinted path -> (manifest entry, width) for every file the route may serve
+
+
+# === BUILD ===
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)   # mkstemp creates 0600; a front-end server may serve these
+    os.replace(tmp, path)
+
+
+def _sources(source):
+    for folder, dirs, names in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS)
+        for name in sorted(names):
+            yield os.path.relpath(os.path.join(folder, name), source).replace(os.sep, "/")
+
+
+def _rewrite_css(text, path, files):
+    """Point the stylesheet's url() references at the fingerprinted files."""
+    folder = os.path.dirname(path)
+
+    def replace(match):
+        quote, ref = match.groups()
+        target, _, suffix = ref.partition("?")
+        if re.match(r"^(data:|[a-z]+:|//|#)", target):
+            return match.group(0)
+        resolved = os.path.normpath(os.path.join(folder, target)).replace(os.sep, "/")
+        if resolved not in files:
+            return match.group(0)
+        new = os.path.relpath(files[resolved]["url"], folder or ".").replace(os.sep, "/")
+        return f"url({quote}{new}{'?' + suffix if suffix else ''}{quote})"
+
+    return CSS_URL_RE.sub(replace, text)
+
+
+def _compressed(data, target, url, entry):
+    packed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(packed) < len(data):
+        _write(os.path.join(target, url + ".gz"), packed)
+        entry["encodings"].append("gzip")
+    try:
+        import brotli
+    except ImportError:
+        return
+    packed = brotli.compress(data, quality=11)
+    if len(packed) < len(data):
+        _write(os.path.join(target, url + ".br"), packed)
+        entry["encodings"].append("br")
+
+
+def _image_variants(data, target, base, ext, entry):
+    """WebP and resized copies of a JPEG/PNG: base.webp, base.480w.jpg, base.480w.webp..."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    entry["width"] = image.width
+    fmt = "PNG" if ext == ".png" else "JPEG"
+
+    def save(img, fmt, name):
+        out = io.BytesIO()
+        if fmt == "WEBP":
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if img.mode in ("P", "LA", "PA") else "RGB")
+            img.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+        elif fmt == "JPEG":
+            img.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            img.save(out, "PNG", optimize=True)
+        _write(os.path.join(target, name), out.getvalue())
+        return out.tell()
+
+    if save(image, "WEBP", base + ".webp") < len(data):
+        entry["webp"] = True
+    else:
+        os.remove(os.path.join(target, base + ".webp"))
+    for width in IMAGE_WIDTHS:
+        if width >= image.width:
+            continue
+        resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        save(resized, fmt, f"{base}.{width}w{ext}")
+        if entry["webp"]:
+            save(resized, "WEBP", f"{base}.{width}w.webp")
+        entry["widths"].append(width)
+
+
+def _outputs(entry):
+    """Every file written for one source."""
+    base, ext = os.path.splitext(entry["url"])
+    outputs = [entry["url"]] + [entry["url"] + (".br" if e == "br" else ".gz") for e in entry["encodings"]]
+    if entry.get("webp"):
+        outputs.append(base + ".webp")
+    for width in entry.get("widths", ()):
+        outputs.append(f"{base}.{width}w{ext}")
+        if entry.get("webp"):
+            outputs.append(f"{base}.{width}w.webp")
+    return outputs
+
+
+def _load_manifest(target):
+    try:
+        with open(os.path.join(target, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest["files"] if manifest.get("version") == MANIFEST_VERSION else {}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def _build(source, target):
+    previous = _load_manifest(target)
+    files, built = {}, 0
+    # Stylesheets last, so the files they reference already have their fingerprint
+    for path in sorted(_sources(source), key=lambda p: p.endswith(".css")):
+        full = os.path.join(source, path)
+        stat = os.stat(full)
+        ext = os.path.splitext(path)[1].lower()
+        entry = previous.get(path)
+        if (ext != ".css" and entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+                and all(os.path.exists(os.path.join(target, o)) for o in _outputs(entry))):
+            files[path] = entry
+            continue
+
+        with open(full, "rb") as f:
+            data = f.read()
+        if ext == ".css":
+            data = _rewrite_css(data.decode("utf-8"), path, files).encode("utf-8")
+        stem = os.path.splitext(path)[0]
+        url = f"{stem}.{_digest(data)}{ext}"
+        if entry and entry["url"] == url and all(os.path.exists(os.path.join(target, o)) for o in _outputs(entry)):
+            files[path] = dict(entry, size=stat.st_size, mtime=stat.st_mtime)
+            continue
+
+        entry = {"url": url, "size": stat.st_size, "mtime": stat.st_mtime, "bytes": len(data),
+                 "encodings": [], "webp": False, "widths": []}
+        _write(os.path.join(target, url), data)
+        if ext in COMPRESSIBLE:
+            _compressed(data, target, url, entry)
+        if ext in RESIZABLE:
+            try:
+                _image_variants(data, target, os.path.splitext(url)[0], ext, entry)
+            except Exception as e:
+                print(f"⚠️ Assets: no image variants for {path}: {e}")
+        files[path] = entry
+        built += 1
+
+    # Outputs of files that changed or disappeared
+    keep = {o for entry in files.values() for o in _outputs(entry)}
+    for path in _sources(target):
+        if path != "manifest.json" and path != ".lock" and not path.endswith(".tmp") and path not in keep:
+            os.remove(os.path.join(target, path))
+
+    _write(os.path.join(target, "manifest.json"),
+           json.dumps({"version": MANIFEST_VERSION, "files": files}, indent=1).encode("utf-8"))
+    return files, built
+
+
+def build(source=STATIC_DIR, target=ASSETS_DIR):
+    """Fingerprint, compress and resize what changed under `source`; returns the manifest entries."""
+    start = time.perf_counter()
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, ".lock"), "a") as lock, span("assets.build", "state"):
+        try:
+            import fcntl
+            fcntl.flock(lock, fcntl.LOCK_EX)   # released when the file is closed
+        except ImportError:
+            pass
+        files, built = _build(source, target)
+    if built:
+        print(f"📦 Assets: built {built} of {len(files)} files in {time.perf_counter() - start:.1f} s")
+    return files
+
+
+# === LOOKUP ===
+def _index(files):
+    served = {}
+    for path, entry in files.items():
+        base, ext = os.path.splitext(entry["url"])
+        served[entry["url"]] = (entry, None)
+        for width in entry.get("widths", ()):
+            served[f"{base}.{width}w{ext}"] = (entry, width)
+    return served
+
+
+def asset_url(path):
+    """URL of a static file: the fingerprinted one when it has been built."""
+    entry = _manifest.get(path)
+    if entry is None:
+        from flask import url_for
+        return url_for("static", filename=path)
+    return ASSETS_URL + entry["url"]
+
+
+def asset_srcset(path):
+    """srcset for an image: its resized copies and the original, by width."""
+    entry = _manifest.get(path)
+    if entry is None or not entry.get("widths"):
+        return ""
+    base, ext = os.path.splitext(ASSETS_URL + entry["url"])
+    candidates = [f"{base}.{width}w{ext} {width}w" for width in entry["widths"]]
+    return ", ".join(candidates + [f"{ASSETS_URL}{entry['url']} {entry['width']}w"])
+
+
+def _accepts(accept, value):
+    return any(item == value and quality > 0 for item, quality in accept)
+
+
+def negotiate(name, accept_encodings, accept_mimetypes):
+    """
+    (file to send, Content-Encoding or None, Vary) for a fingerprinted name,
+    or None when it is not a built asset.
+    """
+    found = _served.get(name)
+    if found is None:
+        return None
+    entry = found[0]
+    base, ext = os.path.splitext(name)
+    if entry.get("webp"):
+        if _accepts(accept_mimetypes, "image/webp"):
+            return base + ".webp", None, "Accept"
+        return name, None, "Accept"
+    if "br" in entry["encodings"] and _accepts(accept_encodings, "br"):
+        return name + ".br", "br", "Accept-Encoding"
+    if "gzip" in entry["encodings"] and _accepts(accept_encodings, "gzip"):
+        return name + ".gz", "gzip", "Accept-Encoding"
+    return name, None, "Accept-Encoding" if entry["encodings"] else None
+
+
+# === FLASK INTEGRATION ===
+def _use(files):
+    global _manifest, _served
+    _manifest, _served = files, _index(files)
+
+
+def build_in_background(source=STATIC_DIR):
+    def run():
+        try:
+            _use(build(source, ASSETS_DIR))
+        except Exception as e:
+            print(f"❌ Asset build failed: {e}")
+
+    threading.Thread(target=run, name="assets-build", daemon=True).start()
+
+
+def init_app(app):
+    """Load the built manifest (building what changed in the background) and give templates asset_url()/asset_srcset()."""
+    _use(_load_manifest(ASSETS_DIR))
+    if BUILD_ON_START:
+        build_in_background(app.static_folder)
+    app.add_template_global(asset_url)
+    app.add_template_global(asset_srcset)
+
+
+if __name__ == "__main__":
+    built = build()
+    print(f"📦 {len(built)} assets in {ASSETS_DIR}")
@@ -1,39 +1,96 @@
+import asyncio
 import os
-from datetime import datetime, timedelta
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
+from datetime import datetime
+from utils import aio, metrics
 
 # === CONFIGURATION ===
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 CLIENT_SECRET_FILE = ""
 TOKEN_FILE = "token.json"
+# Set to e.g. http://127.0.0.1:8765/calendar/v3/ to talk to bench/fake_server.py instead of Google
+CALENDAR_API_ENDPOINT = os.getenv("CALENDAR_API_ENDPOINT")
+GOOGLE_CALENDAR_API = "https://www.googleapis.com/calendar/v3/"
+CALENDAR_TIMEOUT = float(os.getenv("CALENDAR_TIMEOUT", 30))
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", 8))  # parallel inserts per request
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "Europe/Paris")
+
+# OAuth credentials shared by the async REST helpers (loaded and refreshed off the loop, under the lock)
+_creds = None
+_creds_lock = None   # (loop, asyncio.Lock): one per event loop, i.e. per worker
 
 # === AUTHENTICATION ===
-def get_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    else:
-        flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
-        creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token:
-            token.write(creds.to_json())
+def _load_credentials():
+    """Credentials from TOKEN_FILE, or from the OAuth consent flow when there is none yet."""
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
 
-    return build("calendar", "v3", credentials=creds)
+    if os.path.exists(TOKEN_FILE):
+        return Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
+    creds = flow.run_local_server(port=0)
+    with open(TOKEN_FILE, "w") as token:
+        token.write(creds.to_json())
+    return creds
+
+def _refreshed_credentials(creds):
+    """Blocking: load and refresh the credentials (run in a thread, not on the loop)."""
+    if creds is None:
+        creds = _load_credentials()
+    if not creds.valid:
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+    return creds
+
+async def _access_token():
+    """Bearer token for the async REST calls (None when talking to a local fake)."""
+    global _creds, _creds_lock
+    if CALENDAR_API_ENDPOINT:
+        return None
+    if _creds is not None and _creds.valid:
+        return _creds.token
+    loop = asyncio.get_running_loop()
+    if _creds_lock is None or _creds_lock[0] is not loop:
+        _creds_lock = (loop, asyncio.Lock())
+    async with _creds_lock[1]:
+        # The token endpoint round-trip must not stall the other coroutines of the worker
+        if _creds is None or not _creds.valid:
+            _creds = await asyncio.to_thread(_refreshed_credentials, _creds)
+        return _creds.token
+
+def _api_url(path):
+    return (CALENDAR_API_ENDPOINT or GOOGLE_CALENDAR_API).rstrip("/") + "/" + path
+
+async def _auth_headers():
+    token = await _access_token()
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+def _event_body(title, start, end):
+    return {
+        "summary": title,
+        "start": {
+            "dateTime": start.isoformat(),
+            "timeZone": CALENDAR_TIMEZONE
+        },
+        "end": {
+            "dateTime": end.isoformat(),
+            "timeZone": CALENDAR_TIMEZONE
+        }
+    }
 
 # === FREE SLOTS ===
-def get_free_slots(start, end):
-    service = get_service()
-
-    busy_result = service.freebusy().query(body={
-        "timeMin": start.isoformat(),
-        "timeMax": end.isoformat(),
-        "timeZone": "Europe/Paris",
-        "items": [{"id": "primary"}]
-    }).execute()
-
-    busy_periods = busy_result['calendars']['primary']['busy']
+async def get_free_slots_async(start, end):
+    """Free slots between start and end, from the Calendar freeBusy API."""
+    with metrics.calendar_call("freebusy"):
+        response = await aio.http_client().post(_api_url("freeBusy"), headers=await _auth_headers(), timeout=CALENDAR_TIMEOUT, json={
+            "timeMin": start.isoformat(),
+            "timeMax": end.isoformat(),
+            "timeZone": CALENDAR_TIMEZONE,
+            "items": [{"id": "primary"}]
+        })
+        response.raise_for_status()
+    return _free_slots_from_busy(start, end, response.json()['calendars']['primary']['busy'])
+
+def _free_slots_from_busy(start, end, busy_periods):
     free_slots = []
 
     current = start
@@ -65,61 +122,53 @@ def get_free_slots(start, end):
     return free_slots
 
 # === ADD EVENT ===
-def add_event(title, start, end):
-    service = get_service()
-
-    event = {
-        "summary": title,
-        "start": {
-            "dateTime": start.isoformat(),
-            "timeZone": "Europe/Paris"
-        },
-        "end": {
-            "dateTime": end.isoformat(),
-            "timeZone": "Europe/Paris"
-        }
-    }
-
-    created = service.events().insert(calendarId="primary", body=event).execute()
+async def add_event_async(title, start, end):
+    with metrics.calendar_call("events_insert"):
+        response = await aio.http_client().post(_api_url("calendars/primary/events"), headers=await _auth_headers(),
+                                                json=_event_body(title, start, end), timeout=CALENDAR_TIMEOUT)
+        response.raise_for_status()
+    created = response.json()
     print(f"✅ Event created: {created.get('htmlLink')}")
+    return created
+
+async def add_events_async(events, concurrency=CALENDAR_CONCURRENCY):
+    """
+    Insert (title, start, end) events concurrently, at most `concurrency` at a time.
+    Returns the created events in order, with None for the ones that failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def insert(title, start, end):
+        async with semaphore:
+            try:
+                return await add_event_async(title, start, end)
+            except Exception as e:
+                print(f"⚠️ Failed to add event: {e}")
+                return None
+
+    return await asyncio.gather(*(insert(*event) for event in events))
+
+async def patch_event_async(event_id, start, end):
+    """Move an existing event; only its start and end are sent."""
+    body = _event_body("", start, end)
+    with metrics.calendar_call("events_patch"):
+        response = await aio.http_client().patch(_api_url(f"calendars/primary/events/{event_id}"),
+                                                 headers=await _auth_headers(), timeout=CALENDAR_TIMEOUT,
+                                                 json={"start": body["start"], "end": body["end"]})
+        response.raise_for_status()
+    return response.json()
 
 # === GET ALL EVENTS ===
-def get_events_from_calendar(start, end):
-    service = get_service()
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=start.isoformat(),
-        timeMax=end.isoformat(),
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    return events_result.get('items', [])
-
-# === GET REVISION SESSIONS ===
-def get_revision_sessions():
-    service = get_service()
-
-    now = datetime.now().isoformat()
-    future = (datetime.now() + timedelta(days=14)).isoformat()
-
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        timeMax=future,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-
-    events = events_result.get('items', [])
-
-    revision_sessions = []
-    for event in events:
-        if '📖 Study:' in event.get("summary", ""):
-            revision_sessions.append({
-                "id": event["id"],
-                "title": event["summary"].replace("📖 Study: ", "").strip(),
-                "start": event["start"].get("dateTime", ""),
-                "end": event["end"].get("dateTime", "")
-            })
-
-    return revision_sessions
+async def list_events_async(start, end):
+    """Events between start and end, recurring ones expanded."""
+    with metrics.calendar_call("events_list"):
+        response = await aio.http_client().get(_api_url("calendars/primary/events"), headers=await _auth_headers(),
+                                               timeout=CALENDAR_TIMEOUT, params={
+            "timeMin": start.isoformat(),
+            "timeMax": end.isoformat(),
+            "singleEvents": "true",
+            "orderBy": "startTime",
+            "maxResults": 2500,
+        })
+        response.raise_for_status()
+    return response.json().get("items", [])
@@ -0,0 +1,166 @@
+"""
+Chat memory with a fixed token budget.
+
+Each user's conversation is stored server-side (storage "chat"): the turns, for
+display, and a running summary of the turns folded so far. A /chat prompt gets
+that summary plus the newest turns verbatim, until HISTORY_TOKEN_BUDGET is
+spent, so its size no longer grows with the length of the conversation.
+
+Once more than RECENT_TURNS + COMPACT_EVERY turns are not in the summary, a
+background thread folds the older ones into it with one LLM call (previous
+summary + those turns, never the whole conversation). The student's request
+never waits for it; until it lands, the prompt just carries fewer old turns.
+
+Turn indexes ("summarized", "offset") count from the start of the conversation,
+so old summarized turns can be dropped from the document (MAX_TURNS) while a
+compaction is running.
+"""
+import os
+import threading
+import uuid
+
+from utils import llm_router, storage
+from utils.text_prep import CHARS_PER_TOKEN, estimate_tokens
+
+# === CONFIGURATION ===
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 800))  # running summary + verbatim turns
+SUMMARY_TOKENS = 250
+RECENT_TURNS = 3        # newest turns never folded into the summary
+COMPACT_EVERY = 2       # fold turns by batches of this size
+COMPACT_MAX_TOKENS = 2500   # new turns sent to one compaction
+MAX_TURNS = 100         # turns kept for display
+
+COMPACT_PROMPT = """
+Tu résumes une conversation de révision entre un étudiant et un assistant.
+
+Résumé actuel :
+{summary}
+
+Nouveaux échanges :
+{turns}
+
+Mets à jour le résumé pour qu'il couvre aussi les nouveaux échanges : questions posées,
+notions expliquées, difficultés de l'étudiant. Réponds uniquement par le résumé, en {words} mots au plus.
+"""
+
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+def _empty():
+    return {"id": uuid.uuid4().hex[:12], "summary": "", "summarized": 0, "offset": 0, "turns": []}
+
+
+def load(user=None):
+    return storage.read_json("chat", user=user) or _empty()
+
+
+def turns(user=None):
+    return load(user)["turns"]
+
+
+def clear(user=None):
+    storage.write_json("chat", _empty(), user=user)
+
+
+# === PROMPT ===
+def format_turns(turns):
+    return "\n".join(f"Étudiant : {t['user']}\nAssistant : {t['assistant']}" for t in turns)
+
+
+def _clip(text, tokens):
+    limit = max(0, tokens) * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def history_text(chat=None, budget=HISTORY_TOKEN_BUDGET):
+    """Running summary and the newest turns not in it, within `budget` tokens."""
+    chat = chat or load()
+    summary = _clip(chat["summary"], SUMMARY_TOKENS)
+    left = budget - estimate_tokens(summary)
+    recent = []
+    for turn in reversed(chat["turns"][chat["summarized"] - chat["offset"]:]):
+        text = format_turns([turn])
+        if estimate_tokens(text) > left:
+            if not recent:   # always keep the last turn, cut to fit
+                recent.append(_clip(text, left))
+            break
+        recent.append(text)
+        left -= estimate_tokens(text)
+
+    parts = []
+    if summary:
+        parts.append(f"Résumé des échanges précédents : {summary}")
+    parts.extend(reversed(recent))
+    return "\n".join(parts)
+
+
+# === UPDATES ===
+def record(question, answer):
+    """Append a turn to the current user's conversation and fold old turns in the background when due."""
+    user = storage.user_id()
+
+    def append(chat):
+        chat = chat or _empty()
+        chat["turns"].append({"user": question, "assistant": answer})
+        drop = min(len(chat["turns"]) - MAX_TURNS, chat["summarized"] - chat["offset"])
+        if drop > 0:
+            chat["turns"] = chat["turns"][drop:]
+            chat["offset"] += drop
+        return chat
+
+    chat = storage.update_json("chat", append, user=user)
+    if _pending(chat) >= RECENT_TURNS + COMPACT_EVERY:
+        compact_in_background(user)
+    return chat
+
+
+def _pending(chat):
+    """Turns not folded into the summary yet."""
+    return chat["offset"] + len(chat["turns"]) - chat["summarized"]
+
+
+def compact(user):
+    """Fold every turn but the RECENT_TURNS newest into the summary; False when there was nothing to fold."""
+    chat = load(user)
+    base, upto = chat["summarized"], chat["offset"] + len(chat["turns"]) - RECENT_TURNS
+    if upto <= base:
+        return False
+    new_turns = chat["turns"][base - chat["offset"]:upto - chat["offset"]]
+    prompt = COMPACT_PROMPT.format(summary=chat["summary"] or "(aucun)",
+                                   turns=_clip(format_turns(new_turns), COMPACT_MAX_TOKENS),
+                                   words=SUMMARY_TOKENS * 3 // 4)
+    summary = llm_router.generate(prompt, "chat_summary").strip()
+
+    def apply(current):
+        # Skip if the chat was cleared or another worker folded these turns meanwhile
+        if not current or current["id"] != chat["id"] or current["summarized"] != base:
+            return current
+        current["summary"] = _clip(summary, SUMMARY_TOKENS)
+        current["summarized"] = upto
+        return current
+
+    storage.update_json("chat", apply, user=user)
+    print(f"🧾 Chat history: folded {len(new_turns)} turns into the summary")
+    return True
+
+
+def compact_in_background(user):
+    """Start folding `user`'s older turns unless a compaction is already running in this worker."""
+    with _compacting_lock:
+        if user in _compacting:
+            return False
+        _compacting.add(user)
+
+    def run():
+        try:
+            while _pending(load(user)) >= RECENT_TURNS + COMPACT_EVERY and compact(user):
+                pass   # turns that arrived during the call
+        except Exception as e:
+            print(f"❌ Chat history compaction failed: {e}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(user)
+
+    threading.Thread(target=run, name="chat-compaction", daemon=True).start()
+    return True
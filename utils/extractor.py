@@ -1,17 +1,111 @@
-import fitz
-from pptx import Presentation
+import posixpath
+import time
+import zipfile
+from io import BytesIO
+from xml.etree.ElementTree import iterparse
+from utils import metrics
+from utils.text_prep import compact_text
+from utils.tracing import span
+
+def extract_pages_from_pdf(source):
+    """Raw text of every page; `source` is a path, bytes or a binary stream."""
+    import fitz  # imported lazily to keep worker boot fast
+    start = time.perf_counter()
+    with span("extract.pdf", "extraction"):
+        if isinstance(source, str):
+            doc = fitz.open(source)
+        else:
+            data = source if isinstance(source, bytes) else source.read()
+            doc = fitz.open(stream=BytesIO(data), filetype="pdf")
+        pages = [page.get_text() for page in doc]
+    metrics.observe_extraction("pdf", time.perf_counter() - start, len(pages))
+    return pages
+
+# === PPTX ===
+# Slides are read straight from the zip: python-pptx would load every part
+# (media included) into an object graph, and its shape.text misses groups,
+# tables and speaker notes.
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+PRESENTATION_PART = "ppt/presentation.xml"
+SHAPE_TAGS = {P_NS + tag for tag in ("sp", "pic", "cxnSp", "graphicFrame", "grpSp")}
+
+def _rels(zf, part):
+    """{rId: (type, part name)} for a part's internal relationships."""
+    folder, name = posixpath.split(part)
+    rels_part = posixpath.join(folder, "_rels", name + ".rels")
+    if rels_part not in zf.NameToInfo:
+        return {}
+    rels = {}
+    for _, elem in iterparse(zf.open(rels_part)):
+        if elem.tag == REL_NS + "Relationship" and elem.get("TargetMode") != "External":
+            target = posixpath.normpath(posixpath.join(folder, elem.get("Target")))
+            rels[elem.get("Id")] = (elem.get("Type"), target)
+    return rels
+
+def _slide_ids(zf):
+    """Relationship ids of the slides, in presentation order (from the slide list only)."""
+    ids = []
+    for _, elem in iterparse(zf.open(PRESENTATION_PART)):
+        if elem.tag == P_NS + "sldId":
+            ids.append(elem.get(R_NS + "id"))
+        elif elem.tag == P_NS + "sldIdLst":
+            break
+    return ids
+
+def _part_text(zf, part):
+    """Text of a slide or notes part, one line per paragraph (tables and groups included)."""
+    lines, runs = [], []
+    for _, elem in iterparse(zf.open(part)):
+        tag = elem.tag
+        if tag == A_NS + "t":
+            runs.append(elem.text or "")
+        elif tag == A_NS + "br":
+            runs.append("\n")
+        elif tag == A_NS + "fld":
+            if elem.find(A_NS + "t") is not None:
+                runs.pop()   # slide numbers, dates
+        elif tag == A_NS + "p":
+            line = "".join(runs).strip()
+            if line:
+                lines.append(line)
+            runs = []
+            elem.clear()
+        elif tag in SHAPE_TAGS:
+            elem.clear()   # drop the shape's geometry once it has been read
+    return "\n".join(lines)
+
+def count_pptx_slides(path):
+    """Number of slides, read from the presentation's slide list without opening any slide."""
+    with zipfile.ZipFile(path) as zf:
+        return len(_slide_ids(zf))
+
+def iter_pptx_slides(path):
+    """Yield the text of each slide, followed by its speaker notes."""
+    with zipfile.ZipFile(path) as zf:
+        presentation = _rels(zf, PRESENTATION_PART)
+        for rid in _slide_ids(zf):
+            slide = presentation[rid][1]
+            text = _part_text(zf, slide)
+            notes = [target for kind, target in _rels(zf, slide).values() if kind.endswith("/notesSlide")]
+            if notes:
+                text = "\n".join(filter(None, (text, _part_text(zf, notes[0]))))
+            yield text + "\n"
+
+def extract_pages_from_pptx(path):
+    """Raw text of every slide."""
+    start = time.perf_counter()
+    with span("extract.pptx", "extraction", file=path):
+        pages = list(iter_pptx_slides(path))
+    metrics.observe_extraction("pptx", time.perf_counter() - start, len(pages))
+    return pages
 
 def extract_text_from_pdf(path):
-    doc = fitz.open(path)
-    return "\n".join(page.get_text() for page in doc), len(doc)
+    pages = extract_pages_from_pdf(path)
+    return compact_text(pages), len(pages)
 
 def extract_text_from_pptx(path):
-    prs = Presentation(path)
-    text = ""
-    count = 0
-    for slide in prs.slides:
-        count += 1
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text += shape.text + "\n"
-    return text, count
+    pages = extract_pages_from_pptx(path)
+    return compact_text(pages), len(pages)
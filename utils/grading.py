@@ -0,0 +1,208 @@
+"""
+Bulk quiz grading.
+
+Every generated quiz is saved under an id derived from its content, so a class
+can take the same quiz and have all submissions graded in one call. The answer
+key is compiled once per quiz into an array. A batch of submissions becomes a
+students x questions matrix of option indexes (-1 for blank or invalid), and
+everything is computed with whole-array comparisons:
+
+* per student: score and percentage;
+* per question: difficulty (share of correct answers), discrimination
+  (correlation between getting the question right and the score on the other
+  questions, plus the upper/lower 27% index), and how often each option was
+  picked;
+* for the quiz: score mean, spread and KR-20 reliability.
+
+numpy is imported on first use, to keep worker boot fast.
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+from utils.tracing import span
+
+# === CONFIGURATION ===
+QUIZ_DIR = os.getenv("QUIZ_DIR", os.path.join("cache", "quizzes"))
+MAX_SUBMISSIONS = int(os.getenv("GRADING_MAX_SUBMISSIONS", 20000))
+OPTIONS = "ABCD"
+GROUP_SHARE = 0.27   # upper/lower groups for the discrimination index
+
+# Accepted answer spellings -> option index
+_CODES = {form: i for i, letter in enumerate(OPTIONS) for form in (letter, letter.lower(), i)}
+
+
+class GradingError(ValueError):
+    """The submissions do not fit the quiz."""
+
+
+# === QUIZ STORAGE ===
+def quiz_id(questions):
+    payload = json.dumps([[q["question"], q["options"], q["answer"]] for q in questions], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _quiz_path(qid):
+    return os.path.join(QUIZ_DIR, f"{qid}.json")
+
+
+def save_quiz(questions):
+    """Store a quiz ({"question", "options", "answer"} entries) and return its id."""
+    qid = quiz_id(questions)
+    if os.path.exists(_quiz_path(qid)):
+        return qid
+    os.makedirs(QUIZ_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=QUIZ_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"quiz_id": qid, "questions": [
+            {"question": q["question"], "options": q["options"], "answer": q["answer"]} for q in questions
+        ]}, f, ensure_ascii=False)
+    os.replace(tmp, _quiz_path(qid))
+    return qid
+
+
+def load_quiz(qid):
+    if not qid or not qid.isalnum() or not os.path.exists(_quiz_path(qid)):
+        return None
+    with span("state.read", "state", file="quiz"):
+        with open(_quiz_path(qid), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def answer_key(qid):
+    """Correct option index per question, or None for an unknown quiz."""
+    if not qid or not qid.isalnum() or not os.path.exists(_quiz_path(qid)):
+        return None
+    return _compiled_key(qid)
+
+
+@functools.lru_cache(maxsize=256)
+def _compiled_key(qid):
+    # Safe to cache: quizzes are immutable, the id is a content hash
+    import numpy as np
+    return np.array([q["answer"] for q in load_quiz(qid)["questions"]], dtype=np.int8)
+
+
+# === GRADING ===
+def _code(answer):
+    """Option index of one answer: "B", "b", 1 or the form value "B) ..." (-1 when blank or invalid)."""
+    if isinstance(answer, bool) or (answer is not None and not isinstance(answer, (str, int))):
+        raise GradingError(f"invalid answer {json.dumps(answer)[:40]}: expected a letter or an option index")
+    if isinstance(answer, str) and len(answer) > 1:
+        if answer[1] != ")":   # "Because..." is not "B"
+            return -1
+        answer = answer[0]
+    return _CODES.get(answer, -1)
+
+
+def _row(answers, count):
+    if isinstance(answers, dict):   # {"q0": "A", ...} as posted by the quiz form
+        answers = [answers.get(f"q{i}") for i in range(count)]
+    if not isinstance(answers, list):
+        raise GradingError("answers must be a list or a {\"q0\": ...} object")
+    row = [_code(a) for a in answers[:count]]
+    return row + [-1] * (count - len(row))
+
+
+def encode(submissions, count):
+    """students x questions matrix of option indexes."""
+    import numpy as np
+    if not submissions:
+        raise GradingError("no submissions")
+    if len(submissions) > MAX_SUBMISSIONS:
+        raise GradingError(f"at most {MAX_SUBMISSIONS} submissions per call")
+    rows = []
+    for s in submissions:
+        if not isinstance(s, dict):
+            raise GradingError("each submission must be an object with answers")
+        rows.append(_row(s.get("answers"), count))
+    return np.array(rows, dtype=np.int8).reshape(len(rows), count)
+
+
+def item_statistics(correct, responses):
+    """Per-question difficulty, discrimination and option counts from the boolean correct matrix."""
+    import numpy as np
+    n, count = correct.shape
+    x = correct.astype(np.float64)
+    scores = x.sum(axis=1)
+    difficulty = x.mean(axis=0)
+
+    # Item-rest point-biserial correlation
+    rest = scores[:, None] - x
+    xc, rc = x - x.mean(axis=0), rest - rest.mean(axis=0)
+    denominator = np.sqrt((xc ** 2).sum(axis=0) * (rc ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = np.where(denominator > 0, (xc * rc).sum(axis=0) / denominator, np.nan)
+
+    # Upper/lower group index: p(correct | top 27%) - p(correct | bottom 27%)
+    group = max(1, int(round(n * GROUP_SHARE))) if n >= 2 else 0
+    if group:
+        order = np.argsort(scores, kind="stable")
+        upper_lower = x[order[-group:]].mean(axis=0) - x[order[:group]].mean(axis=0)
+    else:
+        upper_lower = np.full(count, np.nan)
+
+    picked = np.stack([(responses == k).sum(axis=0) for k in range(len(OPTIONS))], axis=1)
+    blank = (responses < 0).sum(axis=0)
+
+    def number(value):
+        return None if np.isnan(value) else round(float(value), 3)
+
+    return [
+        {
+            "question": j + 1,
+            "difficulty": number(difficulty[j]),
+            "discrimination": number(discrimination[j]),
+            "upper_lower": number(upper_lower[j]),
+            "options": dict(zip(OPTIONS, picked[j].tolist())),
+            "blank": int(blank[j]),
+        }
+        for j in range(count)
+    ]
+
+
+def grade(qid, submissions):
+    """Grade a batch of {"student", "answers"} submissions against quiz `qid` (None if the quiz is unknown)."""
+    key = answer_key(qid)
+    if key is None:
+        return None
+    count = len(key)
+    with span("grading.grade", submissions=len(submissions)):
+        responses = encode(submissions, count)
+        correct = responses == key
+        scores = correct.sum(axis=1)
+
+        p = correct.mean(axis=0)
+        score_variance = scores.var()
+        kr20 = None
+        if count > 1 and score_variance > 0:
+            kr20 = (count / (count - 1)) * (1 - (p * (1 - p)).sum() / score_variance)
+
+        results = [
+            {"student": s.get("student", i), "score": int(score), "percent": round(100.0 * score / count, 1)}
+            for i, (s, score) in enumerate(zip(submissions, scores.tolist()))
+        ]
+        return {
+            "quiz_id": qid,
+            "questions": count,
+            "submissions": len(scores),
+            "results": results,
+            "summary": {
+                "mean": round(float(scores.mean()), 3),
+                "std": round(float(scores.std()), 3),
+                "min": int(scores.min()),
+                "max": int(scores.max()),
+                "reliability_kr20": round(float(kr20), 3) if kr20 is not None else None,
+            },
+            "items": item_statistics(correct, responses),
+        }
+
+
+def score(qid, answers):
+    """Share of correct answers for one submission (0 when the quiz is unknown)."""
+    graded = grade(qid, [{"answers": answers}])
+    if not graded or not graded["questions"]:
+        return 0
+    return graded["results"][0]["score"] / graded["questions"]
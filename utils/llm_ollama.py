@@ -0,0 +1,62 @@
+import json
+import os
+from utils import admission, aio, metrics
+from utils.structured import JSONStream
+
+# Local LLM (override OLLAMA_URL to point at bench/fake_server.py for load tests)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_TEXT_MODEL = os.getenv("OLLAMA_TEXT_MODEL", "llama3.2:latest")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", 300))
+
+# Seconds to keep the model loaded after each call, set by utils/warmup.py while a
+# scheduled session pins it (None = Ollama's default, 5 minutes)
+_keep_alive = None
+
+def set_keep_alive(seconds):
+    global _keep_alive
+    _keep_alive = seconds
+
+def _payload(prompt, format=None, stream=False):
+    payload = {
+        "model": OLLAMA_TEXT_MODEL,
+        "prompt": prompt,
+        "stream": stream
+    }
+    if format is not None:
+        payload["format"] = format  # JSON schema the output is constrained to
+    if _keep_alive is not None:
+        payload["keep_alive"] = _keep_alive  # Ollama resets the timer on every call
+    return payload
+
+async def agenerate(prompt, task="generate", format=None):
+    """Run an Ollama generation on the event loop and return the response text."""
+    if format is not None:
+        return await _agenerate_json(prompt, task, format)
+    async with admission.controller("ollama").aslot(task):
+        with metrics.llm_call("ollama", task) as call:
+            response = await aio.http_client().post(OLLAMA_URL, json=_payload(prompt), timeout=OLLAMA_TIMEOUT)
+            response.raise_for_status()
+            result = response.json()
+            text = result.get("response", "")
+            call.record(prompt, text, result.get("prompt_eval_count"), result.get("eval_count"))
+    return text
+
+async def _agenerate_json(prompt, task, format):
+    """Stream a schema-constrained generation and hang up as soon as the JSON value is complete."""
+    stream, counts = JSONStream(), (None, None)
+    async with admission.controller("ollama").aslot(task):
+        with metrics.llm_call("ollama", task) as call:
+            async with aio.http_client().stream("POST", OLLAMA_URL, json=_payload(prompt, format, stream=True),
+                                                timeout=OLLAMA_TIMEOUT) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("done"):
+                        counts = (chunk.get("prompt_eval_count"), chunk.get("eval_count"))
+                    if stream.feed(chunk.get("response", "")) or chunk.get("done"):
+                        break   # closing the response stops the generation on Ollama
+            text = stream.text() or "".join(stream.buffer)
+            call.record(prompt, text, *counts)
+    return text
@@ -0,0 +1,224 @@
+"""
+Routing, hedging and failover across Ollama and Groq for text generations.
+
+For each call the router ranks the backends that can serve the task:
+
+* prompts too long for the local model's context only go to Groq;
+* otherwise each backend's expected latency for this task is its moving-average
+  call duration, stretched by how many calls are queued in front of it
+  (utils/admission.py). The task's preferred backend keeps the call unless the
+  other one is expected to be ROUTE_SWITCH_RATIO times faster.
+
+The first-ranked backend is called right away. If it has not answered after the
+task's hedge delay, the same prompt is sent to the other backend and whichever
+answers first wins; the slower request is cancelled (closing its connection,
+which also stops the generation on Ollama). An error or a full queue on one
+backend falls back to the other immediately. Wins are counted per task and
+backend in eduflex_llm_route_wins_total.
+
+Both backends answer the same plain-text prompts, so callers only pass the
+prompt and the task; generate() is the blocking version for sync code. With a
+`schema` (utils/structured.py) both backends are constrained to it and the
+parsed value is returned instead of text; an answer that still does not fit
+falls back to the other backend like an error, without marking the backend as
+failing.
+"""
+import asyncio
+import os
+import threading
+import time
+
+from utils import admission, aio, llm_groq, llm_ollama, metrics, structured
+from utils.text_prep import estimate_tokens
+
+# === CONFIGURATION ===
+OLLAMA, GROQ = "ollama", "groq"
+
+# Preferred backend per task; the other one is the alternate
+PREFERRED = {
+    "chat": OLLAMA,
+    "chat_summary": OLLAMA,
+    "quiz": OLLAMA,
+    "summary": OLLAMA,
+    "summary_map": OLLAMA,
+    "question_bank": OLLAMA,
+    "study_plan": GROQ,
+}
+
+# Seconds before a hedged request goes to the alternate backend (None = never hedge).
+# Override per task with LLM_HEDGE_DELAY_<TASK>, e.g. LLM_HEDGE_DELAY_CHAT=3.
+HEDGE_DELAYS = {
+    "chat": 6.0,
+    "quiz": 10.0,
+    "summary": 20.0,
+    "summary_map": 20.0,
+    "study_plan": 15.0,
+    "question_bank": None,   # background work: not worth paying twice
+    "chat_summary": None,
+}
+
+GROQ_PARAMS = {
+    "quiz": {"temperature": 0.4, "max_tokens": 1500},
+    "chat_summary": {"temperature": 0.2, "max_tokens": 512},
+    "study_plan": {"temperature": 0.3, "max_tokens": 4096},
+}
+DEFAULT_GROQ_PARAMS = {"temperature": 0.5, "max_tokens": 2048}
+
+OLLAMA_MAX_PROMPT_TOKENS = int(os.getenv("OLLAMA_MAX_PROMPT_TOKENS", 3500))  # above this Ollama truncates
+GROQ_MAX_PROMPT_TOKENS = int(os.getenv("GROQ_MAX_PROMPT_TOKENS", 6000))      # context minus room for the answer
+ROUTE_SWITCH_RATIO = float(os.getenv("LLM_ROUTE_SWITCH_RATIO", 2.0))
+ERROR_COOLDOWN = float(os.getenv("LLM_ERROR_COOLDOWN", 30.0))  # seconds a failing backend is ranked last
+LATENCY_ALPHA = 0.2
+
+
+def hedge_delay(task):
+    override = os.getenv(f"LLM_HEDGE_DELAY_{task.upper()}")
+    if override is not None:
+        return float(override) if override.lower() != "none" else None
+    return HEDGE_DELAYS.get(task, HEDGE_DELAYS["chat"])
+
+
+def groq_enabled():
+    return bool(llm_groq.GROQ_API_KEY or os.getenv("GROQ_BASE_URL"))
+
+
+def max_prompt_tokens():
+    """Largest prompt that reaches a backend whole: long prompts go to Groq when it is configured."""
+    return GROQ_MAX_PROMPT_TOKENS if groq_enabled() else OLLAMA_MAX_PROMPT_TOKENS
+
+
+# === OBSERVED LATENCY ===
+_latency = {}        # (backend, task) -> moving average of successful calls' service time (queue wait excluded)
+_failed_until = {}   # backend -> time until which it is ranked last
+_state_lock = threading.Lock()
+
+
+def _observe(backend, task, seconds):
+    with _state_lock:
+        previous = _latency.get((backend, task))
+        _latency[(backend, task)] = seconds if previous is None else previous + LATENCY_ALPHA * (seconds - previous)
+        _failed_until.pop(backend, None)
+
+
+def _observe_error(backend):
+    with _state_lock:
+        _failed_until[backend] = time.monotonic() + ERROR_COOLDOWN
+
+
+def expected_latency(backend, task):
+    """Moving-average service time for the task, stretched by the backend's admission queue (None if unknown)."""
+    with _state_lock:
+        latency = _latency.get((backend, task))
+    if latency is None:
+        return None
+    ctl = admission.controller(backend)
+    stats = ctl.stats()
+    waiting = stats["running"] + sum(stats["queued"].values())
+    return latency * max(1.0, waiting / ctl.max_concurrency)
+
+
+def rank(task, prompt):
+    """Backends to try for this call, best first."""
+    preferred = PREFERRED.get(task, OLLAMA)
+    if not groq_enabled():
+        return [OLLAMA]
+    if estimate_tokens(prompt) > OLLAMA_MAX_PROMPT_TOKENS:
+        return [GROQ]
+
+    other = GROQ if preferred == OLLAMA else OLLAMA
+    order = [preferred, other]
+    now = time.monotonic()
+    with _state_lock:
+        failing = {b for b, until in _failed_until.items() if until > now}
+    if preferred in failing and other not in failing:
+        return [other, preferred]
+
+    mine, theirs = expected_latency(preferred, task), expected_latency(other, task)
+    if mine is not None and theirs is not None and theirs * ROUTE_SWITCH_RATIO < mine:
+        order.reverse()
+    return order
+
+
+# === CALLS ===
+async def _call(backend, prompt, task, schema=None):
+    start = time.perf_counter()
+    try:
+        if backend == OLLAMA:
+            text = await llm_ollama.agenerate(prompt, task=task, format=schema)
+        else:
+            params = GROQ_PARAMS.get(task, DEFAULT_GROQ_PARAMS)
+            if schema is not None:
+                params = dict(params, response_format=structured.groq_response_format(schema, llm_groq.GROQ_MODEL))
+            text = await llm_groq.achat([{"role": "user", "content": prompt}], task, **params)
+    except admission.Overloaded:
+        raise   # a full queue says nothing about the backend's health
+    except Exception:
+        _observe_error(backend)
+        raise
+    # Service time only: the queue is accounted for by expected_latency()
+    _observe(backend, task, time.perf_counter() - start - admission.last_queue_wait())
+    if schema is None:
+        return text
+    try:
+        return structured.parse(text, schema)
+    except structured.StructuredOutputError:
+        metrics.LLM_STRUCTURED_FAILURES.inc(backend, task)
+        print(f"📨 Unusable {task} output from {backend}: {text[:300]}")
+        raise
+
+
+async def agenerate(prompt, task, schema=None):
+    """Generate with the best backend for `task`, hedging and failing over to the other one."""
+    if schema is not None:
+        prompt += structured.instructions(schema)
+    backends = rank(task, prompt)
+    delay = hedge_delay(task) if len(backends) > 1 else None
+
+    tasks = {asyncio.ensure_future(_call(backends[0], prompt, task, schema)): (backends[0], "primary")}
+    pending_backends = backends[1:]
+    errors = []
+
+    def launch(via):
+        backend = pending_backends.pop(0)
+        if via == "hedge":
+            metrics.LLM_HEDGES.inc(task, backend)
+        tasks[asyncio.ensure_future(_call(backend, prompt, task, schema))] = (backend, via)
+
+    try:
+        timeout = delay
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch("hedge")     # the primary is slow: race the alternate against it
+                timeout = None
+                continue
+            for finished in done:
+                backend, via = tasks.pop(finished)
+                if finished.exception() is None:
+                    metrics.LLM_ROUTE_WINS.inc(task, backend, via)
+                    return finished.result()
+                errors.append(finished.exception())
+                print(f"⚠️ {backend} failed for {task}: {finished.exception()}")
+            if not tasks and pending_backends:
+                launch("fallback")
+                timeout = None
+        raise errors[0]
+    finally:
+        for loser in tasks:
+            loser.cancel()
+
+
+def generate(prompt, task, schema=None):
+    """Blocking agenerate() for sync code (not to be called from the event loop)."""
+    return aio.run(agenerate(prompt, task, schema))
+
+
+# === REPORTING ===
+def _collect_latency():
+    with _state_lock:
+        return {(backend, task): seconds for (backend, task), seconds in _latency.items()}
+
+
+metrics.REGISTRY.append(metrics.Gauge(
+    "eduflex_llm_route_latency_seconds", "Moving-average LLM latency used for routing.", ("backend", "task"),
+    _collect_latency))
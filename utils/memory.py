@@ -1,24 +1,14 @@
-import json
-import os
-
-MEMORY_FILE = "memory.json"
+from utils import storage
 
 def save_progress(topic, score):
-    memory = []
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE) as f:
-            memory = json.load(f)
-
-    memory.append({
-        "topic": topic,
-        "score": score
-    })
+    def append(memory):
+        memory.append({
+            "topic": topic,
+            "score": score
+        })
+        return memory
 
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
+    storage.update_json("memory", append, default=[])
 
 def get_memory():
-    if not os.path.exists(MEMORY_FILE):
-        return []
-    with open(MEMORY_FILE) as f:
-        return json.load(f)
+    return storage.read_json("memory", default=[])
@@ -0,0 +1,248 @@
+"""
+In-process metrics exposed in Prometheus text format at /metrics.
+
+Counters and histograms are plain dicts keyed by label tuples and guarded by
+one lock per metric, so recording a sample costs a few microseconds and can
+stay on in production. Each worker process keeps its own registry.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+from utils.tracing import span
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+PER_PAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+# === METRIC TYPES ===
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.values = {}  # label tuple -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        idx = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.values.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read when /metrics is scraped: `collect()` returns {label tuple: value}."""
+
+    def __init__(self, name, help_text, labels, collect):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# === REGISTRY ===
+HTTP_LATENCY = Histogram(
+    "eduflex_http_request_duration_seconds", "HTTP request latency by blueprint and route.",
+    ("blueprint", "route", "method", "status"))
+LLM_LATENCY = Histogram(
+    "eduflex_llm_request_duration_seconds", "LLM call duration by backend and task.",
+    ("backend", "task"))
+LLM_PROMPT_CHARS = Histogram(
+    "eduflex_llm_prompt_chars", "Prompt size in characters.", ("backend", "task"), SIZE_BUCKETS)
+LLM_COMPLETION_CHARS = Histogram(
+    "eduflex_llm_completion_chars", "Completion size in characters.", ("backend", "task"), SIZE_BUCKETS)
+LLM_TOKENS = Counter(
+    "eduflex_llm_tokens_total", "Tokens reported by the backend.", ("backend", "task", "kind"))
+LLM_ERRORS = Counter(
+    "eduflex_llm_errors_total", "Failed LLM calls.", ("backend", "task"))
+CALENDAR_LATENCY = Histogram(
+    "eduflex_calendar_request_duration_seconds", "Google Calendar API call latency.", ("operation",))
+CALENDAR_ERRORS = Counter(
+    "eduflex_calendar_errors_total", "Failed Google Calendar API calls.", ("operation",))
+EXTRACTION_PER_PAGE = Histogram(
+    "eduflex_extraction_seconds_per_page", "Text extraction time per page or slide.", ("format",),
+    PER_PAGE_BUCKETS)
+EXTRACTION_PAGES = Counter(
+    "eduflex_extraction_pages_total", "Pages or slides extracted.", ("format",))
+CACHE_REQUESTS = Counter(
+    "eduflex_cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+LLM_QUEUE_WAIT = Histogram(
+    "eduflex_llm_queue_wait_seconds", "Time LLM calls waited for an admission slot.", ("backend", "priority"))
+LLM_HEDGES = Counter(
+    "eduflex_llm_hedges_total", "Hedged requests sent to the alternate backend.", ("task", "backend"))
+LLM_ROUTE_WINS = Counter(
+    "eduflex_llm_route_wins_total", "Generations by the backend that answered first.", ("task", "backend", "via"))
+LLM_STRUCTURED_FAILURES = Counter(
+    "eduflex_llm_structured_failures_total", "Generations that did not match the requested JSON schema.",
+    ("backend", "task"))
+LLM_ADMISSION_REJECTIONS = Counter(
+    "eduflex_llm_admission_rejections_total", "LLM calls turned away by admission control.",
+    ("backend", "priority", "reason"))
+OLLAMA_WARMUPS = Counter(
+    "eduflex_ollama_warmup_total", "Scheduled model loads, releases and pre-run subjects.", ("action",))
+
+REGISTRY = [
+    HTTP_LATENCY, LLM_LATENCY, LLM_PROMPT_CHARS, LLM_COMPLETION_CHARS, LLM_TOKENS, LLM_ERRORS,
+    CALENDAR_LATENCY, CALENDAR_ERRORS, EXTRACTION_PER_PAGE, EXTRACTION_PAGES, CACHE_REQUESTS,
+    LLM_QUEUE_WAIT, LLM_ADMISSION_REJECTIONS, LLM_HEDGES, LLM_ROUTE_WINS, LLM_STRUCTURED_FAILURES,
+    OLLAMA_WARMUPS,
+]
+
+
+def render():
+    """Render every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    # Derived gauge so dashboards don't have to compute the ratio themselves
+    with CACHE_REQUESTS.lock:
+        counts = dict(CACHE_REQUESTS.values)
+    caches = sorted({cache for cache, _ in counts})
+    lines.append("# HELP eduflex_cache_hit_ratio Cache hits / lookups since start.")
+    lines.append("# TYPE eduflex_cache_hit_ratio gauge")
+    for cache in caches:
+        hits = counts.get((cache, "hit"), 0)
+        total = hits + counts.get((cache, "miss"), 0)
+        lines.append(f'eduflex_cache_hit_ratio{{cache="{_escape(cache)}"}} {_number(hits / total if total else 0.0)}')
+    return "\n".join(lines) + "\n"
+
+
+# === RECORDING HELPERS ===
+class LLMCall:
+    """Handle yielded by llm_call() so the caller can attach sizes once the response is in."""
+
+    def __init__(self, backend, task):
+        self.backend = backend
+        self.task = task
+
+    def record(self, prompt, completion, prompt_tokens=None, completion_tokens=None):
+        LLM_PROMPT_CHARS.observe(len(prompt or ""), self.backend, self.task)
+        LLM_COMPLETION_CHARS.observe(len(completion or ""), self.backend, self.task)
+        if prompt_tokens:
+            LLM_TOKENS.inc(self.backend, self.task, "prompt", amount=prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.inc(self.backend, self.task, "completion", amount=completion_tokens)
+
+
+@contextmanager
+def llm_call(backend, task):
+    """Time an LLM call; exceptions are counted as errors and re-raised."""
+    start = time.perf_counter()
+    try:
+        with span(f"llm.{backend}", "llm", task=task):
+            yield LLMCall(backend, task)
+    except asyncio.CancelledError:
+        raise   # hedge losers are cancelled on purpose
+    except BaseException:
+        LLM_ERRORS.inc(backend, task)
+        raise
+    finally:
+        LLM_LATENCY.observe(time.perf_counter() - start, backend, task)
+
+
+@contextmanager
+def calendar_call(operation):
+    """Time a Google Calendar API call; exceptions are counted as errors and re-raised."""
+    start = time.perf_counter()
+    try:
+        with span(f"calendar.{operation}", "calendar"):
+            yield
+    except BaseException:
+        CALENDAR_ERRORS.inc(operation)
+        raise
+    finally:
+        CALENDAR_LATENCY.observe(time.perf_counter() - start, operation)
+
+
+def observe_extraction(fmt, seconds, pages):
+    """Record how long extracting `pages` pages/slides of a document took."""
+    if pages:
+        EXTRACTION_PER_PAGE.observe(seconds / pages, fmt)
+        EXTRACTION_PAGES.inc(fmt, amount=pages)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+# === FLASK INTEGRATION ===
+def init_app(app):
+    """Time every request handled by `app`."""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+            HTTP_LATENCY.observe(time.perf_counter() - start, request.blueprint or "app", rule,
+                                 request.method, str(response.status_code))
+        return response
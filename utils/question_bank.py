@@ -0,0 +1,203 @@
+"""
+Per-document question bank.
+
+When a course is uploaded, a background thread asks the LLM for a pool of QCM
+over every chunk of the document (as JSON constrained to
+structured.QUIZ_SCHEMA), validates them and stores them on disk
+indexed by document and section. New quizzes are then sampled locally from
+that pool — weighted toward the questions and sections the student already
+got wrong — instead of paying for a fresh generation on every attempt.
+
+Documents are identified by the hash of their compacted text, so students who
+upload the same course share one bank.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+from utils import llm_router, metrics, structured
+from utils.summarizer import split_chunks
+from utils.tracing import span
+
+# === CONFIGURATION ===
+QUESTION_BANK_DIR = os.getenv("QUESTION_BANK_DIR", os.path.join("cache", "question_bank"))
+QUESTIONS_PER_CHUNK = 6
+CHUNK_TOKENS = 1200
+MISSED_QUESTION_WEIGHT = 4.0   # a question answered wrong before is this much likelier to come back
+MISSED_SECTION_WEIGHT = 2.0    # ...and each past mistake in a section adds this to its questions
+STALE_BUILD_SECONDS = 1800     # a "building" bank not saved for this long was left by a dead worker
+
+_building = set()
+_building_lock = threading.Lock()
+
+NUMBER_RE = re.compile(r"^\d{1,2}\s*[.)]\s*")   # "1. " some models still put before the question
+
+BANK_PROMPT = """
+Tu es un professeur. Génére exactement {count} questions à choix multiples (QCM) à partir du texte suivant :
+
+{chunk}
+
+Pour chaque question, donne le texte de la question, exactement 4 options distinctes
+et l'indice (0 à 3) de la seule bonne option.
+"""
+
+
+def document_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:20]
+
+
+# === QCM ===
+def validate(item):
+    """Turn one generated question (structured.QUIZ_SCHEMA item) into a bank entry, or None when it is not usable."""
+    question = NUMBER_RE.sub("", item["question"].strip())
+    options = [o.strip() for o in item["options"]]
+    if len(question) < 5 or len(options) != 4 or any(not o for o in options):
+        return None
+    if len({o.lower() for o in options}) != 4:
+        return None
+    return {"question": question, "options": options, "answer": item["answer"]}
+
+
+def for_display(questions):
+    """Shape quiz entries for quiz.html/results.html: numbered questions, lettered (option, is_correct) pairs."""
+    return [
+        {
+            "question": f"{i}. {q['question']}",
+            "options": [(f"{'ABCD'[j]}) {option}", j == q["answer"]) for j, option in enumerate(q["options"])],
+        }
+        for i, q in enumerate(questions, start=1)
+    ]
+
+
+# === STORAGE ===
+def _bank_path(doc_id):
+    return os.path.join(QUESTION_BANK_DIR, f"{doc_id}.json")
+
+
+def load_bank(doc_id):
+    path = _bank_path(doc_id)
+    if not doc_id or not os.path.exists(path):
+        return None
+    with span("state.read", "state", file="question_bank"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def save_bank(bank):
+    bank["updated"] = time.time()
+    os.makedirs(QUESTION_BANK_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=QUESTION_BANK_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(bank, f, ensure_ascii=False)
+    os.replace(tmp, _bank_path(bank["doc_id"]))
+
+
+def is_ready(doc_id):
+    bank = load_bank(doc_id)
+    return bool(bank and bank["status"] == "ready" and bank["questions"])
+
+
+# === BUILD ===
+def build_bank(doc_id, text):
+    """Generate, validate and store the question pool for one document (slow; run in the background)."""
+    chunks = split_chunks(text, CHUNK_TOKENS)
+    bank = {"doc_id": doc_id, "status": "building", "sections": len(chunks), "questions": []}
+    save_bank(bank)
+
+    seen = set()
+    for section, chunk in enumerate(chunks):
+        try:
+            generated = llm_router.generate(BANK_PROMPT.format(count=QUESTIONS_PER_CHUNK, chunk=chunk),
+                                            "question_bank", structured.QUIZ_SCHEMA)
+        except Exception as e:
+            print(f"⚠️ Question bank: section {section} of {doc_id} failed: {e}")
+            continue
+        for item in generated["questions"]:
+            entry = validate(item)
+            if entry is None or entry["question"].lower() in seen:
+                continue
+            seen.add(entry["question"].lower())
+            entry.update({"id": f"{section}-{len(bank['questions'])}", "section": section})
+            bank["questions"].append(entry)
+        save_bank(bank)  # partial pools are usable as soon as they're big enough
+
+    # An empty pool (LLM down, every section rejected) is retried on the next upload
+    bank["status"] = "ready" if bank["questions"] else "failed"
+    save_bank(bank)
+    if bank["questions"]:
+        print(f"✅ Question bank for {doc_id}: {len(bank['questions'])} questions over {len(chunks)} sections")
+    else:
+        print(f"⚠️ Question bank for {doc_id}: no usable question, will retry")
+    return bank
+
+
+def needs_build(bank):
+    """True when there is no usable bank and nobody is building one: missing, empty, failed or stale."""
+    if bank is None or bank["status"] == "failed":
+        return True
+    if bank["status"] == "building":
+        return time.time() - bank.get("updated", 0) > STALE_BUILD_SECONDS
+    return not bank["questions"]
+
+
+def build_in_background(doc_id, text):
+    """Start building the bank for `doc_id` unless a usable one exists or is already being built."""
+    if not needs_build(load_bank(doc_id)):
+        return False
+    with _building_lock:
+        if doc_id in _building:
+            return False
+        _building.add(doc_id)
+
+    def run():
+        try:
+            build_bank(doc_id, text)
+        except Exception as e:
+            print(f"❌ Question bank build failed for {doc_id}: {e}")
+        finally:
+            with _building_lock:
+                _building.discard(doc_id)
+
+    threading.Thread(target=run, name=f"question-bank-{doc_id}", daemon=True).start()
+    return True
+
+
+# === SAMPLING ===
+def question_key(doc_id, question):
+    """Key of a bank question in the student's mistakes: ids and sections only mean something within a document."""
+    return f"{doc_id}:{question['id']}"
+
+
+def section_key(doc_id, section):
+    return f"{doc_id}:{section}"
+
+
+def sample_quiz(doc_id, count=5, missed_questions=(), missed_sections=None, rng=random):
+    """
+    Draw `count` distinct questions from the document's pool, or None if the pool
+    is too small yet. Questions the student missed, and questions from sections
+    where they made mistakes, are weighted up (keys from question_key/section_key).
+    """
+    bank = load_bank(doc_id)
+    pool = bank["questions"] if bank else []
+    metrics.cache_lookup("question_bank", len(pool) >= count)
+    if len(pool) < count:
+        return None
+
+    missed_questions = set(missed_questions)
+    missed_sections = missed_sections or {}
+    weights = [
+        1.0
+        + (MISSED_QUESTION_WEIGHT if question_key(doc_id, q) in missed_questions else 0.0)
+        + MISSED_SECTION_WEIGHT * missed_sections.get(section_key(doc_id, q["section"]), 0)
+        for q in pool
+    ]
+
+    # Weighted sampling without replacement (Efraimidis–Spirakis keys)
+    keyed = sorted(range(len(pool)), key=lambda i: rng.random() ** (1.0 / weights[i]), reverse=True)
+    return [pool[i] for i in keyed[:count]]
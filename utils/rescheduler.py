@@ -0,0 +1,246 @@
+"""
+Incremental rescheduling of the planned study sessions.
+
+/planner builds a whole plan: freebusy over two weeks, an LLM call and one
+insert per session. Adapting the plan afterwards needs none of that. When a
+session is marked missed, or new busy events show up in the calendar,
+reschedule_async() re-places only
+
+* the missed sessions, and
+* the sessions that have not started yet and now overlap a busy event,
+
+inside the affected window: from now to the end of the plan (at least
+MIN_WINDOW_DAYS). Every other session stays where it is. Placement is
+earliest-fit into the free time between DAY_START and DAY_END in the
+calendar's time zone (with each day's own UTC offset, across DST changes),
+keeping BREAK_MINUTES around every session and event. It runs locally in milliseconds;
+then only the moved sessions' events are patched (or inserted, for sessions
+planned before their event ids were stored).
+"""
+import asyncio
+import itertools
+import time
+from datetime import datetime, time as clock, timedelta
+from zoneinfo import ZoneInfo
+
+from utils import calendar, storage
+from utils.tracing import span
+
+# === CONFIGURATION ===
+CALENDAR_TZ = ZoneInfo(calendar.CALENDAR_TIMEZONE)
+DAY_START = clock(8, 0)
+DAY_END = clock(23, 0)
+BREAK_MINUTES = 15        # kept free around every session and busy event
+ROUND_MINUTES = 15        # sessions start on the quarter hour
+SESSION_MINUTES = 120     # length of sessions planned before "end" was stored
+MIN_WINDOW_DAYS = 2
+STUDY_PREFIX = "📖 Study: "   # title of the events /planner creates
+BREAK_COURSES = {"break", "pause"}
+STATUSES = ("planned", "done", "missed")
+
+
+# === SESSIONS ===
+def _localize(moment):
+    """`moment` in the calendar's time zone (naive values are taken as calendar time)."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=CALENDAR_TZ)
+    return moment.astimezone(CALENDAR_TZ)
+
+
+def _parse(value):
+    return _localize(datetime.fromisoformat(value))
+
+
+def bounds(item):
+    start = _parse(item["start"])
+    end = _parse(item["end"]) if item.get("end") else start + timedelta(minutes=SESSION_MINUTES)
+    return start, end
+
+
+def _is_break(item):
+    return str(item.get("course", "")).strip().lower() in BREAK_COURSES
+
+
+def set_status(session_id, status, user=None):
+    """Mark a session "done", "missed" or "planned" again; returns it, or None for an unknown id."""
+    found = {}
+
+    def update(sessions):
+        for item in sessions or []:
+            if item.get("id") == session_id:
+                item["done"] = status == "done"
+                item["missed"] = status == "missed"
+                found["item"] = item
+        return sessions
+
+    storage.update_json("sessions", update, default=[], user=user)
+    return found.get("item")
+
+
+# === PLACEMENT ===
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _overlaps(interval, busy):
+    return any(start < interval[1] and interval[0] < end for start, end in busy)
+
+
+def free_intervals(start, end, busy):
+    """Free time in [start, end) between DAY_START and DAY_END each day, around the merged `busy` intervals."""
+    free = []
+    first = 0   # busy intervals are sorted: skip the ones that ended before this day
+    start, end = _localize(start), _localize(end)
+    day = start.date()
+    while day <= end.date():
+        # Each day gets its own offset: 08:00 is 06:00 UTC in summer and 07:00 UTC in winter
+        lo = max(start, datetime.combine(day, DAY_START, CALENDAR_TZ))
+        hi = min(end, datetime.combine(day, DAY_END, CALENDAR_TZ))
+        while first < len(busy) and busy[first][1] <= lo:
+            first += 1
+        cursor = lo
+        for busy_start, busy_end in itertools.islice(busy, first, None):
+            if busy_start >= hi:
+                break
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < hi:
+            free.append((cursor, hi))
+        day += timedelta(days=1)
+    return free
+
+
+def _round_up(moment):
+    hour = moment.replace(minute=0, second=0, microsecond=0)
+    step = timedelta(minutes=ROUND_MINUTES)
+    return hour + step * -(-(moment - hour) // step)
+
+
+def _place(duration, free):
+    """Earliest start that fits `duration` in `free` (which is updated), or None."""
+    for i, (start, end) in enumerate(free):
+        begin = _round_up(start)
+        if begin + duration <= end:
+            rest = begin + duration + timedelta(minutes=BREAK_MINUTES)
+            free[i:i + 1] = [(rest, end)] if rest < end else []
+            return begin
+    return None
+
+
+def plan_changes(sessions, events, now, until):
+    """
+    Where to move the sessions that need it: ({session id: (start, end)}, [ids that do not fit]).
+    `events` are the calendar's events over the window; the study events among them are ignored
+    (the sessions themselves say where those are).
+    """
+    external = []
+    for event in events:
+        if event.get("summary", "").startswith(STUDY_PREFIX) or event.get("transparency") == "transparent":
+            continue
+        if "dateTime" in event.get("start", {}) and "dateTime" in event.get("end", {}):
+            external.append((_parse(event["start"]["dateTime"]), _parse(event["end"]["dateTime"])))
+    external = _merge(external)
+
+    to_place, fixed = [], []
+    for item in sessions:
+        start, end = bounds(item)
+        movable = not item.get("done") and not _is_break(item)
+        if movable and (item.get("missed") or (now <= start < until and _overlaps((start, end), external))):
+            to_place.append((start, item, end - start))
+        elif not item.get("missed"):
+            fixed.append((start, end))
+
+    pad = timedelta(minutes=BREAK_MINUTES)
+    free = free_intervals(now, until, _merge((start - pad, end + pad) for start, end in external + fixed))
+    moves, unplaced = {}, []
+    for _, item, duration in sorted(to_place, key=lambda p: p[0]):
+        start = _place(duration, free)
+        if start is None:
+            unplaced.append(item["id"])
+        else:
+            moves[item["id"]] = (start, start + duration)
+    return moves, unplaced
+
+
+# === CALENDAR ===
+async def _push(title, event_id, start, end, semaphore):
+    """Patch the session's event (insert it when there is none); returns (event id, "patched"/"inserted") or None."""
+    async with semaphore:
+        try:
+            if event_id:
+                try:
+                    await calendar.patch_event_async(event_id, start, end)
+                    return event_id, "patched"
+                except Exception as e:
+                    if getattr(getattr(e, "response", None), "status_code", None) != 404:
+                        raise   # deleted by hand: insert it again below
+            created = await calendar.add_event_async(title, start, end)
+            return created.get("id"), "inserted"
+        except Exception as e:
+            print(f"⚠️ Failed to move event for {title}: {e}")
+            return None
+
+
+async def reschedule_async(now=None, until=None, user=None):
+    """Re-place missed and clashing sessions and push the moved ones to the calendar."""
+    started = time.perf_counter()
+    now = _localize(now or datetime.now(CALENDAR_TZ))
+    user = user or storage.user_id()
+    # Storage is blocking file I/O: run it in a thread, not on the event loop
+    sessions = await asyncio.to_thread(storage.read_json, "sessions", default=[], user=user) or []
+    report = {"moved": [], "unplaced": [], "failed": [], "events_patched": 0, "events_inserted": 0}
+    if not sessions:
+        return dict(report, took_ms=0.0)
+
+    until = _localize(until) if until else max(max(bounds(s)[1] for s in sessions),
+                                                now + timedelta(days=MIN_WINDOW_DAYS))
+    # From the oldest missed session, so their events can be found by title for older plans
+    earliest = min([bounds(s)[0] for s in sessions if s.get("missed") and not s.get("done")] + [now])
+    events = await calendar.list_events_async(earliest, until)
+
+    with span("planner.reschedule", sessions=len(sessions), events=len(events)):
+        moves, report["unplaced"] = plan_changes(sessions, events, now, until)
+
+    slots = {(e.get("summary"), _parse(e["start"]["dateTime"])): e["id"]
+             for e in events if "dateTime" in e.get("start", {})}
+    moved = [s for s in sessions if s["id"] in moves]
+    semaphore = asyncio.Semaphore(calendar.CALENDAR_CONCURRENCY)
+    with span("planner.push_events", count=len(moved)):
+        pushed = await asyncio.gather(*(
+            _push(STUDY_PREFIX + s["course"],
+                  s.get("event_id") or slots.get((STUDY_PREFIX + s["course"], bounds(s)[0])),
+                  *moves[s["id"]], semaphore)
+            for s in moved
+        ))
+
+    applied = {}
+    for item, result in zip(moved, pushed):
+        if result is None:
+            report["failed"].append(item["id"])
+            continue
+        event_id, action = result
+        report[f"events_{action}"] += 1
+        start, end = moves[item["id"]]
+        applied[item["id"]] = {"start": start.isoformat(), "end": end.isoformat(), "event_id": event_id,
+                               "missed": False}
+
+    def update(current):
+        for item in current or []:
+            if item.get("id") in applied and not item.get("done"):
+                item.update(applied[item["id"]])
+                report["moved"].append({field: item.get(field) for field in ("id", "course", "start", "end")})
+        return current
+
+    if applied:
+        await asyncio.to_thread(storage.update_json, "sessions", update, default=[], user=user)
+    report["window"] = {"start": now.isoformat(), "end": until.isoformat()}
+    report["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    print(f"🔁 Rescheduled {len(report['moved'])} session(s), {len(report['unplaced'])} without a free slot")
+    return report
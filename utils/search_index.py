@@ -0,0 +1,378 @@
+"""
+Full-text search over every course in the upload folder.
+
+Each document is indexed once into a segment stored on disk (one JSON file per
+document): its cleaned page texts and, for every term, the positions where it
+occurs on each page. Every worker merges the segments into an in-memory
+inverted index, term -> document -> page -> positions.
+
+Adding or removing a file only writes or deletes its own segment and patches
+the in-memory index with that document's terms; nothing is rebuilt. sync()
+compares the upload folder with the segments (by size and mtime) and applies
+the difference. Each worker runs it in a background thread when it starts
+(which only loads segments, except on a brand-new deployment); until it is
+done, searches answer from the documents merged so far and ready() is False.
+After that it runs in the background at most every SYNC_INTERVAL seconds, so
+files added or removed by hand, or by another worker, are picked up too. The
+upload page indexes the files it saves right away.
+
+Queries are words and "quoted phrases", all of which must appear on the page.
+Phrases are matched on positions. Pages are ranked with BM25, where a phrase
+counts as one term.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+
+from utils import extractor
+from utils.text_prep import clean_page, find_boilerplate
+from utils.tracing import span
+
+# === CONFIGURATION ===
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", os.path.join("cache", "search_index"))
+UPLOAD_FOLDER = os.path.join("static", "uploads")
+INDEXED_EXTENSIONS = (".pdf", ".pptx")
+SYNC_INTERVAL = float(os.getenv("SEARCH_SYNC_INTERVAL", 30))  # seconds between folder scans on search
+INDEX_ON_START = os.getenv("SEARCH_INDEX_ON_START", "1") != "0"
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 160
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+_docs = {}        # doc key -> {"path", "name", "size", "mtime", "pages": [text], "lengths": [tokens per page]}
+_postings = {}    # term -> {doc key: {page: [positions]}}
+_total_tokens = 0
+_total_pages = 0
+_lock = threading.RLock()
+_sync_lock = threading.Lock()   # one folder scan at a time per worker
+_last_sync = 0.0
+_ready = threading.Event()      # set once the first sync of this worker is done
+_start_lock = threading.Lock()
+_pid = None                     # process that started the first sync
+
+
+# === TOKENIZATION ===
+def normalize(token):
+    """Lowercase without accents, so "Chaîne" matches "chaine"."""
+    decomposed = unicodedata.normalize("NFKD", token.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return [normalize(m.group()) for m in TOKEN_RE.finditer(text)]
+
+
+def parse_query(query):
+    """Split a query into clauses: a list of terms each, several for a "phrase"."""
+    clauses = []
+    for phrase, word in QUERY_RE.findall(query or ""):
+        terms = tokenize(phrase or word)
+        if terms:
+            clauses.append(terms)
+    return clauses
+
+
+# === SEGMENTS ===
+def doc_key(path):
+    return hashlib.sha1(os.path.normpath(path).encode("utf-8")).hexdigest()[:16]
+
+
+def _segment_path(key):
+    return os.path.join(SEARCH_INDEX_DIR, f"{key}.json")
+
+
+def build_segment(path, pages=None):
+    """Clean and index the pages of one file (extracted here unless given)."""
+    if pages is None:
+        if path.endswith(".pptx"):
+            pages = extractor.extract_pages_from_pptx(path)
+        else:
+            pages = extractor.extract_pages_from_pdf(path)
+    stat = os.stat(path)
+    boilerplate = find_boilerplate(pages)
+    texts = [clean_page(page, boilerplate) for page in pages]
+
+    postings = {}
+    lengths = []
+    for page, text in enumerate(texts):
+        terms = tokenize(text)
+        lengths.append(len(terms))
+        for position, term in enumerate(terms):
+            postings.setdefault(term, {}).setdefault(page, []).append(position)
+    return {
+        "path": os.path.normpath(path), "name": os.path.basename(path),
+        "size": stat.st_size, "mtime": stat.st_mtime,
+        "pages": texts, "lengths": lengths,
+        "postings": {term: [[page, positions] for page, positions in pages_.items()]
+                     for term, pages_ in postings.items()},
+    }
+
+
+def _save_segment(key, segment):
+    os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=SEARCH_INDEX_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(segment, f, ensure_ascii=False)
+    os.replace(tmp, _segment_path(key))
+
+
+def _load_segment(key):
+    try:
+        with open(_segment_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# === IN-MEMORY INDEX (call with _lock held) ===
+def _merge(key, segment):
+    global _total_tokens, _total_pages
+    _drop(key)
+    for term, pages in segment["postings"].items():
+        _postings.setdefault(term, {})[key] = {page: positions for page, positions in pages}
+    _docs[key] = {field: segment[field] for field in ("path", "name", "size", "mtime", "pages", "lengths")}
+    _docs[key]["terms"] = list(segment["postings"])
+    _total_tokens += sum(segment["lengths"])
+    _total_pages += len(segment["lengths"])
+
+
+def _drop(key):
+    global _total_tokens, _total_pages
+    doc = _docs.pop(key, None)
+    if doc is None:
+        return
+    for term in doc["terms"]:
+        by_doc = _postings.get(term)
+        if by_doc is not None:
+            by_doc.pop(key, None)
+            if not by_doc:
+                del _postings[term]
+    _total_tokens -= sum(doc["lengths"])
+    _total_pages -= len(doc["lengths"])
+
+
+# === UPDATES ===
+def add_file(path, pages=None):
+    """Index (or re-index) one file and make it searchable right away."""
+    key = doc_key(path)
+    with span("search.index", "extraction", file=path):
+        segment = build_segment(path, pages)
+    _save_segment(key, segment)
+    with _lock:
+        _merge(key, segment)
+    print(f"🔎 Indexed {segment['name']}: {len(segment['pages'])} pages, {len(segment['postings'])} terms")
+    return key
+
+
+def remove_file(path):
+    key = doc_key(path)
+    try:
+        os.remove(_segment_path(key))
+    except FileNotFoundError:
+        pass
+    with _lock:
+        _drop(key)
+
+
+def _is_current(info, path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return info["size"] == stat.st_size and info["mtime"] == stat.st_mtime
+
+
+def sync(folder=UPLOAD_FOLDER):
+    """Bring the segments and this worker's index in line with the folder; returns (added, removed)."""
+    with _sync_lock:
+        return _sync(folder)
+
+
+def _sync(folder):
+    global _last_sync
+    _last_sync = time.monotonic()
+    files = {}
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            if name.lower().endswith(INDEXED_EXTENSIONS):
+                path = os.path.normpath(os.path.join(folder, name))
+                files[doc_key(path)] = path
+    added, removed = 0, 0
+
+    # Segments on disk: written by this or another worker, or stale
+    on_disk = set()
+    if os.path.isdir(SEARCH_INDEX_DIR):
+        on_disk = {n[:-5] for n in os.listdir(SEARCH_INDEX_DIR) if n.endswith(".json")}
+    for key in on_disk - set(files):
+        segment = _load_segment(key)
+        if segment and os.path.dirname(segment["path"]) == os.path.normpath(folder):
+            remove_file(segment["path"])
+            removed += 1
+
+    for key, path in files.items():
+        with _lock:
+            doc = _docs.get(key)
+        if doc is not None and _is_current(doc, path):
+            continue
+        segment = _load_segment(key) if key in on_disk else None
+        if segment is not None and _is_current(segment, path):
+            with _lock:
+                _merge(key, segment)
+            continue
+        try:
+            add_file(path)
+            added += 1
+        except Exception as e:
+            print(f"⚠️ Could not index {path}: {e}")
+
+    with _lock:
+        for key in [k for k, doc in _docs.items() if os.path.dirname(doc["path"]) == os.path.normpath(folder)
+                    and k not in files]:
+            _drop(key)
+    return added, removed
+
+
+def start():
+    """Run this worker's first sync in a background thread (once per process)."""
+    global _pid
+    if _pid == os.getpid():
+        return
+    with _start_lock:
+        if _pid != os.getpid():
+            _pid = os.getpid()
+            threading.Thread(target=_first_sync, name="search-index", daemon=True).start()
+
+
+def _first_sync():
+    try:
+        added, removed = sync()
+        print(f"🔎 Search index ready: {stats()['documents']} documents ({added} indexed, {removed} removed)")
+    except Exception as e:
+        print(f"❌ Search index build failed: {e}")
+    finally:
+        _ready.set()   # searches stop flagging their results as partial either way
+
+
+def ready():
+    return _ready.is_set()
+
+
+def wait_ready(timeout=None):
+    """Start the first sync if needed and wait for it; returns ready()."""
+    start()
+    return _ready.wait(timeout)
+
+
+def _sync_if_due():
+    if not _ready.is_set():
+        start()
+    elif time.monotonic() - _last_sync >= SYNC_INTERVAL and not _sync_lock.locked():
+        threading.Thread(target=_background_sync, name="search-sync", daemon=True).start()
+
+
+def _background_sync():
+    try:
+        sync()
+    except Exception as e:
+        print(f"❌ Search index sync failed: {e}")
+
+
+# === QUERIES ===
+def _phrase_positions(terms, key, page):
+    """Start positions of the phrase on one page."""
+    starts = set(_postings[terms[0]][key][page])
+    for offset, term in enumerate(terms[1:], start=1):
+        positions = set(_postings[term][key].get(page, ()))
+        starts = {p for p in starts if p + offset in positions}
+        if not starts:
+            break
+    return sorted(starts)
+
+
+def _clause_hits(terms):
+    """{(doc key, page): positions of the clause's first term where it matches}."""
+    if any(term not in _postings for term in terms):
+        return {}
+    # Walk the rarest term's pages; every other term must be on the same page
+    rarest = min(terms, key=lambda t: sum(len(p) for p in _postings[t].values()))
+    hits = {}
+    for key, pages in _postings[rarest].items():
+        if any(key not in _postings[t] for t in terms):
+            continue
+        for page in pages:
+            if any(page not in _postings[t][key] for t in terms):
+                continue
+            positions = _postings[terms[0]][key][page] if len(terms) == 1 else _phrase_positions(terms, key, page)
+            if positions:
+                hits[(key, page)] = positions
+    return hits
+
+
+def _snippet(text, position):
+    """A window of the page text around the token at `position`."""
+    for i, match in enumerate(TOKEN_RE.finditer(text)):
+        if i == position:
+            start = max(0, match.start() - SNIPPET_CHARS // 3)
+            snippet = " ".join(text[start:start + SNIPPET_CHARS].split())
+            return ("…" if start else "") + snippet + ("…" if start + SNIPPET_CHARS < len(text) else "")
+    return " ".join(text[:SNIPPET_CHARS].split())
+
+
+def search(query, limit=10, sync_folder=True):
+    """Ranked page-level hits for the query: [{"document", "path", "page", "score", "snippet"}]."""
+    if sync_folder:
+        _sync_if_due()
+    clauses = parse_query(query)
+    if not clauses:
+        return []
+
+    with _lock:
+        clause_hits = [_clause_hits(terms) for terms in clauses]
+        pages = set.intersection(*(set(hits) for hits in clause_hits))
+        if not pages:
+            return []
+        avg_length = _total_tokens / max(1, _total_pages)
+
+        scored = []
+        for key, page in pages:
+            length = _docs[key]["lengths"][page]
+            score = 0.0
+            for hits in clause_hits:
+                df = len(hits)
+                idf = math.log(1 + (_total_pages - df + 0.5) / (df + 0.5))
+                tf = len(hits[(key, page)])
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+            scored.append((score, key, page))
+        scored.sort(key=lambda hit: (-hit[0], _docs[hit[1]]["name"], hit[2]))
+
+        results = []
+        for score, key, page in scored[:limit]:
+            doc = _docs[key]
+            results.append({
+                "document": doc["name"],
+                "path": doc["path"],
+                "page": page + 1,
+                "score": round(score, 3),
+                "snippet": _snippet(doc["pages"][page], clause_hits[0][(key, page)][0]),
+            })
+        return results
+
+
+def stats():
+    with _lock:
+        return {"documents": len(_docs), "pages": _total_pages, "terms": len(_postings)}
+
+
+# === FLASK INTEGRATION ===
+def init_app(app):
+    """Start loading the index with the worker (gunicorn builds the app after forking)."""
+    if INDEX_ON_START:
+        start()
@@ -0,0 +1,98 @@
+"""
+Per-user JSON storage.
+
+Each user's state (curriculum, planned sessions, timetable, quiz memory) lives
+in its own directory, sharded by a hash of the user id:
+
+    USER_DATA_DIR/3f/3f9a.../curriculum.json
+
+Finding a user's file is a path computation, whatever the number of users, and
+a user's writes never touch another user's files. Writes go through a temp
+file and os.replace, so readers always see a complete document. Read-modify-write
+updates (update_json) are serialized per file within a worker, by one of
+LOCK_STRIPES locks picked from the path (a fixed set, whatever the number of users).
+
+The user is the browser session (session["sid"], shared with the admission
+controller's fairness key); code running outside a request uses DEFAULT_USER.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+
+from utils.tracing import span
+
+# === CONFIGURATION ===
+USER_DATA_DIR = os.getenv("USER_DATA_DIR", os.path.join("data", "users"))
+DEFAULT_USER = "default"
+LOCK_STRIPES = 64
+
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def user_id():
+    """Id of the current user: the session id, created on first use, or DEFAULT_USER outside a request."""
+    from flask import has_request_context, session
+    if not has_request_context():
+        return DEFAULT_USER
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex[:12]
+    return session["sid"]
+
+
+def user_dir(user=None):
+    digest = hashlib.sha1((user or user_id()).encode("utf-8")).hexdigest()[:20]
+    return os.path.join(USER_DATA_DIR, digest[:2], digest)
+
+
+def path_for(name, user=None):
+    return os.path.join(user_dir(user), f"{name}.json")
+
+
+def _lock(path):
+    # Two files may share a stripe: their updates then just take turns
+    return _locks[hash(path) % LOCK_STRIPES]
+
+
+# === READ / WRITE ===
+def read_json(name, default=None, user=None):
+    """The user's `name` document, or `default` when they have none."""
+    path = path_for(name, user)
+    if not os.path.exists(path):
+        return default
+    with span("state.read", "state", file=name):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def write_json(name, value, user=None):
+    path = path_for(name, user)
+    folder = os.path.dirname(path)
+    with span("state.write", "state", file=name):
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def update_json(name, update, default=None, user=None):
+    """Read, transform with `update(value) -> value` and write back the user's document atomically."""
+    user = user or user_id()
+    with _lock(path_for(name, user)):
+        value = update(read_json(name, default, user))
+        write_json(name, value, user)
+        return value
+
+
+def iter_documents(name):
+    """Every user's `name` document (for background jobs: this walks the whole tree)."""
+    for path in glob.glob(os.path.join(USER_DATA_DIR, "*", "*", f"{name}.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
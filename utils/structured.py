@@ -0,0 +1,263 @@
+"""
+Schema-constrained generations.
+
+Quizzes, study plans and timetables are requested as JSON matching a schema
+instead of free text scraped with regexes and find("[")/rfind("]"):
+
+* Ollama gets the schema in its `format` field and can only sample tokens that
+  fit it;
+* Groq gets a `response_format`: a strict json_schema on the models that support
+  it (GROQ_JSON_SCHEMA_MODELS), JSON mode elsewhere;
+* both also see the schema in the prompt.
+
+Whatever comes back goes through JSONStream, a tolerant incremental parser:
+it skips prose or code fences before the value, stops at the end of the first
+complete value (Ollama streams structured calls and hangs up there, instead of
+waiting out the trailing whitespace some models emit in JSON mode), drops
+trailing commas and can close a truncated value. The result is then checked
+against the schema; anything that does not fit raises StructuredOutputError.
+"""
+import json
+import os
+import re
+
+# === SCHEMAS ===
+TIME_RE = r"^([01]\d|2[0-3]):[0-5]\d$"
+DAYS = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche")
+
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}, "minItems": 4, "maxItems": 4},
+                    "answer": {"type": "integer", "minimum": 0, "maximum": 3},
+                },
+                "required": ["question", "options", "answer"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["questions"],
+    "additionalProperties": False,
+}
+
+STUDY_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sessions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "course": {"type": "string"},
+                    "start": {"type": "string"},
+                    "end": {"type": "string"},
+                },
+                "required": ["course", "start", "end"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["sessions"],
+    "additionalProperties": False,
+}
+
+_SESSION = {
+    "type": "object",
+    "properties": {
+        "matiere": {"type": "string"},
+        "start": {"type": "string", "pattern": TIME_RE},
+        "end": {"type": "string", "pattern": TIME_RE},
+    },
+    "required": ["matiere", "start", "end"],
+    "additionalProperties": False,
+}
+TIMETABLE_SCHEMA = {
+    "type": "object",
+    "properties": {day: {"type": "array", "items": _SESSION} for day in DAYS},
+    "required": list(DAYS),
+    "additionalProperties": False,
+}
+
+SCHEMA_NAMES = {
+    id(QUIZ_SCHEMA): "quiz",
+    id(STUDY_PLAN_SCHEMA): "study_plan",
+    id(TIMETABLE_SCHEMA): "timetable",
+}
+
+# Groq models that accept response_format={"type": "json_schema"}; the others get JSON mode
+GROQ_JSON_SCHEMA_MODELS = set(filter(None, os.getenv(
+    "GROQ_JSON_SCHEMA_MODELS",
+    "meta-llama/llama-4-scout-17b-16e-instruct,meta-llama/llama-4-maverick-17b-128e-instruct,"
+    "openai/gpt-oss-20b,openai/gpt-oss-120b,moonshotai/kimi-k2-instruct",
+).split(",")))
+
+
+class StructuredOutputError(ValueError):
+    """The model's answer is not a JSON value matching the requested schema."""
+
+
+# === REQUEST SIDE ===
+def instructions(schema):
+    """Prompt suffix describing the expected output (JSON mode also requires the word JSON in the prompt)."""
+    return ("\n\nAnswer with a single JSON value matching this JSON schema, with no text before or after it:\n"
+            + json.dumps(schema, ensure_ascii=False))
+
+
+def groq_response_format(schema, model):
+    if model in GROQ_JSON_SCHEMA_MODELS:
+        return {"type": "json_schema",
+                "json_schema": {"name": SCHEMA_NAMES.get(id(schema), "output"), "schema": schema, "strict": True}}
+    return {"type": "json_object"}
+
+
+# === TOLERANT INCREMENTAL PARSER ===
+class JSONStream:
+    """
+    Feed model output chunk by chunk; `done` turns True once the first complete
+    JSON value (starting with one of `roots`) has been seen. value() parses it,
+    repairing trailing commas, and with partial=True closes a truncated one.
+    """
+
+    def __init__(self, roots="{["):
+        self.roots = roots
+        self.buffer = []
+        self.start = None       # index of the value's first character in the text
+        self.length = 0         # characters fed so far
+        self.stack = []         # open brackets
+        self.end = None
+        self.in_string = False
+        self.escape = False
+        self.done = False
+
+    def feed(self, chunk):
+        """Consume a chunk; returns True once the value is complete."""
+        if self.done or not chunk:
+            return self.done
+        offset = self.length
+        self.buffer.append(chunk)
+        self.length += len(chunk)
+        for i, ch in enumerate(chunk):
+            if self.start is None:
+                if ch in self.roots:
+                    self.start = offset + i
+                    self.stack.append(ch)
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.stack.append(ch)
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if not self.stack:
+                    self.done = True
+                    self.end = offset + i + 1
+                    break
+        return self.done
+
+    def text(self):
+        """The value's text as received so far."""
+        if self.start is None:
+            return ""
+        text = "".join(self.buffer)
+        return text[self.start:self.end] if self.done else text[self.start:]
+
+    def value(self, partial=False):
+        if self.start is None:
+            raise StructuredOutputError("no JSON value in the output")
+        text = self.text()
+        if not self.done:
+            if not partial:
+                raise StructuredOutputError("truncated JSON value")
+            text = _close(text, self.in_string, self.escape, self.stack)
+        try:
+            return json.loads(_drop_trailing_commas(text))
+        except json.JSONDecodeError as e:
+            raise StructuredOutputError(f"invalid JSON: {e}") from None
+
+
+def _close(text, in_string, escape, stack):
+    """Best-effort completion of a truncated value: end the string, drop a dangling key or comma, close brackets."""
+    if in_string:
+        text += ("\\" if escape else "") + '"'
+    if stack and stack[-1] == "{":
+        text = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", text)  # a key without its value
+    text = re.sub(r"[,:]\s*$", "", text)
+    closers = {"{": "}", "[": "]"}
+    return text + "".join(closers[b] for b in reversed(stack))
+
+
+def _drop_trailing_commas(text):
+    out, in_string, escape = [], False, False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        out.append(ch)
+    return "".join(out)
+
+
+def loads(text, roots="{[", partial=False):
+    """Parse the first JSON value found in a model's answer."""
+    stream = JSONStream(roots)
+    stream.feed(text or "")
+    return stream.value(partial=partial)
+
+
+# === VALIDATION ===
+_TYPES = {"object": dict, "array": list, "string": str, "integer": int, "number": (int, float), "boolean": bool}
+
+
+def check(value, schema, path="$"):
+    """Raise StructuredOutputError where `value` breaks the schema (the subset the schemas above use)."""
+    kind = schema.get("type")
+    if kind and (not isinstance(value, _TYPES[kind]) or (kind in ("integer", "number") and isinstance(value, bool))):
+        raise StructuredOutputError(f"{path}: expected {kind}, got {type(value).__name__}")
+    if kind == "object":
+        for key in schema.get("required", ()):
+            if key not in value:
+                raise StructuredOutputError(f"{path}: missing {key!r}")
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                check(value[key], sub, f"{path}.{key}")
+    elif kind == "array":
+        if len(value) < schema.get("minItems", 0) or len(value) > schema.get("maxItems", len(value)):
+            raise StructuredOutputError(f"{path}: {len(value)} items")
+        for i, item in enumerate(value):
+            check(item, schema.get("items", {}), f"{path}[{i}]")
+    elif kind in ("integer", "number"):
+        if value < schema.get("minimum", value) or value > schema.get("maximum", value):
+            raise StructuredOutputError(f"{path}: {value} out of range")
+    elif kind == "string" and "pattern" in schema and not re.match(schema["pattern"], value):
+        raise StructuredOutputError(f"{path}: {value!r} does not match {schema['pattern']}")
+    return value
+
+
+def parse(text, schema):
+    """Parse and validate a constrained generation."""
+    roots = "[" if schema.get("type") == "array" else "{"
+    return check(loads(text, roots), schema)
@@ -0,0 +1,289 @@
+"""
+Map-reduce course summaries.
+
+The compacted course text is split into page-aligned chunks, each chunk is
+summarized on its own (concurrently, with bounded parallelism) and the chunk
+summaries are cached on disk by content hash, whichever backend wrote them.
+asummarize_course() does the same on the event loop for the async views.
+A final, small reduce prompt merges them and adds the student's personalized
+"⚠️ Erreurs à retravailler" section, so a second student on the same course only pays for the reduce step.
+
+The reduce prompt must fit the backend it goes to (llm_router.max_prompt_tokens()).
+When the chunk summaries of a long course do not, consecutive ones are first
+merged in groups that do (MERGE_PROMPT, cached like the chunks), level by level.
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils import llm_router, metrics
+from utils.text_prep import PAGE_BREAK, CHARS_PER_TOKEN, estimate_tokens, split_sections, sample_for_budget
+from utils.tracing import span
+
+# === CONFIGURATION ===
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", os.path.join("cache", "summaries"))
+SUMMARY_PARALLELISM = int(os.getenv("SUMMARY_PARALLELISM", 3))
+CHUNK_TOKENS = 1500           # course text per map prompt
+MAX_MERGE_LEVELS = 3          # tree-reduce levels before falling back to sampling the summaries
+PROMPT_VERSION = "v1"         # bump when MAP_PROMPT/MERGE_PROMPT or the models change to invalidate cached chunks
+
+# Chunks currently being summarized, so concurrent students share one LLM call
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+MAP_PROMPT = """
+Tu es un assistant pédagogique. Voici un extrait d’un cours :
+
+{chunk}
+
+Résume cet extrait de manière structurée et pédagogique pour un étudiant : garde les définitions,
+les propriétés, les méthodes et les exemples importants. Réponds uniquement avec le résumé.
+"""
+
+MERGE_PROMPT = """
+Tu es un assistant pédagogique. Voici les résumés de parties consécutives d’un cours :
+
+{chunk}
+
+Fusionne-les en un seul résumé structuré, sans répétition, en gardant les définitions,
+les propriétés, les méthodes et les exemples importants. Réponds uniquement avec le résumé.
+"""
+
+PROMPTS = {"map": MAP_PROMPT, "merge": MERGE_PROMPT}
+
+REDUCE_PROMPT = """
+Tu es un assistant pédagogique. Voici les résumés successifs des parties d’un cours :
+
+{summaries}
+
+1. Fusionne-les en un **résumé de cours un peu détaillé**, pédagogique et structuré pour un étudiant.
+2. À la fin du résumé, ajoute une section intitulée : "⚠️ Erreurs à retravailler", où tu listes brièvement les points où l'étudiant s’est trompé pendant le quiz. Ne développe pas trop ces points, indique juste ce qu’il faut revoir.
+
+Voici les erreurs faites pendant le quiz :
+{errors}
+"""
+
+
+# === CHUNKING ===
+def split_chunks(text, max_tokens=CHUNK_TOKENS):
+    """Group consecutive pages into chunks of at most `max_tokens`; oversized pages are split by paragraph."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for section in split_sections(text):
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        paragraphs = [p[i:i + max_chars] for p in section.split("\n\n") for i in range(0, len(p), max_chars)]
+        pieces.extend(_pack(paragraphs, max_chars))
+
+    return _pack(pieces, max_chars)
+
+
+def _pack(pieces, max_chars):
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# === CHUNK CACHE ===
+def chunk_key(chunk, kind="map"):
+    # Model-agnostic: the router picks Ollama or Groq per call, after the lookup,
+    # and either answer is a good summary of the chunk
+    prefix = "" if kind == "map" else f"{kind}\0"
+    material = f"{prefix}{PROMPT_VERSION}\0{chunk}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(SUMMARY_CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def get_cached_summary(key):
+    path = _cache_path(key)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    return None
+
+
+def store_summary(key, summary):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(summary)
+    os.replace(tmp, path)
+
+
+def _claim(key):
+    """Return (future, owner): owner must compute the chunk, others wait on the future."""
+    with _in_flight_lock:
+        pending = _in_flight.get(key)
+        owner = pending is None
+        if owner:
+            pending = _in_flight[key] = Future()
+    return pending, owner
+
+
+def _release(key):
+    with _in_flight_lock:
+        _in_flight.pop(key, None)
+
+
+def _cached(key):
+    cached = get_cached_summary(key)
+    metrics.cache_lookup("summary_chunk", cached is not None)
+    return cached
+
+
+def summarize_chunk(chunk, kind="map"):
+    key = chunk_key(chunk, kind)
+    cached = _cached(key)
+    if cached is not None:
+        return cached
+
+    pending, owner = _claim(key)
+    if not owner:
+        with span("summary.wait_chunk"):
+            return pending.result()
+
+    try:
+        with span(f"summary.{kind}_chunk", chars=len(chunk)):
+            summary = llm_router.generate(PROMPTS[kind].format(chunk=chunk), "summary_map")
+        if summary:
+            store_summary(key, summary)
+        pending.set_result(summary)
+        return summary
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        _release(key)
+
+
+async def asummarize_chunk(chunk, kind="map"):
+    key = chunk_key(chunk, kind)
+    # Disk I/O off the event loop
+    cached = await asyncio.to_thread(_cached, key)
+    if cached is not None:
+        return cached
+
+    pending, owner = _claim(key)
+    if not owner:
+        with span("summary.wait_chunk"):
+            return await asyncio.wrap_future(pending)
+
+    try:
+        with span(f"summary.{kind}_chunk", chars=len(chunk)):
+            summary = await llm_router.agenerate(PROMPTS[kind].format(chunk=chunk), "summary_map")
+        if summary:
+            await asyncio.to_thread(store_summary, key, summary)
+        pending.set_result(summary)
+        return summary
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        _release(key)
+
+
+# === MAP / REDUCE ===
+def _summarize_all(chunks, kind="map"):
+    with ThreadPoolExecutor(max_workers=SUMMARY_PARALLELISM) as pool:
+        # copy_context keeps the worker threads attached to the request trace
+        futures = [pool.submit(contextvars.copy_context().run, summarize_chunk, c, kind) for c in chunks]
+        return [f.result() for f in futures]
+
+
+async def _asummarize_all(chunks, kind="map"):
+    semaphore = asyncio.Semaphore(SUMMARY_PARALLELISM)
+
+    async def run(chunk):
+        async with semaphore:
+            return await asummarize_chunk(chunk, kind)
+
+    return await asyncio.gather(*(run(c) for c in chunks))
+
+
+def summarize_chunks(text):
+    """Map step: summaries of every chunk, in document order."""
+    chunks = split_chunks(text)
+    with span("summary.map", chunks=len(chunks)):
+        return _summarize_all(chunks)
+
+
+async def asummarize_chunks(text):
+    chunks = split_chunks(text)
+    with span("summary.map", chunks=len(chunks)):
+        return await _asummarize_all(chunks)
+
+
+def _merge_groups(summaries):
+    """Consecutive summaries packed into groups that each fit one merge prompt."""
+    budget = llm_router.max_prompt_tokens() - estimate_tokens(MERGE_PROMPT)
+    groups = _pack(summaries, budget * CHARS_PER_TOKEN)
+    # A summary bigger than a whole merge prompt is sampled down to fit it
+    return [sample_for_budget(g, budget) for g in groups]
+
+
+def _reduce_budget(incorrect_questions):
+    """Tokens left for the summaries in the reduce prompt, on the backend it will go to."""
+    template = REDUCE_PROMPT.format(summaries="", errors=format_errors(incorrect_questions))
+    return llm_router.max_prompt_tokens() - estimate_tokens(template)
+
+
+def _needs_merge(summaries, budget, level):
+    return len(summaries) > 1 and level < MAX_MERGE_LEVELS and estimate_tokens(PAGE_BREAK.join(summaries)) > budget
+
+
+def reduce_summaries(summaries, budget):
+    """Merge chunk summaries level by level until they fit `budget` tokens."""
+    summaries, level = [s for s in summaries if s], 0
+    while _needs_merge(summaries, budget, level):
+        groups = _merge_groups(summaries)
+        with span("summary.merge", level=level, groups=len(groups)):
+            summaries = [s for s in _summarize_all(groups, "merge") if s]
+        level += 1
+    return sample_for_budget(PAGE_BREAK.join(summaries), budget)
+
+
+async def areduce_summaries(summaries, budget):
+    summaries, level = [s for s in summaries if s], 0
+    while _needs_merge(summaries, budget, level):
+        groups = _merge_groups(summaries)
+        with span("summary.merge", level=level, groups=len(groups)):
+            summaries = [s for s in await _asummarize_all(groups, "merge") if s]
+        level += 1
+    return sample_for_budget(PAGE_BREAK.join(summaries), budget)
+
+
+def format_errors(incorrect_questions):
+    return "\n".join([
+        f"- {q['question']}\n  ✅ Bonne réponse : {q['correct_answer']}" for q in incorrect_questions
+    ]) or "Aucune erreur."
+
+
+def summarize_course(text, incorrect_questions):
+    """Personalized course summary: cached chunk summaries plus one reduce prompt."""
+    summaries = reduce_summaries(summarize_chunks(text), _reduce_budget(incorrect_questions))
+    prompt = REDUCE_PROMPT.format(summaries=summaries, errors=format_errors(incorrect_questions))
+    with span("summary.reduce"):
+        return llm_router.generate(prompt, "summary")
+
+
+async def asummarize_course(text, incorrect_questions):
+    """Async summarize_course(): map prompts run concurrently on the event loop."""
+    summaries = await areduce_summaries(await asummarize_chunks(text), _reduce_budget(incorrect_questions))
+    prompt = REDUCE_PROMPT.format(summaries=summaries, errors=format_errors(incorrect_questions))
+    with span("summary.reduce"):
+        return await llm_router.agenerate(prompt, "summary")
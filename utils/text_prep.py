@@ -0,0 +1,164 @@
+"""
+Course text normalization and compaction, run once at extraction time.
+
+Slides and lecture PDFs repeat the same header/footer on every page, carry page
+numbers, break words with hyphens at line ends and pad everything with
+whitespace. compact_pages() strips all of that; sample_for_budget() then picks
+content from across the whole document to fit a prompt's token budget instead
+of keeping only the first pages.
+
+Compacted documents keep one page per section, separated by PAGE_BREAK.
+"""
+import re
+import unicodedata
+from collections import Counter
+
+PAGE_BREAK = "\f"
+CHARS_PER_TOKEN = 4            # rough average for French/English course text
+BOILERPLATE_MIN_PAGES = 3      # a line must repeat on at least this many pages...
+BOILERPLATE_RATIO = 0.4        # ...and on this share of pages to count as header/footer
+BOILERPLATE_MAX_CHARS = 80     # long lines are content, even when repeated
+MIN_SECTION_CHARS = 200        # below this a section excerpt is not worth including
+
+# "Page 3", "p. 3", "slide 3/20", "3 / 20": always a page number. A bare "3" only is when
+# pages keep putting one at the same place (see find_boilerplate), since tables have them too.
+_PAGE_NUMBER_RE = re.compile(
+    r"^((page|p\.|slide)\s*\d{1,4}(\s*(/|sur|of)\s*\d{1,4})?|\d{1,4}\s*(/|sur|of)\s*\d{1,4})$", re.IGNORECASE)
+_BARE_NUMBER_RE = re.compile(r"^\d{1,4}$")
+FIRST_LINE_NUMBER, LAST_LINE_NUMBER = "^#", "$#"   # boilerplate keys for bare numbers heading/ending pages
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(?=[a-zàâäéèêëîïôöùûüç])")
+_SPACES_RE = re.compile(r"[ \t ]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_SENTENCE_END_RE = re.compile(r"[.!?:;]\s|\n")
+# LaTeX/beamer PDFs often emit "D´efinition", "`a": spacing accent before the letter
+_SPACING_ACCENTS = {"´": "\u0301", "`": "\u0300", "ˆ": "\u0302", "¨": "\u0308", "¸": "\u0327"}
+_DETACHED_ACCENT_RE = re.compile(r"([´`ˆ¨¸])\s?([A-Za-zı])")  # LaTeX PDFs put "ˆı" for "î"
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _line_key(line):
+    """Normalize a line so that 'Chapitre 2 - page 3' and '... page 4' compare equal."""
+    return re.sub(r"\d+", "#", _SPACES_RE.sub(" ", line.strip().lower()))
+
+
+def find_boilerplate(pages):
+    """Return the normalized lines that repeat across enough pages to be headers/footers."""
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    seen = Counter()
+    for page in pages:
+        lines = [l.strip() for l in page.splitlines() if l.strip()]
+        keys = {_line_key(l) for l in lines if len(l) <= BOILERPLATE_MAX_CHARS and not _BARE_NUMBER_RE.match(l)}
+        if lines and _BARE_NUMBER_RE.match(lines[0]):
+            keys.add(FIRST_LINE_NUMBER)
+        if lines and _BARE_NUMBER_RE.match(lines[-1]):
+            keys.add(LAST_LINE_NUMBER)
+        seen.update(keys)
+    threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_RATIO * len(pages))
+    return {key for key, count in seen.items() if count >= threshold}
+
+
+def fix_accents(text):
+    text = _DETACHED_ACCENT_RE.sub(lambda m: m.group(2).replace("ı", "i") + _SPACING_ACCENTS[m.group(1)], text)
+    return unicodedata.normalize("NFC", text)
+
+
+def clean_page(page, boilerplate=frozenset()):
+    page = fix_accents(page)
+    raw = [_SPACES_RE.sub(" ", line).strip() for line in page.splitlines()]
+    filled = [i for i, line in enumerate(raw) if line]
+    edges = set()
+    if filled and FIRST_LINE_NUMBER in boilerplate:
+        edges.add(filled[0])
+    if filled and LAST_LINE_NUMBER in boilerplate:
+        edges.add(filled[-1])
+    lines = []
+    for i, stripped in enumerate(raw):
+        if not stripped:
+            lines.append("")
+            continue
+        if _BARE_NUMBER_RE.match(stripped):
+            if i in edges:
+                continue
+        elif _PAGE_NUMBER_RE.match(stripped) or _line_key(stripped) in boilerplate:
+            continue
+        lines.append(stripped)
+    text = "\n".join(lines)
+    text = _HYPHEN_BREAK_RE.sub(r"\1", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+def compact_pages(pages):
+    """
+    Clean every page and drop the ones left empty, as well as slide overlays
+    (a page whose text is repeated at the start of the next one).
+    """
+    boilerplate = find_boilerplate(pages)
+    cleaned = [c for c in (clean_page(p, boilerplate) for p in pages) if c]
+    return [page for page, following in zip(cleaned, cleaned[1:] + [""]) if not following.startswith(page)]
+
+
+def compact_text(pages):
+    """Compacted document text, one section per page, separated by PAGE_BREAK."""
+    return PAGE_BREAK.join(compact_pages(pages))
+
+
+def split_sections(text):
+    return [s for s in text.split(PAGE_BREAK) if s.strip()]
+
+
+def _cut(section, max_chars):
+    """Cut a section at the last sentence/line boundary before max_chars."""
+    if len(section) <= max_chars:
+        return section
+    head = section[:max_chars]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(head)]
+    if ends and ends[-1] > max_chars // 2:
+        head = head[:ends[-1]]
+    return head.rstrip() + " …"
+
+
+def sample_for_budget(text, max_tokens):
+    """
+    Fit a compacted document into `max_tokens`, taking content from every part of it.
+
+    Each section gets an equal share of the budget; sections shorter than their share
+    give the remainder back to the others. When there are too many sections for
+    each to get a useful excerpt, evenly spaced sections are kept instead.
+    """
+    sections = split_sections(text)
+    budget = max_tokens * CHARS_PER_TOKEN
+    if sum(len(s) for s in sections) + 2 * len(sections) <= budget:
+        return "\n\n".join(sections)
+
+    max_sections = max(1, budget // MIN_SECTION_CHARS)
+    if len(sections) > max_sections:
+        step = len(sections) / max_sections
+        sections = [sections[int(i * step)] for i in range(max_sections)]
+
+    # Water-filling: short sections keep all their text, long ones share what is left
+    quotas = {}
+    remaining = budget - 2 * len(sections)
+    pending = sorted(range(len(sections)), key=lambda i: len(sections[i]))
+    while pending:
+        share = remaining // len(pending)
+        i = pending[0]
+        if len(sections[i]) <= share:
+            quotas[i] = len(sections[i])
+            remaining -= quotas[i]
+            pending.pop(0)
+        else:
+            for j in pending:
+                quotas[j] = share
+            break
+
+    return "\n\n".join(_cut(sections[i], quotas[i]) for i in range(len(sections)))
+
+
+def flatten(text):
+    """Compacted text for display, with page breaks turned back into blank lines."""
+    return text.replace(PAGE_BREAK, "\n\n")
@@ -0,0 +1,233 @@
+"""
+Opt-in per-request span tracing and profiling.
+
+A request is traced when it carries `X-EduFlex-Trace: 1` (add `X-EduFlex-Profile: 1`
+to also capture a cProfile dump), or when tracing has been switched on for every
+request through POST /admin/tracing. Both the headers and the toggle require
+ADMIN_TOKEN to be set and a matching `X-Admin-Token` header; without it they are
+ignored (the toggle answers 403).
+
+Spans are written as Chrome trace events ("X" complete events) appended to
+traces/trace.json, rotated by size. The file is a JSON array left open at the end,
+which chrome://tracing, https://ui.perfetto.dev and speedscope all accept.
+Profiles are written next to it as profile-<trace id>.pstats (open with
+`python -m pstats` or snakeviz). The async views run on the worker's event loop
+(utils/aio.py), so the profiler follows the request there: it is paused in the
+request thread while that thread only waits on the loop and runs on the loop
+thread meanwhile (including any other coroutine interleaved with it). One
+profile is captured at a time per worker; concurrent profiled requests get
+spans only.
+
+Spans live in a ContextVar, so when work is handed to another thread use
+contextvars.copy_context().run(...) to keep it attached to the request trace.
+"""
+import contextvars
+import cProfile
+import glob
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, request
+
+# === CONFIGURATION ===
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+TRACE_FILE = os.path.join(TRACE_DIR, "trace.json")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", 5))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 20))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+TRACE_HEADER = "X-EduFlex-Trace"
+PROFILE_HEADER = "X-EduFlex-Profile"
+
+# Admin toggle (per worker process)
+SETTINGS = {"trace_all": False, "profile_all": False}
+
+_current = contextvars.ContextVar("eduflex_trace", default=None)
+_write_lock = threading.Lock()
+_profile_lock = threading.Lock()   # one cProfile at a time (Python 3.12+ refuses a second one anyway)
+_profiling = threading.local()     # .active = (trace, profiler) running on this thread
+_PID = os.getpid()
+
+
+class Trace:
+    def __init__(self, trace_id, profile=False):
+        self.trace_id = trace_id
+        self.events = []
+        self.lock = threading.Lock()
+        self.profile = profile
+        self.profiles = []   # one cProfile.Profile per stretch of the request, merged when written
+
+    def add(self, name, category, start, end, args):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round(start * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": _PID,
+            "tid": threading.get_native_id(),
+            "args": dict(args, trace_id=self.trace_id),
+        }
+        with self.lock:
+            self.events.append(event)
+
+
+# === SPANS ===
+@contextmanager
+def span(name, category="app", **args):
+    """Record a timing span if the current request is being traced (no-op otherwise)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, category, start, time.perf_counter(), args)
+
+
+def active():
+    return _current.get() is not None
+
+
+# === PROFILING ===
+def _resume(trace):
+    """Profile this thread for `trace`; False when another profile is already running."""
+    if not _profile_lock.acquire(blocking=False):
+        return False
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:   # another profiling tool is active
+        _profile_lock.release()
+        return False
+    _profiling.active = (trace, profiler)
+    return True
+
+
+def _pause():
+    """Stop this thread's profiler, if any, and return the trace it belonged to."""
+    active = getattr(_profiling, "active", None)
+    if active is None:
+        return None
+    trace, profiler = active
+    profiler.disable()
+    _profiling.active = None
+    _profile_lock.release()
+    trace.profiles.append(profiler)
+    return trace
+
+
+@contextmanager
+def profiled():
+    """Profile the block on this thread if the current trace asked for a profile (for coroutines on the loop)."""
+    trace = _current.get()
+    started = trace is not None and trace.profile and _resume(trace)
+    try:
+        yield
+    finally:
+        if started:
+            _pause()
+
+
+@contextmanager
+def handed_off():
+    """Pause this thread's profiler while it only waits on another thread that profiles itself."""
+    trace = _pause()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            _resume(trace)
+
+
+# === OUTPUT ===
+def _rotate():
+    for i in range(TRACE_BACKUPS - 1, 0, -1):
+        src = f"{TRACE_FILE}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{TRACE_FILE}.{i + 1}")
+    os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+
+
+def write_events(events):
+    if not events:
+        return
+    payload = "".join(json.dumps(e, ensure_ascii=False) + ",\n" for e in events)
+    with _write_lock:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) > TRACE_MAX_BYTES:
+            _rotate()
+        new_file = not os.path.exists(TRACE_FILE)
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            if new_file:
+                f.write("[\n")
+            f.write(payload)
+
+
+def _write_profile(profiles, trace_id):
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    pstats.Stats(*profiles).dump_stats(os.path.join(TRACE_DIR, f"profile-{trace_id}.pstats"))
+    dumps = sorted(glob.glob(os.path.join(TRACE_DIR, "profile-*.pstats")), key=os.path.getmtime)
+    for old in dumps[:-PROFILE_KEEP]:
+        os.remove(old)
+
+
+# === FLASK INTEGRATION ===
+def authorized():
+    """True when the request carries the configured ADMIN_TOKEN (never when none is configured)."""
+    return bool(ADMIN_TOKEN) and request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+
+def _wants(header, setting):
+    if SETTINGS[setting]:
+        return True
+    return request.headers.get(header) == "1" and authorized()
+
+
+def _finish(status):
+    trace = g.pop("_trace", None)
+    if trace is None:
+        return
+    _pause()
+    trace.add(f"{request.method} {request.path}", "request", g.pop("_trace_start"), time.perf_counter(),
+              {"endpoint": request.endpoint, "status": status})
+    _current.reset(g.pop("_trace_token"))
+    write_events(trace.events)
+    if trace.profiles:
+        _write_profile(trace.profiles, trace.trace_id)
+
+
+def init_app(app):
+    """Start a trace (and optionally a profiler) for opted-in requests."""
+
+    @app.before_request
+    def _start_trace():
+        if not _wants(TRACE_HEADER, "trace_all") and not _wants(PROFILE_HEADER, "profile_all"):
+            return
+        trace = Trace(uuid.uuid4().hex[:16], profile=_wants(PROFILE_HEADER, "profile_all"))
+        g._trace = trace
+        g._trace_token = _current.set(trace)
+        g._trace_start = time.perf_counter()
+        if trace.profile:
+            _resume(trace)
+
+    @app.after_request
+    def _tag_response(response):
+        trace = g.get("_trace")
+        if trace is not None:
+            response.headers["X-EduFlex-Trace-Id"] = trace.trace_id
+            _finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_on_error(exc):
+        if g.get("_trace") is not None:
+            _finish(500)
@@ -0,0 +1,269 @@
+"""
+Schedule-aware warm-up of the local model.
+
+Loading llama3.2 takes several seconds and Ollama unloads it after five idle
+minutes, so the first /chat or /generate_quiz of a revision block, right when
+the whole class arrives, used to pay for a cold start. The timetables
+(calendrier.json and the ones users uploaded) and the planned study sessions
+say when that will happen, so a background thread in every worker:
+
+* loads the model WARMUP_LEAD seconds before a scheduled slot and pins it with
+  keep_alive until WARMUP_GRACE seconds after the slot ends. Ollama resets the
+  timer on every call, so the worker's own calls carry the same keep_alive
+  while a slot is on (llm_ollama.set_keep_alive);
+* pre-runs the cacheable prompts of the subject about to start: the question
+  bank and the chunk summaries of the uploaded PDF courses that match it in the
+  search index;
+* unloads the model (keep_alive 0) once nothing is scheduled and no call is
+  running, in any worker.
+
+Only the worker holding LOCK_FILE sends the load/unload requests and pre-runs
+prompts. The other workers touch BUSY_FILE on every check while they have a
+call running or a slot on, and the leader does not release the model until it
+has not been touched for two checks. Set OLLAMA_WARMUP=0 to turn it off.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, time as clock, timedelta
+
+from utils import admission, llm_ollama, metrics, storage
+
+# === CONFIGURATION ===
+WARMUP_ENABLED = os.getenv("OLLAMA_WARMUP", "1") != "0"
+WARMUP_LEAD = float(os.getenv("WARMUP_LEAD", 600))      # seconds before a slot to load the model
+WARMUP_GRACE = float(os.getenv("WARMUP_GRACE", 300))    # seconds it stays pinned after the slot
+WARMUP_TICK = float(os.getenv("WARMUP_TICK", 30))       # seconds between checks
+WARMUP_RESCAN = float(os.getenv("WARMUP_RESCAN", 300))  # seconds between reads of the schedules
+SESSION_MINUTES = 120        # sessions planned before their end was stored
+PREWARM_DOCUMENTS = 2        # courses pre-run per subject
+DEFAULT_SCHEDULE_FILE = "calendrier.json"
+LOCK_FILE = os.path.join("cache", "warmup.lock")
+BUSY_FILE = os.path.join("cache", "warmup.busy")   # touched by the other workers while they need the model
+
+DAYS = ("lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche")
+SKIPPED_COURSES = {"break", "pause"}
+
+_windows = []        # (start, end, subject) of the slots ahead, local time
+_scanned = 0.0
+_pinned_until = None  # end of the pin last sent to Ollama by this worker
+_prewarmed = set()   # (subject, start) already pre-run
+_lock_file = None
+_pid = None
+_start_lock = threading.Lock()
+
+
+# === SCHEDULES ===
+def _at(day, hhmm):
+    hours, minutes = hhmm.split(":")
+    return datetime.combine(day, clock(int(hours), int(minutes)))
+
+
+def timetable_windows(schedule, now, days=1):
+    """Weekly {"lundi": [{"debut", "fin", "matiere"}]} slots that end after `now`, over the next `days`."""
+    windows = []
+    for offset in range(-1, days + 1):   # yesterday's slot may run past midnight
+        day = now.date() + timedelta(days=offset)
+        for slot in schedule.get(DAYS[day.weekday()], []):
+            try:
+                start, end = _at(day, slot["debut"]), _at(day, slot["fin"])
+            except (KeyError, ValueError):
+                continue
+            if end <= start:
+                end += timedelta(days=1)
+            if end > now and start < now + timedelta(days=days):
+                windows.append((start, end, slot.get("matiere")))
+    return windows
+
+
+def _local(value):
+    """Naive local datetime from an ISO string."""
+    moment = datetime.fromisoformat(value)
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def session_windows(sessions, now, days=1):
+    """Planned study sessions ({"course", "start", "end", "done"}) that end after `now`, over the next `days`."""
+    windows = []
+    for item in sessions or []:
+        if item.get("done") or item.get("missed") or str(item.get("course", "")).strip().lower() in SKIPPED_COURSES:
+            continue
+        try:
+            start = _local(item["start"])
+            end = _local(item["end"]) if item.get("end") else start + timedelta(minutes=SESSION_MINUTES)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if end > now and start < now + timedelta(days=days):
+            windows.append((start, end, item.get("course")))
+    return windows
+
+
+def collect_windows(now):
+    """Every slot ahead: the deployment's timetable, the users' timetables and their study sessions."""
+    windows = []
+    if os.path.exists(DEFAULT_SCHEDULE_FILE):
+        try:
+            with open(DEFAULT_SCHEDULE_FILE, "r") as f:
+                windows += timetable_windows(json.load(f), now)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Warm-up: could not read {DEFAULT_SCHEDULE_FILE}: {e}")
+    for schedule in storage.iter_documents("calendrier"):
+        windows += timetable_windows(schedule, now)
+    for sessions in storage.iter_documents("sessions"):
+        windows += session_windows(sessions, now)
+    return sorted(windows, key=lambda w: w[0])
+
+
+# === OLLAMA ===
+def _send(keep_alive, action):
+    """Load (keep_alive > 0) or unload (0) the model: an Ollama call without a prompt."""
+    import httpx
+    try:
+        response = httpx.post(llm_ollama.OLLAMA_URL, json={
+            "model": llm_ollama.OLLAMA_TEXT_MODEL, "keep_alive": keep_alive,
+        }, timeout=llm_ollama.OLLAMA_TIMEOUT)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"⚠️ Warm-up: {action} of {llm_ollama.OLLAMA_TEXT_MODEL} failed: {e}")
+        return False
+    metrics.OLLAMA_WARMUPS.inc(action)
+    return True
+
+
+def prewarm(subject):
+    """Build the question bank and chunk summaries of the PDF courses matching `subject`."""
+    from utils import question_bank, search_index
+    from utils.extractor import extract_pages_from_pdf
+    from utils.summarizer import summarize_chunks
+    from utils.text_prep import compact_text
+
+    paths = []
+    search_index.wait_ready()   # the worker's first sync, started with the app
+    for hit in search_index.search(subject, limit=20):
+        if hit["path"].lower().endswith(".pdf") and hit["path"] not in paths:
+            paths.append(hit["path"])
+    for path in paths[:PREWARM_DOCUMENTS]:
+        # Same text as a revision upload of that file, so the caches are the ones it will hit
+        text = compact_text(extract_pages_from_pdf(path))
+        question_bank.build_in_background(question_bank.document_id(text), text)
+        try:
+            summarize_chunks(text)
+        except Exception as e:
+            print(f"⚠️ Warm-up: summaries of {path} failed: {e}")
+    metrics.OLLAMA_WARMUPS.inc("prewarm")
+    print(f"🔥 Warm-up: pre-ran {len(paths[:PREWARM_DOCUMENTS])} course(s) for {subject}")
+
+
+def _prewarm_in_background(subject):
+    def run():
+        try:
+            prewarm(subject)
+        except Exception as e:
+            print(f"❌ Warm-up of {subject} failed: {e}")
+
+    threading.Thread(target=run, name="ollama-prewarm", daemon=True).start()
+
+
+# === SCHEDULER ===
+def _is_leader():
+    """True in the one worker that talks to Ollama for the warm-up (the holder of LOCK_FILE)."""
+    global _lock_file
+    if _lock_file is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:   # Windows: the development server is a single process
+        return True
+    os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+    f = open(LOCK_FILE, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _lock_file = f
+    return True
+
+
+def _mark_busy():
+    os.makedirs(os.path.dirname(BUSY_FILE), exist_ok=True)
+    with open(BUSY_FILE, "a"):
+        os.utime(BUSY_FILE)
+
+
+def _others_busy():
+    """True while another worker has touched BUSY_FILE within the last two checks."""
+    try:
+        return time.time() - os.path.getmtime(BUSY_FILE) < 2 * WARMUP_TICK
+    except OSError:
+        return False
+
+
+def _running():
+    return admission.controller("ollama").stats()["running"]
+
+
+def tick(now=None):
+    """One check: pin, release or pre-run as the schedules require. Returns the active windows."""
+    global _windows, _scanned, _pinned_until
+    now = now or datetime.now()
+    if not _scanned or time.monotonic() - _scanned >= WARMUP_RESCAN:
+        _windows, _scanned = collect_windows(now), time.monotonic()
+        _prewarmed.intersection_update((subject, start) for start, _, subject in _windows)
+
+    lead = timedelta(seconds=WARMUP_LEAD)
+    active = [w for w in _windows if w[0] - lead <= now < w[1]]
+    leader = _is_leader()
+    if not leader and (active or _running()):
+        _mark_busy()
+    if not active:
+        llm_ollama.set_keep_alive(None)
+        if _pinned_until is not None and leader and _running() == 0 and not _others_busy():
+            if _send(0, "release"):
+                print(f"💤 Warm-up: nothing scheduled, released {llm_ollama.OLLAMA_TEXT_MODEL}")
+                _pinned_until = None
+        return active
+
+    until = max(end for _, end, _ in active) + timedelta(seconds=WARMUP_GRACE)
+    llm_ollama.set_keep_alive(int((until - now).total_seconds()))
+    if not leader:
+        return active
+
+    if _pinned_until is None or until > _pinned_until:
+        if _send(int((until - now).total_seconds()), "load"):
+            print(f"🔥 Warm-up: {llm_ollama.OLLAMA_TEXT_MODEL} pinned until {until:%H:%M} "
+                  f"for {', '.join(sorted({str(s) for _, _, s in active}))}")
+            _pinned_until = until
+    for start, _, subject in active:
+        if subject and (subject, start) not in _prewarmed:
+            _prewarmed.add((subject, start))
+            _prewarm_in_background(subject)
+    return active
+
+
+def _run():
+    while True:
+        try:
+            tick()
+        except Exception as e:
+            print(f"❌ Warm-up check failed: {e}")
+        time.sleep(WARMUP_TICK)
+
+
+def start():
+    """Start this worker's scheduler thread (once per process)."""
+    global _pid
+    if _pid == os.getpid():
+        return
+    with _start_lock:
+        if _pid != os.getpid():
+            _pid = os.getpid()
+            threading.Thread(target=_run, name="ollama-warmup", daemon=True).start()
+
+
+# === FLASK INTEGRATION ===
+def init_app(app):
+    """Start the scheduler with the worker's first request (after gunicorn has forked)."""
+    if WARMUP_ENABLED:
+        app.before_request(start)